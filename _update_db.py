@@ -4,9 +4,8 @@ from datetime import date, timedelta, datetime
 from multiprocessing.pool import ThreadPool
 from typing import *
 
-import pykrx.stock
-
 import database as db
+import krx
 import utils.log
 from creon import charts, stocks
 
@@ -21,37 +20,7 @@ def date_to_str(d: date) -> str:
 
 
 def _business_days(limit=10 * 365) -> List[date]:
-    fromdate = date_to_str(date.today() - timedelta(days=limit))
-    todate = date_to_str(date.today())
-
-    big_stocks = [
-        pykrx.stock.get_market_ohlcv_by_date(
-            fromdate=fromdate,
-            todate=todate,
-            ticker='005930'  # 삼성전자
-        ),
-        pykrx.stock.get_market_ohlcv_by_date(
-            fromdate=fromdate,
-            todate=todate,
-            ticker='000660'  # SK 하이닉스
-        ),
-        pykrx.stock.get_market_ohlcv_by_date(
-            fromdate=fromdate,
-            todate=todate,
-            ticker='005380'  # 현대차
-        )
-    ]
-
-    length = 0
-    for df in big_stocks:
-        if length == 0:
-            length = df.index.size
-            continue
-
-        assert length == df.index.size, 'Something is wrong with the big stocks.'
-
-    # noinspection PyUnresolvedReferences
-    return [d.date() for d in big_stocks[0].index]
+    return krx.business_days_between(date.today() - timedelta(days=limit), date.today())
 
 
 business_days = _business_days()
@@ -1,11 +1,13 @@
 # noinspection SpellCheckingInspection
 __author__ = 'wookjae.jo'
 
+import argparse
 import os
 from datetime import date
 from datetime import datetime
 
 from database.backtest.report import XlsxExporter
+from database.backtest.sweep import ParameterGrid, sweep, export_csv
 from database.backtest.strategies.bollinger import BackTest as BlgBackTest
 from utils import log
 
@@ -45,8 +47,37 @@ def run(earning_line_max, stop_line, comment):
     ).export()
 
 
+def run_sweep():
+    results = sweep(
+        BlgBackTest,
+        begin=date(2018, 1, 1),
+        end=date(2021, 7, 27),
+        grid=ParameterGrid({
+            'earning_line_max': [10, 15, 20, 25, 30],
+            'stop_line': [-5, -10, -15, -20, -25],
+            'once_buy_amount': [100_0000, 200_0000],
+        }),
+        initial_deposit=1_0000_0000,
+        earning_line_min=5,
+        earning_line=10,
+        trailing_stop_rate=3,
+        blacklist=['007700', '086520']
+    )
+
+    target_dir = os.path.join('reports', datetime.now().strftime('%Y%m%d_%H%M%S'))
+    os.makedirs(target_dir, exist_ok=True)
+    export_csv(results, os.path.join(target_dir, 'sweep.csv'))
+
+
 def main():
-    run(earning_line_max=15, stop_line=-15, comment='15% 익절, -5% 손절')
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sweep', action='store_true', help='파라미터 조합별로 실행 후 결과를 sweep.csv 로 저장')
+    args = parser.parse_args()
+
+    if args.sweep:
+        run_sweep()
+    else:
+        run(earning_line_max=15, stop_line=-15, comment='15% 익절, -5% 손절')
 
 
 if __name__ == '__main__':
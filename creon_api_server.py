@@ -12,13 +12,15 @@ log.init(logging.INFO)
 from dateutil.parser import parse as parse_datetime
 import flask_cors
 import jsons
-from flask import Flask, request, send_file
+from flask import Flask, request, send_file, make_response
 from werkzeug.serving import WSGIRequestHandler
 
 from creon import stocks
 from creon import charts
 from creon.exceptions import CreonError
 from creon.connection import connector as creon_connector
+from common.symbols import short_code
+from database.metrics import DailyIndicatorTable, calculate as calculate_indicators
 from datetime import date, timedelta
 from dataclasses import dataclass
 from simstock import BreakAbove5MaEventSimulator
@@ -91,11 +93,11 @@ def favicon():
     return send_file('favicon.ico')
 
 
-available_codes = stocks.get_availables()
-
-
 @app.route('/stocks')
 def get_stocks():
+    # 취급 종목은 처음 요청 시 계산 후 stocks 모듈에 캐시
+    available_codes = set(stocks.get_availables())
+
     def is_active(code: str):
         return code in available_codes
 
@@ -126,51 +128,67 @@ def get_charts():
         raise BadRequestError(
             f'The duration of the minute chart cannot exceed {max_period.days} days.: {(end - begin).days} days')
 
-    return asjson(charts.request_by_term(code=code,
-                                         chart_type=chart_type,
-                                         begin=begin,
-                                         end=end))
+    return asjson(charts.request_batch_by_term(code=code,
+                                               chart_type=chart_type,
+                                               begin=begin,
+                                               end=end).to_records())
 
 
 @app.route('/metrics')
 def get_metrics():
-    code = request.args.get('code')
+    code = short_code(request.args.get('code'))
     begin: date = parse_datetime(request.args.get('begin')).date()
     end: date = parse_datetime(request.args.get('end')).date()
 
-    candles = charts.request_by_term(
-        code=code,
-        chart_type=charts.ChartType.DAY,
-        begin=begin - timedelta(days=300),
-        end=end
-    )
-
-    def ma(at: date, length: int):
-        closes = [candle.close for candle in candles if candle.date <= at][-length:]
-        if len(closes) != length:
-            return None
-
-        return int(sum(closes) / length)
+    # 시작일이 휴일이면 직전 거래일 지표를 쓰므로 조금 앞에서부터 읽는다
+    with DailyIndicatorTable() as indicator_table:
+        indicators = indicator_table.find_all_in(code, begin=begin - timedelta(days=14), end=end)
+
+    if not indicators:
+        # 지표가 적재되지 않은 종목 - 크레온 일봉으로 계산 (MA120 을 위해 300일 앞부터)
+        candles = charts.request_batch_by_term(code=code,
+                                               chart_type=charts.ChartType.DAY,
+                                               begin=begin - timedelta(days=300),
+                                               end=end)
+        indicators = [
+            indicator for indicator in calculate_indicators(code, [candle.date for candle in candles],
+                                                            candles.closes.tolist())
+            if begin - timedelta(days=14) <= indicator.date
+        ]
+
+    def as_int(value):
+        return None if value is None else int(value)
 
     result = []
+    i = -1
     cur = begin
-    while True:
-        if cur > end:
-            break
+    while cur <= end:
+        # 휴일은 직전 거래일 지표
+        while i + 1 < len(indicators) and indicators[i + 1].date <= cur:
+            i += 1
 
+        indicator = indicators[i] if i >= 0 else None
         result.append({
             'date': cur,
             'moving_average': {
-                '120': ma(cur, 120),
-                '60': ma(cur, 60),
-                '20': ma(cur, 20),
-                '5': ma(cur, 5)
+                '120': as_int(indicator.ma_120) if indicator else None,
+                '60': as_int(indicator.ma_60) if indicator else None,
+                '20': as_int(indicator.ma_20) if indicator else None,
+                '5': as_int(indicator.ma_5) if indicator else None
+            },
+            'bollinger': {
+                'upper': as_int(indicator.bb_upper) if indicator else None,
+                'mid': as_int(indicator.ma_20) if indicator else None,
+                'lower': as_int(indicator.bb_lower) if indicator else None
             }
         })
 
         cur += timedelta(days=1)
 
-    return asjson(result)
+    # 내용이 같으면 304 - 대시보드의 반복 조회는 본문 없이 응답
+    response = make_response(asjson(result))
+    response.add_etag()
+    return response.make_conditional(request)
 
 
 @dataclass
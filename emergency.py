@@ -14,16 +14,26 @@ def get_holdings():
 def main():
     holdings = list(get_holdings())
 
-    details = st.get_details([code for code, _, _ in holdings])
-    details = {detail.code: detail for detail in details}
+    snapshot = st.get_snapshot([code for code, _, _ in holdings])
 
-    for code, count, _ in holdings:
-        price = details.get(code).price
-        tr.sell(
+    # 접수를 기다리지 않고 모두 큐에 넣는다 - 주문 요청 제한 안에서 최대한 빨리 나간다
+    tickets = [
+        tr.submit(
+            order_type=tr.OrderType.SELL,
             code=code,
             count=count,
-            price=price
-        )
+            price=snapshot.get(code).price
+        ) for code, count, _ in holdings
+    ]
+
+    for ticket in tickets:
+        if not ticket.wait_submitted(timeout=60):
+            print(ticket.code, 'TIMEOUT')
+            continue
+
+        print(ticket.code, ticket.state.value, ticket.order_num, ticket.error or '')
+
+    print('submit latency:', tr.get_order_manager().submit_latency.summary())
 
 
 if __name__ == '__main__':
@@ -0,0 +1,8 @@
+from database import charts
+from utils import log
+
+log.init()
+
+if __name__ == '__main__':
+    charts.migrate_minute_candles(time_unit='1m')
+    charts.migrate_minute_candles(time_unit='5m')
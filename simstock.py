@@ -9,6 +9,7 @@ from typing import *
 
 sys.path.append(os.path.join(os.path.dirname(__file__), 'stocktock'))
 
+from common.metric import MovingAverages
 from model import Candle
 from utils import calc, log
 
@@ -19,8 +20,19 @@ from creon import charts, stocks
 
 logger = logging.getLogger()
 
-available_codes = stocks.get_availables()
-details: Dict[str, stocks.StockDetail2] = {detail.code: detail for detail in stocks.get_details(available_codes)}
+_details: Optional[Dict[str, stocks.StockDetail2]] = None
+
+
+def get_details_by_code() -> Dict[str, stocks.StockDetail2]:
+    """
+    취급 종목 현재가 정보 - import 시점이 아니라 처음 필요할 때 조회
+    """
+    global _details
+
+    if _details is None:
+        _details = {detail.code: detail for detail in stocks.get_details(stocks.get_availables())}
+
+    return _details
 
 
 @dataclass
@@ -59,7 +71,7 @@ class Wallet:
             'BUY',  # 구분
             code,  # 종목코드
             stocks.get_name(code),  # 종목명
-            details.get(code).capitalization(),
+            get_details_by_code().get(code).capitalization(),
             price,  # 주문가
             count,  # 주문수량
             total,  # 주문총액
@@ -92,7 +104,7 @@ class Wallet:
             'SELL',  # 구분
             code,  # 종목코드
             stocks.get_name(code),  # 종목명
-            details.get(code).capitalization(),  # 시총
+            get_details_by_code().get(code).capitalization(),  # 시총
             sell_price,  # 주문가
             sell_count,  # 주문수량
             sell_price * sell_count,  # 주문총액
@@ -152,7 +164,7 @@ class Simulator:
         )
 
         if not self.daily_candles:
-            raise NotEnoughChartException(code, details.get(code).name)
+            raise NotEnoughChartException(code, get_details_by_code().get(code).name)
 
         self.daily_candles.sort(key=lambda candle: datetime.combine(candle.date, candle.time))
 
@@ -161,21 +173,21 @@ class Simulator:
 
         self.daily_candles: Dict[date, Candle] = {candle.date: candle
                                                   for candle in self.daily_candles}
+        self.averages = MovingAverages.of(self.daily_candles.values())
         self.last_candle: Optional[Candle] = None
 
     def ma(self, dt: date, length: int, cur_price: int = 0, pos: int = 0):
-        values = [candle.close for candle in self.daily_candles.values()
-                  if candle.date < dt] + [cur_price]
-
+        # dt 이전 일봉 종가 + [현재가] 에서 pos 위치까지의 length 평균
+        count = self.averages.count_before(dt)
         if pos:
-            values = values[-length + pos: pos]
+            value = self.averages.get(length, end=count + 1 + pos)
         else:
-            values = values[-length:]
+            value = self.averages.get(length, end=count, cur_price=cur_price)
 
-        if length > len(values):
+        if value is None:
             raise NotEnoughChartException(self.code, stocks.get_name(self.code))
 
-        return sum(values) / length
+        return value
 
     def _sell(self, dt, price, count):
         self.result.events.append(Event(type='SELL', datetime=dt, price=price, count=count))
@@ -212,7 +224,7 @@ class BreakAbove5MaEventSimulator(Simulator):
                              sell_price=self.last_candle.close,
                              sell_amount=1)
 
-        detail = details.get(self.code)
+        detail = get_details_by_code().get(self.code)
 
         if self.wallet.earnings:
             final_msg_items = [
@@ -283,7 +295,7 @@ class GoldenDeadCrossSimulator(Simulator):
                              sell_price=self.last_candle.close,
                              sell_amount=1)
 
-        detail = details.get(self.code)
+        detail = get_details_by_code().get(self.code)
 
         if self.wallet.earnings:
             final_msg_items = [
@@ -369,7 +381,7 @@ def main(codes: List[str]):
         #     continue
 
         logger.info(
-            f'[{count}/{len(codes)}] {stocks.get_name(code)} - 시총: {details.get(code).capitalization()}')
+            f'[{count}/{len(codes)}] {stocks.get_name(code)} - 시총: {get_details_by_code().get(code).capitalization()}')
 
         for term in terms:
             begin = term.begin
@@ -391,5 +403,6 @@ def main(codes: List[str]):
 
 
 if __name__ == '__main__':
-    available_codes.sort(key=lambda code: details.get(code).capitalization())
+    available_codes = stocks.get_availables().copy()
+    available_codes.sort(key=lambda code: get_details_by_code().get(code).capitalization())
     main([code for code in available_codes if '스팩' not in stocks.get_name(code)])
@@ -1,8 +1,15 @@
 # noinspection SpellCheckingInspection
+from __future__ import annotations
+
 __author__ = 'wookjae.jo'
 
+import bisect
+import math
+from datetime import date
 from typing import *
 
+import numpy as np
+
 
 class NotEnoughChartException(BaseException):
     def __str__(self):
@@ -13,15 +20,207 @@ def avg(values: List[int]) -> float:
     return sum(values) / len(values)
 
 
-class MaCalculator:
-    def __init__(self, values: List[int]):
-        self.values = values
+class RollingMean:
+    """
+    누적합 이동평균 - 값 추가 O(1), 임의 구간 평균 O(1)
+    """
+
+    def __init__(self, values: Iterable[float] = ()):
+        self._sums: List[float] = [0]
+        for value in values:
+            self.append(value)
+
+    def __len__(self):
+        return len(self._sums) - 1
+
+    def append(self, value: float):
+        self._sums.append(self._sums[-1] + value)
+
+    def replace_last(self, value: float):
+        """
+        마지막 값 교체 - 장중 당일 종가 갱신
+        """
+        self._sums[-1] = self._sums[-2] + value
+
+    def mean(self, length: int, end: int = None, cur_price: float = None) -> Optional[float]:
+        """
+        values[:end] (+ [cur_price]) 의 마지막 length 개 평균, 값이 모자라면 None
+        """
+        end = len(self) if end is None else end
+        if end < 0:
+            end += len(self)
+
+        if cur_price is not None:
+            length -= 1
+
+        if length < 0 or not 0 <= end - length or end > len(self):
+            return None
+
+        total = self._sums[end] - self._sums[end - length]
+        if cur_price is not None:
+            return (total + cur_price) / (length + 1)
 
-    def get(self, length: int, pos: int = 0):
-        if len(self.values) < length:
-            raise NotEnoughChartException()
+        return total / length if length else None
 
-        if pos:
-            return avg(self.values[-length + pos: pos])
+    def means(self, length: int) -> List[Optional[float]]:
+        """
+        위치별 (처음부터 그 위치까지) 마지막 length 개 평균, 값이 모자라면 None
+        """
+        return [self.mean(length, end=end) for end in range(1, len(self) + 1)]
+
+
+class MovingAverages:
+    """
+    한 종목의 일자별 종가 이동평균
+    날짜 위치는 이분 탐색, 평균은 RollingMean 으로 구한다
+    """
+
+    def __init__(self, dates: Iterable[date] = (), closes: Iterable[float] = ()):
+        self.dates: List[date] = list(dates)
+        self.closes = RollingMean(closes)
+        assert len(self.dates) == len(self.closes), 'The lengths of dates and closes are different.'
+
+    @classmethod
+    def of(cls, candles: Iterable) -> MovingAverages:
+        """
+        date, close 속성을 가진 일봉 목록(날짜순)으로 생성
+        """
+        candles = list(candles)
+        return MovingAverages([candle.date for candle in candles], [candle.close for candle in candles])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def append(self, d: date, close: float):
+        """
+        일봉 추가, 마지막 날짜와 같으면 종가 갱신
+        """
+        if self.dates and self.dates[-1] == d:
+            self.closes.replace_last(close)
         else:
-            return avg(self.values[-length:])
+            assert not self.dates or self.dates[-1] < d, 'Dates must be appended in order.'
+            self.dates.append(d)
+            self.closes.append(close)
+
+    def count_before(self, at: date) -> int:
+        """
+        at 이전(미포함) 일봉 개수
+        """
+        return bisect.bisect_left(self.dates, at)
+
+    def count_until(self, at: date) -> int:
+        """
+        at 까지(포함) 일봉 개수
+        """
+        return bisect.bisect_right(self.dates, at)
+
+    def get(self, length: int, end: int = None, cur_price: float = None) -> Optional[float]:
+        """
+        앞에서부터 end 개 일봉 (+ 현재가) 의 length 이동평균, 모자라면 None
+        """
+        return self.closes.mean(length, end=end, cur_price=cur_price)
+
+    def at(self, d: date, length: int) -> Optional[float]:
+        """
+        d 일자(포함) 기준 이동평균 - 휴일이면 직전 거래일 값
+        """
+        return self.get(length, end=self.count_until(d))
+
+
+def bollinger_band(total: float, total_sq: float, size: int, width: float = 2) -> Tuple[float, float, float]:
+    """
+    합계와 제곱합으로 (mid, upper, lower) 계산 - 표준편차는 모표준편차
+    """
+    mid = total / size
+    std = math.sqrt(max(total_sq / size - mid * mid, 0))
+    return mid, mid + width * std, mid - width * std
+
+
+class BollingerEngine:
+    """
+    볼린저 밴드 계산기
+    (종목, 거래일) 행렬에서 값이 있는 칸만 종목별로 이어 붙인 뒤 x, x² 누적합을 만들어 두고,
+    모든 종목/일자의 밴드를 한번에 구하거나 '직전 size - 1 개 + 현재가' 밴드를 O(1)로 구한다.
+    """
+
+    def __init__(self, values: np.ndarray, valid: np.ndarray, size: int = 20, width: float = 2):
+        assert values.shape == valid.shape, 'The shapes of values and valid are different.'
+        self.size = size
+        self.width = width
+        self.shape = values.shape
+
+        rows, cols = np.nonzero(valid)
+        dtype = np.int64 if np.issubdtype(values.dtype, np.integer) else np.float64
+        x = values[rows, cols].astype(dtype)
+        self._sums = np.concatenate([np.zeros(1, dtype=dtype), np.cumsum(x)])
+        self._sq_sums = np.concatenate([np.zeros(1, dtype=dtype), np.cumsum(x * x)])
+
+        # 종목별 시작 위치, (종목, 일자) 이전까지 값 개수
+        self._row_start = np.searchsorted(rows, np.arange(self.shape[0]))
+        self._before = np.cumsum(valid, axis=1) - valid
+        self._rows = rows
+        self._cols = cols
+
+    def bands(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        모든 (종목, 거래일) 의 (mid, upper, lower), 값이 없거나 기간이 모자라면 NaN
+        """
+        mid = np.full(self.shape, np.nan)
+        upper = np.full(self.shape, np.nan)
+        lower = np.full(self.shape, np.nan)
+
+        end = np.arange(1, len(self._rows) + 1)
+        begin = end - self.size
+        enough = begin >= self._row_start[self._rows]
+        end, begin = end[enough], begin[enough]
+        rows, cols = self._rows[enough], self._cols[enough]
+
+        mid[rows, cols], upper[rows, cols], lower[rows, cols] = self._band(
+            self._sums[end] - self._sums[begin],
+            self._sq_sums[end] - self._sq_sums[begin],
+        )
+        return mid, upper, lower
+
+    def previous(self, row: int, col: int) -> Optional[Tuple[float, float]]:
+        """
+        col 이전 size - 1 개 값의 (합계, 제곱합), 모자라면 None
+        """
+        end = self._row_start[row] + self._before[row, col]
+        begin = end - (self.size - 1)
+        if begin < self._row_start[row]:
+            return None
+
+        return self._sums[end] - self._sums[begin], self._sq_sums[end] - self._sq_sums[begin]
+
+    def with_value(self, row: int, col: int, value: float) -> Optional[Tuple[float, float, float]]:
+        """
+        직전 size - 1 개 값 + value 의 (mid, upper, lower)
+        """
+        previous = self.previous(row, col)
+        if previous is None:
+            return None
+
+        return bollinger_band(previous[0] + value, previous[1] + value * value, self.size, self.width)
+
+    def with_values(self, rows: np.ndarray, col: int, values: np.ndarray) \
+            -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        with_value 의 여러 종목 버전, 모자라면 NaN
+        """
+        end = self._row_start[rows] + self._before[rows, col]
+        begin = end - (self.size - 1)
+        enough = begin >= self._row_start[rows]
+        begin = np.where(enough, begin, end)
+
+        values = values.astype(np.float64)
+        mid, upper, lower = self._band(
+            self._sums[end] - self._sums[begin] + values,
+            self._sq_sums[end] - self._sq_sums[begin] + values * values,
+        )
+        mid[~enough] = upper[~enough] = lower[~enough] = np.nan
+        return mid, upper, lower
+
+    def _band(self, total: np.ndarray, total_sq: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        mid = total / self.size
+        std = np.sqrt(np.maximum(total_sq / self.size - mid * mid, 0))
+        return mid, mid + self.width * std, mid - self.width * std
@@ -10,6 +10,8 @@ T = TypeVar('T')
 
 @dataclass
 class Candle:
+    __slots__ = ('code', 'date', 'open', 'close', 'low', 'high', 'vol')
+
     code: str
     date: date
     open: int
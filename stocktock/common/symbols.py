@@ -0,0 +1,58 @@
+# noinspection SpellCheckingInspection
+__author__ = 'wookjae.jo'
+
+from typing import *
+
+T = TypeVar('T')
+
+
+def short_code(code: str) -> str:
+    """
+    'A005930' -> '005930'
+    """
+    return code[-6:]
+
+
+class SymbolIndex(Generic[T]):
+    """
+    종목 마스터 인덱스 - code, name 속성을 가진 종목 객체를
+    단축코드(005930), A 접두 코드(A005930), 종목명 어느 것으로든 O(1) 조회
+    """
+
+    def __init__(self, symbols: Iterable[T]):
+        self.symbols: List[T] = list(symbols)
+        self._by_code: Dict[str, T] = {}
+        self._by_name: Dict[str, T] = {}
+
+        for symbol in self.symbols:
+            # 중복이면 먼저 나온 종목 우선 - 기존 선형 탐색과 같은 결과
+            self._by_code.setdefault(short_code(symbol.code), symbol)
+            self._by_name.setdefault(symbol.name, symbol)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __contains__(self, code: str):
+        return short_code(code) in self._by_code
+
+    def get(self, code: str) -> Optional[T]:
+        """
+        코드(단축코드, A 접두 코드 모두 가능)로 조회
+        """
+        return self._by_code.get(short_code(code))
+
+    def get_by_name(self, name: str) -> Optional[T]:
+        return self._by_name.get(name)
+
+    def find(self, key: str) -> Optional[T]:
+        """
+        코드 또는 종목명으로 조회
+        """
+        return self.get(key) or self.get_by_name(key)
+
+    def get_name(self, code: str) -> Optional[str]:
+        symbol = self.get(code)
+        return symbol.name if symbol else None
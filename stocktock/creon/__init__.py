@@ -15,7 +15,6 @@ def keep_connection():
             logging.error('Failed to keep connection with CreonPlus.', exc_info=e)
 
 
-connector.connect()
-connector.wait_connection()
+# 연결은 첫 COM 요청 시 (com.client) - import 만으로는 연결하지 않는다
 
 # Thread(target=keep_connection).start()
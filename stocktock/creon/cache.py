@@ -0,0 +1,200 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time as _time
+import zlib
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import *
+
+import numpy as np
+
+from model import CandleBatch
+
+CACHE_PATH = os.path.join(Path.home(), '.creon.charts.sqlite')
+
+KST = timezone(timedelta(hours=9))
+
+# 이 시각 이후면 당일 차트도 더 바뀌지 않는다고 본다 (시간외 단일가 종료)
+SESSION_CLOSED_AT = time(18, 0)
+
+
+def closed_until(now: datetime = None) -> date:
+    """
+    차트가 확정된 마지막 날
+    """
+    now = now or datetime.now(KST)
+    today = now.date()
+    return today if now.time() >= SESSION_CLOSED_AT else today - timedelta(days=1)
+
+
+def month_buckets(begin: date, end: date) -> List[Tuple[date, date]]:
+    """
+    begin ~ end 에 걸친 달력 월 구간 (1일 ~ 말일) - 캐시 키 단위
+    """
+    buckets = []
+    first = begin.replace(day=1)
+    while first <= end:
+        following = (first + timedelta(days=32)).replace(day=1)
+        buckets.append((first, following - timedelta(days=1)))
+        first = following
+
+    return buckets
+
+
+def _encode(batch: CandleBatch) -> bytes:
+    # 컬럼별 int64 배열 - date(YYYYMMDD), time(HHMM), open, high, low, close, vol
+    return zlib.compress(np.stack(batch.columns()).astype(np.int64).tobytes())
+
+
+def _decode(code: str, data: bytes) -> CandleBatch:
+    columns = np.frombuffer(zlib.decompress(data), dtype=np.int64).reshape(7, -1)
+    return CandleBatch(code, *columns)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total * 100 if total else 0
+
+
+class ChartCache:
+    """
+    확정된 차트 조회 결과 캐시 (SQLite)
+    (code, chart_type, period, begin, end) 해시가 키이고 begin ~ end 는 달력 월(month_buckets) 단위이다.
+    수정주가라 권리락/액면분할 등이 있으면 과거 값이 바뀌므로 종목별로 하루 한번 확인(verified)하고 지운다.
+    전체 크기가 max_bytes 를 넘으면 가장 오래 조회되지 않은 항목부터 지운다.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._verified: Dict[str, date] = {}  # 종목 → 수정주가 변경을 확인한 closed_until
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS charts ('
+            'key TEXT PRIMARY KEY, code TEXT NOT NULL, chart_type TEXT NOT NULL, period INTEGER NOT NULL, '
+            'begin TEXT NOT NULL, end TEXT NOT NULL, data BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS charts_accessed ON charts (accessed)')
+        self._conn.commit()
+
+    @classmethod
+    def key(cls, code: str, chart_type: str, period: int, begin: date, end: date) -> str:
+        return hashlib.sha1(f'{code}|{chart_type}|{period}|{begin.isoformat()}|{end.isoformat()}'.encode()).hexdigest()
+
+    def get(self, key: str, code: str) -> Optional[CandleBatch]:
+        with self._lock:
+            row = self._conn.execute('SELECT data FROM charts WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            self.stats.hits += 1
+            self._conn.execute('UPDATE charts SET accessed = ? WHERE key = ?', (_time.time(), key))
+            self._conn.commit()
+
+        return _decode(code, row[0])
+
+    def put(self, key: str, code: str, chart_type: str, period: int, begin: date, end: date,
+            batch: CandleBatch):
+        data = _encode(batch)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO charts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, code, chart_type, period, begin.isoformat(), end.isoformat(), data, len(data), _time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM charts').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        for key, size in self._conn.execute('SELECT key, size FROM charts ORDER BY accessed').fetchall():
+            if total <= self.max_bytes:
+                break
+
+            self._conn.execute('DELETE FROM charts WHERE key = ?', (key,))
+            total -= size
+            self.stats.evictions += 1
+
+    def get_or_request(
+            self,
+            code: str,
+            chart_type: str,
+            period: int,
+            begin: date,
+            end: date,
+            request: Callable[[], CandleBatch]
+    ) -> CandleBatch:
+        """
+        캐시에 있으면 반환, 없으면 request() 결과를 저장 후 반환
+        """
+        key = self.key(code, chart_type, period, begin, end)
+        batch = self.get(key, code)
+        if batch is None:
+            batch = request()
+            self.put(key, code, chart_type, period, begin, end, batch)
+
+        return batch
+
+    def latest(self, code: str) -> Optional[Tuple[str, int, CandleBatch]]:
+        """
+        종목의 가장 최근 구간 (chart_type, period, batch)
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT chart_type, period, data FROM charts WHERE code = ? ORDER BY end DESC LIMIT 1', (code,)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        chart_type, period, data = row
+        return chart_type, period, _decode(code, data)
+
+    def is_verified(self, code: str) -> bool:
+        with self._lock:
+            return self._verified.get(code) == closed_until()
+
+    def verified(self, code: str):
+        with self._lock:
+            self._verified[code] = closed_until()
+
+    def invalidate(self, code: str = None):
+        """
+        수정주가 반영 등으로 과거 차트가 바뀐 경우 삭제 - code 가 없으면 전체
+        """
+        with self._lock:
+            if code:
+                self._conn.execute('DELETE FROM charts WHERE code = ?', (code,))
+            else:
+                self._conn.execute('DELETE FROM charts')
+            self._conn.commit()
+
+
+_cache: Optional[ChartCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> ChartCache:
+    global _cache
+
+    with _cache_lock:
+        if _cache is None:
+            _cache = ChartCache()
+            logging.debug(f'Chart cache opened: {_cache.path}')
+
+    return _cache
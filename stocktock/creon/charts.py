@@ -1,7 +1,10 @@
-from datetime import datetime, timezone, timedelta, date
+import logging
+from datetime import timezone, timedelta, date
 
-from model import Candle
+from model import Candle, CandleBatch
+from .cache import get_cache, closed_until, month_buckets
 from .com import *
+from .scheduler import Priority
 from .exceptions import CreonRequestError
 from .stocks import find
 
@@ -22,14 +25,111 @@ class ChartType(Enum):
                 return chart_type
 
 
-# noinspection DuplicatedCode
-@limit_safe(req_type=ReqType.NON_TRADE)
-def request_by_term(code: str, chart_type: ChartType, begin: date, end: date, period=1):
+# 요청항목 - 날짜,시간,시가,고가,저가,종가,거래량
+_FIELDS = [0, 1, 2, 3, 4, 5, 8]
+
+
+def decode(chart, code: str) -> CandleBatch:
+    """
+    StockChart 응답을 필드별로 한번에 읽어 정렬된 CandleBatch 로 (크레온은 최신 순으로 준다)
+    """
+    count = chart.GetHeaderValue(3)
+    get_data_value = chart.GetDataValue
+    rows = range(count)
+    columns = [[get_data_value(field, i) for i in rows] for field in range(len(_FIELDS))]
+    return CandleBatch(code, *columns).sorted()
+
+
+def request_by_term(code: str, chart_type: ChartType, begin: date, end: date, period=1) -> List[Candle]:
+    return request_batch_by_term(code, chart_type, begin, end, period).to_candles()
+
+
+def request_batch_by_term(code: str, chart_type: ChartType, begin: date, end: date, period=1,
+                          use_cache=True) -> CandleBatch:
+    """
+    확정된(closed_until 까지) 달은 월 단위로 차트 캐시에서, 나머지는 크레온에 요청
+    캐시에 없는 이웃한 달(과 장이 끝나지 않은 날)은 한 번에 요청한다.
+    use_cache: DB 적재(백필)처럼 다시 읽지 않을 조회는 False - 캐시를 거치지 않고 그대로 요청
+    """
     code = find(code).code
+    if not use_cache:
+        return _request_by_term(code, chart_type, begin, end, period)
+
+    cache = get_cache()
+    closed = closed_until()
+    buckets = [bucket for bucket in month_buckets(begin, min(end, closed)) if bucket[1] <= closed]
+    if buckets:
+        verify_adjustment(code)
+
+    # (시작, 끝, 캐시 키 - 캐시하지 않는 구간은 None, 캐시된 캔들)
+    segments = []
+    for bucket_begin, bucket_end in buckets:
+        key = cache.key(code, chart_type.name, period, bucket_begin, bucket_end)
+        segments.append((bucket_begin, bucket_end, key, cache.get(key, code)))
+
+    live_begin = buckets[-1][1] + timedelta(days=1) if buckets else begin
+    if live_begin <= end:
+        segments.append((live_begin, end, None, None))
+
+    batches = []
+    i = 0
+    while i < len(segments):
+        if segments[i][3] is not None:
+            batches.append(segments[i][3])
+            i += 1
+            continue
+
+        # 캐시에 없는 연속 구간
+        j = i
+        while j + 1 < len(segments) and segments[j + 1][3] is None:
+            j += 1
+
+        fetched = _request_by_term(code, chart_type, segments[i][0], segments[j][1], period)
+        batches.append(fetched)
+        for segment_begin, segment_end, key, _ in segments[i:j + 1]:
+            if key:
+                in_segment = (fetched.dates >= _pack(segment_begin)) & (fetched.dates <= _pack(segment_end))
+                cache.put(key, code, chart_type.name, period, segment_begin, segment_end, fetched.take(in_segment))
+
+        i = j + 1
+
+    batch = CandleBatch.concat(code, batches)
+    in_range = (batch.dates >= _pack(begin)) & (batch.dates <= _pack(end))
+    return batch if in_range.all() else batch.take(in_range)
+
+
+def _pack(d: date) -> int:
+    return d.year * 10000 + d.month * 100 + d.day
+
+
+def verify_adjustment(code: str):
+    """
+    캐시의 마지막 캔들 종가를 새로 조회한 값과 비교해서 다르면(수정주가 변경) 종목 캐시 삭제 - 하루 한번
+    """
+    cache = get_cache()
+    if cache.is_verified(code):
+        return
+
+    latest = cache.latest(code)
+    if latest:
+        chart_type_name, period, cached = latest
+        if len(cached):
+            last = cached[-1]
+            fresh = _request_by_term(code, ChartType.create_by_name(chart_type_name), last.date, last.date, period)
+            same = (fresh.dates == cached.dates[-1]) & (fresh.times == cached.times[-1])
+            if not same.any() or int(fresh.closes[same][0]) != last.close:
+                logging.info(f'Adjusted prices of {code} changed - invalidate the chart cache')
+                cache.invalidate(code)
+
+    cache.verified(code)
+
+
+# noinspection DuplicatedCode
+def _request_by_term(code: str, chart_type: ChartType, begin: date, end: date, period=1) -> CandleBatch:
 
     # noinspection DuplicatedCode
-    @limit_safe(req_type=ReqType.NON_TRADE)
-    def _req(_begin: date, _end: date):
+    @limit_safe(req_type=ReqType.NON_TRADE, priority=Priority.BACKFILL)
+    def _req(_begin: date, _end: date) -> CandleBatch:
         if chart_type == ChartType.MINUTE:
             assert _end - _begin <= timedelta(days=8 * period), f'The period limit exceeded.'
 
@@ -38,7 +138,7 @@ def request_by_term(code: str, chart_type: ChartType, begin: date, end: date, pe
         chart.SetInputValue(1, ord('1'))  # 개수로 받기
         chart.SetInputValue(2, int(_end.strftime('%Y%m%d')))  # 요청 종료일
         chart.SetInputValue(3, int(_begin.strftime('%Y%m%d')))  # 요청 시작일
-        chart.SetInputValue(5, [0, 1, 2, 3, 4, 5, 8])
+        chart.SetInputValue(5, _FIELDS)
         chart.SetInputValue(6, chart_type.value)  # '차트 주기 - 분/틱
         chart.SetInputValue(7, period)  # '차트 주기 - 분/틱
         chart.SetInputValue(9, ord('1'))  # 수정주가 사용
@@ -50,40 +150,10 @@ def request_by_term(code: str, chart_type: ChartType, begin: date, end: date, pe
 
         CreonRequestError.check(chart)
 
-        count = chart.GetHeaderValue(3)
-        items = []
-        for i in range(count):
-            _date = chart.GetDataValue(0, i)  # 날짜
-            _time = chart.GetDataValue(1, i)  # 시간
-            _open = chart.GetDataValue(2, i)  # 시가
-            high = chart.GetDataValue(3, i)  # 고가
-            low = chart.GetDataValue(4, i)  # 저가
-            close = chart.GetDataValue(5, i)  # 종가
-            vol = chart.GetDataValue(6, i)  # 거래량
-            _date = datetime.strptime(str(_date), '%Y%m%d').date()
-            try:
-                _time = datetime.strptime(str(_time), '%H%M').time()
-            except:
-                _time = datetime.strptime('0000', '%H%M').time()
-
-            data = Candle(
-                code=code,
-                date=_date,
-                time=_time,
-                open=_open,
-                high=high,
-                low=low,
-                close=close,
-                vol=vol
-            )
-
-            items.append(data)
-
-        items.sort(key=lambda candle: datetime.combine(candle.date, candle.time))
-        return items
+        return decode(chart, code)
 
     if chart_type == ChartType.MINUTE:
-        result = []
+        batches = []
         b = begin
         while True:
             e = b + timedelta(days=8 * period)
@@ -91,28 +161,31 @@ def request_by_term(code: str, chart_type: ChartType, begin: date, end: date, pe
             if e > end:
                 e = end
 
-            for c in _req(b, e):
-                result.append(c)
+            batches.append(_req(b, e))
 
             if e == end:
                 break
 
             b = e + timedelta(days=1)
 
-        return result
+        return CandleBatch.concat(code, batches)
     else:
         return _req(begin, end)
 
+
+def request(code: str, chart_type: ChartType, count: int = -1) -> List[Candle]:
+    return request_batch(code, chart_type, count).to_candles()
+
+
 # noinspection DuplicatedCode
 @limit_safe(req_type=ReqType.NON_TRADE)
-def request(code: str, chart_type: ChartType, count: int = -1) -> List[Candle]:
+def request_batch(code: str, chart_type: ChartType, count: int = -1) -> CandleBatch:
     code = find(code).code
     chart = stockchart()
     chart.SetInputValue(0, code)  # 종목코드
     chart.SetInputValue(1, ord('2'))  # 개수로 받기
     chart.SetInputValue(4, count)  # 조회 개수
-    # 요청항목 - 날짜,시간,시가,고가,저가,종가,거래량
-    chart.SetInputValue(5, [0, 1, 2, 3, 4, 5, 8])
+    chart.SetInputValue(5, _FIELDS)
     chart.SetInputValue(6, chart_type.value)  # '차트 주기 - 분/틱
     chart.SetInputValue(7, 1)  # 분틱차트 주기
     chart.SetInputValue(9, ord('1'))  # 수정주가 사용
@@ -124,35 +197,4 @@ def request(code: str, chart_type: ChartType, count: int = -1) -> List[Candle]:
 
     CreonRequestError.check(chart)
 
-    count = chart.GetHeaderValue(3)
-    items = []
-    for i in range(count):
-        _date = chart.GetDataValue(0, i)  # 날짜
-        _time = chart.GetDataValue(1, i)  # 시간
-        _open = chart.GetDataValue(2, i)  # 시가
-        high = chart.GetDataValue(3, i)  # 고가
-        low = chart.GetDataValue(4, i)  # 저가
-        close = chart.GetDataValue(5, i)  # 종가
-        vol = chart.GetDataValue(6, i)  # 거래량
-
-        _date = datetime.strptime(str(_date), '%Y%m%d').date()
-        try:
-            _time = datetime.strptime(str(_time), '%H%M').time()
-        except:
-            _time = datetime.strptime('0000', '%H%M').time()
-
-        data = Candle(
-            code=code,
-            date=_date,
-            time=_time,
-            open=_open,
-            high=high,
-            low=low,
-            close=close,
-            vol=vol
-        )
-
-        items.append(data)
-
-    items.sort(key=lambda candle: datetime.combine(candle.date, candle.time))
-    return items
+    return decode(chart, code)
@@ -1,12 +1,85 @@
-import time
+import os
+import threading
 from enum import Enum
 from typing import *
 
-import win32com.client
+from .scheduler import RequestScheduler, Priority
+from .transport import Transport, Win32Transport, FakeTransport
+
+# 녹화 파일 경로를 지정하면 COM 대신 녹화된 응답을 재생 (Linux 테스트/부하 측정)
+FAKE_RECORDING_ENV = 'CREON_FAKE_RECORDING'
+
+_transport: Optional[Transport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> Transport:
+    global _transport
+
+    with _transport_lock:
+        if _transport is None:
+            recording_path = os.environ.get(FAKE_RECORDING_ENV)
+            _transport = FakeTransport.load(recording_path) if recording_path else Win32Transport()
+
+    return _transport
+
+
+def set_transport(transport: Transport):
+    """
+    전송 계층 교체 - creon 하위 모듈을 import 하기 전에 호출
+    """
+    global _transport
+
+    with _transport_lock:
+        _transport = transport
+
+
+_connected = False
+_connect_lock = threading.RLock()
+
+
+def _ensure_connected():
+    """
+    첫 COM 객체 생성 시 한번만 CREON Plus 연결 확인
+    """
+    global _connected
+
+    if _connected:
+        return
+
+    with _connect_lock:
+        if _connected:
+            return
+
+        # 연결 과정에서도 client() 를 부르므로 먼저 표시
+        _connected = True
+        try:
+            from .connection import connector
+            connector.connect()
+            connector.wait_connection()
+        except:
+            _connected = False
+            raise
+
+
+def init_thread():
+    """
+    COM 객체를 쓰는 새 스레드에서 먼저 호출
+    """
+    get_transport().init_thread()
 
 
 def client(dispatch: str):
-    return win32com.client.Dispatch(dispatch)
+    _ensure_connected()
+    return get_transport().dispatch(dispatch)
+
+
+def with_events(obj, handler_class):
+    return get_transport().with_events(obj, handler_class)
+
+
+def pump(timeout: float = 0.01):
+    get_transport().pump(timeout)
 
 
 def cybos():
@@ -18,7 +91,14 @@ def stockcode():
 
 
 def codemgr():
-    return client("CpUtil.CpCodeMgr")
+    # 조회 전용 유틸 객체라 스레드별로 하나만 만들어 재사용
+    if not hasattr(_local_codemgr, 'obj'):
+        _local_codemgr.obj = client("CpUtil.CpCodeMgr")
+
+    return _local_codemgr.obj
+
+
+_local_codemgr = threading.local()
 
 
 def stockmst():
@@ -39,9 +119,44 @@ class ReqType(Enum):
     SUBSCRIBE = 2
 
 
-def limit_safe(req_type: ReqType):
+# 요청 종류별 (횟수, 기간(초)) - 크레온 제한: 주문 15초 20건, 시세 조회 15초 60건
+# 실시간 구독은 빈도가 아니라 동시 구독 수 제한이라 여기서 다루지 않는다 (realtime.MAX_SUBSCRIPTIONS)
+QUOTAS = {
+    ReqType.TRADE: (20, 15),
+    ReqType.NON_TRADE: (60, 15),
+}
+
+# COM 객체는 스레드별로 만들어 재사용
+_local = threading.local()
+
+
+def _remain_count(req_type: ReqType) -> int:
+    if not hasattr(_local, 'cybos'):
+        _local.cybos = cybos()
+
+    return _local.cybos.GetLimitRemainCount(req_type.value)
+
+
+_scheduler: Optional[RequestScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> RequestScheduler:
+    global _scheduler
+
+    with _scheduler_lock:
+        if _scheduler is None:
+            # !!! LimitRemainCount가 1 남았을때 멈추는 것이 경험상 최선 !!!
+            # 이러면 경고 팝업은 안뜨는 듯(경고 팝업 뜨면 프로그램 멈춤)
+            _scheduler = RequestScheduler(QUOTAS, remain_count=_remain_count, min_remain_count=2)
+
+    return _scheduler
+
+
+def limit_safe(req_type: ReqType, priority: Priority = None):
     """
-    요청 제한 방어
+    요청 제한 방어 - 요청 스케줄러에서 차례를 받은 뒤 실행
+    priority 기본값: 주문은 ORDER, 나머지는 QUERY
 
     Usage:
     @limit_safe(req_type=ReqType.TRADE)
@@ -50,17 +165,14 @@ def limit_safe(req_type: ReqType):
 
     """
     assert isinstance(req_type, ReqType), 'Something wrong...'
+    if priority is None:
+        priority = Priority.ORDER if req_type == ReqType.TRADE else Priority.QUERY
 
     def decorator(func):
         assert isinstance(func, Callable), 'Something wrong...'
 
         def run(*arg, **kwargs):
-            # !!! LimitRemainCount가 1 남았을때 멈추는 것이 경험상 최선 !!!
-            # 이러면 경고 팝업은 안뜨는 듯(경고 팝업 뜨면 프로그램 멈춤)
-            while cybos().GetLimitRemainCount(req_type.value) < 2:
-                # limit-remain-count 0이면, 1초 대기
-                time.sleep(1)
-
+            get_scheduler().acquire(req_type, priority)
             return func(*arg, **kwargs)
 
         return run
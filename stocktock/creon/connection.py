@@ -7,17 +7,17 @@ from pathlib import Path
 
 import jsons
 from bson import json_util
-from pywinauto import application
 import logging
 
 from .exceptions import CreonError
 from . import com
-import time
 
 CONFIG_PATH = os.path.join(Path.home(), '.creon.config')
 
-assert ctypes.windll.shell32.IsUserAnAdmin(), 'Not administrator'
-assert application  # Keep importing pywinauto
+
+def _assert_admin():
+    # CREON Plus 클라이언트를 띄우고 죽이려면 관리자 권한 필요
+    assert ctypes.windll.shell32.IsUserAnAdmin(), 'Not administrator'
 
 
 @dataclass
@@ -72,6 +72,11 @@ class CreonConnector:
         if com.cybos().IsConnect:
             return
 
+        if not com.get_transport().requires_client:
+            raise CreonError('Not connected, and the transport cannot start CreonPlus.')
+
+        _assert_admin()
+
         if cls.reconnecting:
             logging.info('Already connecting to CreonPlus.')
             cls.wait_connection()
@@ -1,9 +1,10 @@
 import sys
 from dataclasses import dataclass
 
-import win32com.client
 from PyQt5.QtWidgets import *
 
+from creon.com import client, with_events
+
 subscribers = []
 
 
@@ -54,7 +55,7 @@ class CpEvent:
 class CpPublish:
     def __init__(self, name, serviceID):
         self.name = name
-        self.obj = win32com.client.Dispatch(serviceID)
+        self.obj = client(serviceID)
         self.bIsSB = False
 
     def Subscribe(self, var, caller):
@@ -64,7 +65,7 @@ class CpPublish:
         if len(var) > 0:
             self.obj.SetInputValue(0, var)
 
-        handler = win32com.client.WithEvents(self.obj, CpEvent)
+        handler = with_events(self.obj, CpEvent)
         handler.set_params(self.obj, self.name, caller)
         self.obj.Subscribe()
         self.bIsSB = True
@@ -90,7 +91,7 @@ class CpPB8092news(CpPublish):
 # CpRpMarketWatch : 특징주 포착 통신
 class CpRpMarketWatch:
     def __init__(self):
-        self.objStockMst = win32com.client.Dispatch('CpSysDib.CpMarketWatch')
+        self.objStockMst = client('CpSysDib.CpMarketWatch')
         self.objpbMarket = CpPBMarkeWatch()
         self.objpbNews = CpPB8092news()
         return
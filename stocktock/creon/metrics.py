@@ -2,6 +2,7 @@ import logging
 from enum import Enum
 from typing import *
 
+from common.metric import MovingAverages
 from creon import charts
 from model import Candle
 
@@ -14,10 +15,6 @@ class MA(Enum):
     MA_120 = 120
 
 
-def avg(values: List[int]) -> float:
-    return sum(values) / len(values)
-
-
 class MaCalculator:
     """
     이동 평균 관리자
@@ -37,19 +34,22 @@ class MaCalculator:
                 count=150
             )
 
+        self.averages = MovingAverages.of(self.chart)
+
     def get(self, length: int, cur_price=0, pos=0):
         """
         Ex) 오늘 ma 조회 get(ma, cur_price)
         Ex) 어제 ma 조회 get(ma, pos=-1)
         """
 
-        closes = [cd.close for cd in self.chart] + [cur_price]
+        # 일봉 종가 + [현재가] 에서 pos 위치까지의 length 평균
         if pos:
-            assert len(closes) >= -length + pos, 'Not enough chart'
-            return avg(closes[-length + pos: pos])
+            value = self.averages.get(length, end=len(self.averages) + 1 + pos)
         else:
-            assert len(closes) >= -length, 'Not enough chart'
-            return avg(closes[-length:])
+            value = self.averages.get(length, cur_price=cur_price)
+
+        assert value is not None, 'Not enough chart'
+        return value
 
     def is_straight(self):
         try:
@@ -0,0 +1,274 @@
+"""
+실시간 현재가 구독 (CpSysDib.StockCur)
+체결 이벤트마다 최근 시세 표를 갱신하고 등록된 리스너를 호출한다.
+구독 한도를 넘는 종목은 poll 로 현재가 조회(StockMst2)를 주기적으로 해서 같은 리스너에 넘길 수 있다.
+"""
+import logging
+import queue
+import threading
+import time as _time
+from dataclasses import dataclass
+from datetime import datetime, time
+from typing import *
+
+from . import stocks
+from .com import client, with_events, init_thread, pump
+
+# StockCur 헤더 인덱스
+_CODE = 0
+_OPEN = 4
+_HIGH = 5
+_LOW = 6
+_VOL = 9  # 누적 거래량
+_PRICE = 13
+_TIME = 18  # hhmmss
+_SESSION = 19  # ord('1'): 동시호가(예상체결), ord('2'): 장중
+
+# 크레온 실시간 시세 동시 구독 한도
+MAX_SUBSCRIPTIONS = 400
+
+# 구독하지 못한 종목의 현재가 조회 간격 (초)
+POLL_INTERVAL = 5
+
+
+@dataclass
+class Tick:
+    code: str
+    time: time
+    price: int
+    open: int
+    high: int
+    low: int
+    vol: int
+    expected: bool = False  # 동시호가 예상체결가
+    received: datetime = None
+
+
+class PriceTable:
+    """
+    종목별 최근 체결 - 여러 스레드에서 읽는다
+    """
+
+    def __init__(self):
+        self._ticks: Dict[str, Tick] = {}
+        self._lock = threading.Lock()
+
+    def update(self, tick: Tick):
+        with self._lock:
+            self._ticks[tick.code] = tick
+
+    def get(self, code: str) -> Optional[Tick]:
+        with self._lock:
+            return self._ticks.get(code)
+
+    def price(self, code: str) -> Optional[int]:
+        tick = self.get(code)
+        return tick.price if tick else None
+
+    def __contains__(self, code: str) -> bool:
+        with self._lock:
+            return code in self._ticks
+
+    def __len__(self):
+        with self._lock:
+            return len(self._ticks)
+
+
+class _StockCurEvent:
+    # noinspection PyAttributeOutsideInit
+    def set_params(self, obj, feed: 'PriceFeed'):
+        self.obj = obj
+        self.feed = feed
+
+    def OnReceived(self):
+        self.feed.receive(self.obj)
+
+
+class PriceFeed:
+    """
+    CREON 이벤트는 구독한 스레드의 메시지 펌프에서 전달되므로
+    구독/해지와 펌프는 전용 스레드에서 하고, 리스너는 별도 스레드에서 차례로 호출한다(주문 등으로 펌프가 막히지 않게).
+    """
+
+    def __init__(self):
+        self.table = PriceTable()
+        self._listeners: List[Callable[[Tick], None]] = []
+        self._objects = {}
+        self._wanted: Dict[str, None] = {}  # 구독 요청 순서 - 펌프 스레드가 처리하기 전 종목 포함
+        self._polled: Dict[str, None] = {}
+        self._commands: queue.Queue = queue.Queue()
+        self._ticks: queue.Queue = queue.Queue()
+        self._started = False
+        self._polling = False
+        self._lock = threading.Lock()
+
+    def add_listener(self, listener: Callable[[Tick], None]):
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[Tick], None]):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def subscribe(self, codes: Iterable[str]) -> List[str]:
+        """
+        주어진 순서대로 구독 - 한도(MAX_SUBSCRIPTIONS)를 넘어 구독하지 못한 종목을 반환
+        """
+        self.start()
+        overflow = []
+        with self._lock:
+            for code in codes:
+                if code in self._wanted:
+                    continue
+
+                if len(self._wanted) >= MAX_SUBSCRIPTIONS:
+                    overflow.append(code)
+                    continue
+
+                self._wanted[code] = None
+                self._commands.put((True, code))
+
+        if overflow:
+            logging.warning(f'Too many subscriptions - {len(overflow)} codes are not subscribed: {overflow[:10]}')
+
+        return overflow
+
+    def unsubscribe(self, codes: Iterable[str]):
+        with self._lock:
+            for code in codes:
+                if code in self._wanted:
+                    del self._wanted[code]
+                    self._commands.put((False, code))
+
+    def poll(self, codes: Iterable[str]):
+        """
+        구독 대신 POLL_INTERVAL 초마다 현재가를 조회해서 리스너에 넘긴다
+        """
+        with self._lock:
+            self._polled.update({code: None for code in codes})
+            if self._polling or not self._polled:
+                return
+
+            self._polling = True
+            threading.Thread(target=self._poll, name='PriceFeed-poll', daemon=True).start()
+
+    def subscribed(self) -> List[str]:
+        return list(self._objects.keys())
+
+    def start(self):
+        with self._lock:
+            if self._started:
+                return
+
+            self._started = True
+            threading.Thread(target=self._pump, name='PriceFeed-pump', daemon=True).start()
+            threading.Thread(target=self._dispatch, name='PriceFeed-dispatch', daemon=True).start()
+
+    def _subscribe(self, code: str):
+        if code in self._objects:
+            return
+
+        obj = client('CpSysDib.StockCur')
+        obj.SetInputValue(0, code)
+        handler = with_events(obj, _StockCurEvent)
+        handler.set_params(obj, self)
+        obj.Subscribe()
+        self._objects[code] = obj
+
+    def _unsubscribe(self, code: str):
+        obj = self._objects.pop(code, None)
+        if obj:
+            obj.Unsubscribe()
+
+    def _pump(self):
+        init_thread()
+        while True:
+            try:
+                while True:
+                    is_subscribe, code = self._commands.get_nowait()
+                    if is_subscribe:
+                        self._subscribe(code)
+                    else:
+                        self._unsubscribe(code)
+            except queue.Empty:
+                pass
+            except:
+                logging.exception('Failed to update subscriptions')
+
+            pump()
+
+    def _poll(self):
+        init_thread()
+        while True:
+            with self._lock:
+                codes = list(self._polled)
+
+            try:
+                snapshot = stocks.get_snapshot(codes)
+                received = datetime.now()
+                for detail in snapshot.rows():
+                    tick = Tick(
+                        code=detail.code,
+                        time=time(detail.time // 100, detail.time % 100),
+                        price=detail.price,
+                        open=detail.open,
+                        high=detail.high,
+                        low=detail.low,
+                        vol=detail.volumn_week,
+                        expected=detail.field_25 in ('1', ord('1')),  # 동시호가
+                        received=received
+                    )
+                    self.table.update(tick)
+                    self._ticks.put(tick)
+            except:
+                logging.exception('Failed to poll prices')
+
+            _time.sleep(POLL_INTERVAL)
+
+    def receive(self, obj):
+        """
+        이벤트 핸들러에서 호출 - 시세 표는 바로 갱신하고 리스너 호출은 넘긴다
+        """
+        hhmmss = obj.GetHeaderValue(_TIME)
+        tick = Tick(
+            code=obj.GetHeaderValue(_CODE),
+            time=time(hhmmss // 10000, hhmmss // 100 % 100, hhmmss % 100),
+            price=obj.GetHeaderValue(_PRICE),
+            open=obj.GetHeaderValue(_OPEN),
+            high=obj.GetHeaderValue(_HIGH),
+            low=obj.GetHeaderValue(_LOW),
+            vol=obj.GetHeaderValue(_VOL),
+            expected=obj.GetHeaderValue(_SESSION) == ord('1'),
+            received=datetime.now()
+        )
+        self.table.update(tick)
+        self._ticks.put(tick)
+
+    def _dispatch(self):
+        while True:
+            tick = self._ticks.get()
+            for listener in list(self._listeners):
+                try:
+                    listener(tick)
+                except:
+                    logging.exception(f'Failed to handle the tick of {tick.code}')
+
+
+_feed: Optional[PriceFeed] = None
+_feed_lock = threading.Lock()
+
+
+def get_feed() -> PriceFeed:
+    global _feed
+
+    with _feed_lock:
+        if _feed is None:
+            _feed = PriceFeed()
+
+    return _feed
+
+
+def get_price(code: str) -> Optional[int]:
+    """
+    구독 중인 종목의 최근 체결가, 없으면 None
+    """
+    return get_feed().table.price(code)
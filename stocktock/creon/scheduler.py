@@ -0,0 +1,161 @@
+import collections
+import heapq
+import itertools
+import threading
+import time
+from dataclasses import dataclass
+from enum import IntEnum
+from typing import *
+
+
+class Clock:
+    """
+    스케줄러가 쓰는 시계 - 테스트에서는 FakeClock 으로 바꿔 끼운다
+    """
+
+    def time(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float):
+        time.sleep(seconds)
+
+
+class FakeClock(Clock):
+    """
+    sleep 하면 시간만 흐르는 시계
+    """
+
+    def __init__(self, now: float = 0):
+        self.now = now
+        self._lock = threading.Lock()
+
+    def time(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        with self._lock:
+            self.now += max(seconds, 0)
+
+
+class Priority(IntEnum):
+    """
+    작을수록 먼저
+    """
+    ORDER = 0  # 주문
+    QUERY = 1  # 시세/종목 조회
+    BACKFILL = 2  # 차트 적재 등 급하지 않은 대량 조회
+
+
+class SlidingWindow:
+    """
+    어느 period 초 구간에서도 capacity 개를 넘지 않는다 - 최근 capacity 개 요청 시각을 기억
+    (크레온 서버도 최근 요청 수로 제한하므로 토큰 버킷처럼 가득 찬 상태에서 시작하면 한 구간에 두 배까지 나간다)
+    """
+
+    def __init__(self, capacity: int, period: float, clock: Clock):
+        self.capacity = capacity
+        self.period = period
+        self.clock = clock
+        self.history: Deque[float] = collections.deque(maxlen=capacity)
+
+    def wait_time(self) -> float:
+        """
+        요청할 수 있을 때까지 남은 시간(초), 바로 할 수 있으면 0
+        """
+        if len(self.history) < self.capacity:
+            return 0
+
+        return max(0.0, self.history[0] + self.period - self.clock.time())
+
+    def take(self):
+        self.history.append(self.clock.time())
+
+
+@dataclass
+class SchedulerStats:
+    requests: int = 0
+    waiting: int = 0  # 현재 대기 중인 요청 수
+    total_wait: float = 0  # 누적 대기 시간(초)
+    max_wait: float = 0
+
+    def avg_wait(self) -> float:
+        return self.total_wait / self.requests if self.requests else 0
+
+
+class RequestScheduler:
+    """
+    요청 종류별 요청 제한(SlidingWindow) 스케줄러
+    같은 종류의 요청은 우선순위, 도착 순으로 차례를 받는다.
+    remain_count 가 주어지면 차례를 받은 뒤에도 실제 남은 횟수가 적으면 더 기다린다(다른 프로세스의 요청 대비).
+    """
+
+    def __init__(
+            self,
+            quotas: Dict[Hashable, Tuple[int, float]],
+            clock: Clock = None,
+            remain_count: Callable[[Hashable], int] = None,
+            min_remain_count: int = 2
+    ):
+        self.clock = clock or Clock()
+        self.windows = {key: SlidingWindow(capacity, period, self.clock) for key, (capacity, period) in quotas.items()}
+        self.remain_count = remain_count
+        self.min_remain_count = min_remain_count
+
+        self._stats = {key: SchedulerStats() for key in quotas}
+        self._queues: Dict[Hashable, List[Tuple[int, int]]] = {key: [] for key in quotas}
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def acquire(self, key: Hashable, priority: Priority = Priority.QUERY) -> float:
+        """
+        요청 가능할 때까지 대기, Return: 대기 시간(초)
+        """
+        started = self.clock.time()
+        window = self.windows[key]
+        queue = self._queues[key]
+        stats = self._stats[key]
+        entry = (int(priority), next(self._sequence))
+
+        with self._condition:
+            heapq.heappush(queue, entry)
+            stats.waiting += 1
+            self._condition.notify_all()
+            try:
+                while True:
+                    if queue[0] != entry:
+                        # 앞선 요청이 차례를 받을 때까지 대기
+                        self._condition.wait()
+                        continue
+
+                    wait = window.wait_time()
+                    if wait <= 0:
+                        window.take()
+                        break
+
+                    # 가장 오래된 요청이 구간을 벗어날 때까지 잠금을 풀고 잔다 - 그 사이 더 급한 요청이 오면 순서가 바뀔 수 있다
+                    self._condition.release()
+                    try:
+                        self.clock.sleep(wait)
+                    finally:
+                        self._condition.acquire()
+            finally:
+                queue.remove(entry)
+                heapq.heapify(queue)
+                stats.waiting -= 1
+                self._condition.notify_all()
+
+        if self.remain_count:
+            while self.remain_count(key) < self.min_remain_count:
+                self.clock.sleep(1)
+
+        waited = self.clock.time() - started
+        with self._condition:
+            stats.requests += 1
+            stats.total_wait += waited
+            stats.max_wait = max(stats.max_wait, waited)
+
+        return waited
+
+    def stats(self) -> Dict[Hashable, SchedulerStats]:
+        with self._condition:
+            return {key: SchedulerStats(**stats.__dict__) for key, stats in self._stats.items()}
@@ -1,10 +1,18 @@
 from __future__ import annotations
 
+import json
 import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
 
+import numpy as np
 from retry import retry
 
+from common.symbols import SymbolIndex
 from .com import *
 from .exceptions import CreonRequestError
 
@@ -106,7 +114,65 @@ def get_all(market_type: MarketType) -> List[Stock]:
     return result
 
 
-ALL_STOCKS = get_all(MarketType.KOSPI) + get_all(MarketType.KOSDAQ)
+# 종목 마스터 스냅샷 - TTL 안이면 COM 으로 다시 조회하지 않는다
+SNAPSHOT_PATH = os.path.join(Path.home(), '.creon.stocks.json')
+SNAPSHOT_TTL = 12 * 60 * 60  # seconds
+
+
+def _save_snapshot(stocks: List[Stock], path: str = SNAPSHOT_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([dict(stock.__dict__, market_type=stock.market_type.name) for stock in stocks], f,
+                  ensure_ascii=False)
+
+
+def _load_snapshot(path: str = SNAPSHOT_PATH, ttl: float = SNAPSHOT_TTL) -> Optional[List[Stock]]:
+    if not os.path.isfile(path) or time.time() - os.path.getmtime(path) > ttl:
+        return None
+
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return [Stock(**dict(item, market_type=MarketType[item['market_type']])) for item in json.load(f)]
+    except (ValueError, KeyError, TypeError) as e:
+        logging.warning(f'Broken stock snapshot: {path}', exc_info=e)
+        return None
+
+
+_all_stocks: Optional[List[Stock]] = None
+_symbols: Optional[SymbolIndex[Stock]] = None
+
+
+def get_all_stocks(refresh=False) -> List[Stock]:
+    """
+    코스피 + 코스닥 전 종목 - 스냅샷이 없거나 오래되었으면 COM 으로 조회 후 저장
+    """
+    global _all_stocks, _symbols
+
+    if _all_stocks is None or refresh:
+        stocks = None if refresh else _load_snapshot()
+        if stocks is None:
+            logging.info('Loading all stocks from CreonPlus...')
+            stocks = get_all(MarketType.KOSPI) + get_all(MarketType.KOSDAQ)
+            _save_snapshot(stocks)
+
+        _all_stocks = stocks
+        _symbols = SymbolIndex(stocks)
+
+    return _all_stocks
+
+
+def get_symbols() -> SymbolIndex[Stock]:
+    get_all_stocks()
+    return _symbols
+
+
+def __getattr__(name: str):
+    # ALL_STOCKS, SYMBOLS 는 처음 접근할 때 로드
+    if name == 'ALL_STOCKS':
+        return get_all_stocks()
+    elif name == 'SYMBOLS':
+        return get_symbols()
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class StockNotFound(Exception):
@@ -118,55 +184,123 @@ class StockNotFound(Exception):
 
 
 def find(code: str) -> Optional[Stock]:
-    for stock in ALL_STOCKS:
-        if code in stock.code:
-            return stock
+    stock = get_symbols().find(code)
+    if stock:
+        return stock
 
     raise StockNotFound(code)
 
 
-available_codes = None
+# 종목 속성 일별 스냅샷
+ATTRIBUTES_PATH = os.path.join(Path.home(), '.creon.attributes.npz')
 
 
-def get_availables(init=False) -> List[str]:
-    global available_codes
+@dataclass
+class StockAttributes:
+    """
+    전 종목 속성 - 종목 순서와 같은 컬럼 배열
+    """
+    date: date
+    codes: np.ndarray
+    names: np.ndarray
+    status: np.ndarray  # 0: 정상, 1: 거래정지, 2: 거래중단
+    supervision: np.ndarray  # 0: 일반종목, 1: 관리
+    control_kind: np.ndarray  # 0: 정상, 1: 주의, 2: 경고, 3: 위험예고, 4: 위험
+    section_kind: np.ndarray  # SectionKind 값
+
+    @classmethod
+    def fetch(cls, stocks: List[Stock]) -> StockAttributes:
+        """
+        CodeMgr 하나로 전 종목 속성을 한번에 조회
+        """
+        _codemgr = codemgr()
+        values = np.array([
+            (
+                _codemgr.GetStockStatusKind(stock.code),
+                _codemgr.GetStockSupervisionKind(stock.code),
+                _codemgr.GetStockControlKind(stock.code),
+                _codemgr.GetStockSectionKind(stock.code),
+            ) for stock in stocks
+        ], dtype=np.int16).reshape(len(stocks), 4)
+
+        return StockAttributes(
+            date=date.today(),
+            codes=np.array([stock.code for stock in stocks]),
+            names=np.array([stock.name for stock in stocks]),
+            status=values[:, 0],
+            supervision=values[:, 1],
+            control_kind=values[:, 2],
+            section_kind=values[:, 3],
+        )
 
-    if init:
-        available_codes = None
+    def save(self, path: str = ATTRIBUTES_PATH):
+        with open(path, 'wb') as f:
+            np.savez(f, date=np.array([self.date.toordinal()]), codes=self.codes, names=self.names,
+                     status=self.status, supervision=self.supervision, control_kind=self.control_kind,
+                     section_kind=self.section_kind)
 
-    if available_codes:
-        return available_codes
+    @classmethod
+    def load(cls, path: str = ATTRIBUTES_PATH) -> Optional[StockAttributes]:
+        """
+        오늘 저장한 스냅샷만 사용
+        """
+        if not os.path.isfile(path):
+            return None
 
-    logging.info('Filtering codes...')
-    available_codes = [stock.code for stock in ALL_STOCKS if
-                       get_status(stock.code) == 0 and
-                       get_supervision(stock.code) == 0 and
-                       get_control_kind(stock.code) == 0 and
-                       get_stock_section_kind(stock.code) == SectionKind.CPC_KSE_SECTION_KIND_ST and
-                       '스팩' not in stock.name]
+        with np.load(path) as npz:
+            saved = date.fromordinal(int(npz['date'][0]))
+            if saved != date.today():
+                return None
 
-    return available_codes
+            return StockAttributes(date=saved, **{key: npz[key] for key in npz.files if key != 'date'})
 
+    def available_mask(self) -> np.ndarray:
+        """
+        정상 거래, 관리/투자주의 아님, 주권, 스팩 제외
+        """
+        return (self.status == 0) & \
+               (self.supervision == 0) & \
+               (self.control_kind == 0) & \
+               (self.section_kind == SectionKind.CPC_KSE_SECTION_KIND_ST.value) & \
+               (np.char.find(self.names.astype(str), '스팩') < 0)
+
+
+_attributes: Optional[StockAttributes] = None
+
+
+def get_attributes(refresh=False) -> StockAttributes:
+    global _attributes
+
+    if _attributes is None or refresh or _attributes.date != date.today():
+        attributes = None if refresh else StockAttributes.load()
+        if attributes is None:
+            logging.info('Loading stock attributes...')
+            attributes = StockAttributes.fetch(get_all_stocks())
+            attributes.save()
+
+        _attributes = attributes
+
+    return _attributes
+
+
+def get_availables(init=False) -> List[str]:
+    attributes = get_attributes(refresh=init)
+    return attributes.codes[attributes.available_mask()].tolist()
 
-def get_name(code: str):
-    _stockcode = stockcode()
 
-    for stock in ALL_STOCKS:
-        if code == stock.code:
-            return stock.name
+def get_name(code: str):
+    name = get_symbols().get_name(code)
+    if name:
+        return name
 
-    return _stockcode.CodeToName(code)
+    return stockcode().CodeToName(code)
 
 
 def is_kos(code):
     """
     Is kospi | kosdaq?
     """
-    for stock in ALL_STOCKS:
-        if code == stock.code:
-            return True
-
-    return False
+    return code in get_symbols()
 
 
 @retry(tries=3, delay=1)
@@ -285,69 +419,139 @@ class StockDetail2:
         return self.listed_stock_count * self.price
 
 
+# StockMst2 필드 순서대로 (StockDetail2 필드명, 컬럼 타입)
+_DETAIL_COLUMNS: List[Tuple[str, Any]] = [
+    ('code', object),
+    ('name', object),
+    ('time', np.int64),
+    ('price', np.int64),
+    ('margin', np.int64),
+    ('status', object),
+    ('open', np.int64),
+    ('high', np.int64),
+    ('low', np.int64),
+    ('ask', np.int64),
+    ('bid', np.int64),
+    ('volumn_week', np.int64),
+    ('transaction', np.int64),
+    ('total_selling_balance', np.int64),
+    ('total_buying_balance', np.int64),
+    ('selling_balance', np.int64),
+    ('buying_balance', np.int64),
+    ('listed_stock_count', np.int64),
+    ('foreign_ownership_ratio', np.float64),
+    ('yesterday_close', np.int64),
+    ('yesterday_volumn', np.int64),
+    ('strength', np.float64),
+    ('field_22', np.int64),
+    ('field_23', object),
+    ('field_24', object),
+    ('field_25', object),
+    ('field_26', np.int64),
+    ('field_27', np.int64),
+    ('field_28', object),
+    ('field_29', np.int64),
+]
+
+# StockMst2 한번에 조회 가능한 종목 수
+DETAILS_CHUNK_SIZE = 110
+
+
+class DetailSnapshot:
+    """
+    여러 종목 현재가 - StockDetail2 필드별 컬럼 배열
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray]):
+        self.columns = columns
+        self.codes: List[str] = columns['code'].tolist()
+        self.index: Dict[str, int] = {code: i for i, code in enumerate(self.codes)}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, code: str):
+        return code in self.index
+
+    def column(self, name: str) -> np.ndarray:
+        return self.columns[name]
+
+    @classmethod
+    def empty(cls) -> DetailSnapshot:
+        return DetailSnapshot({name: np.zeros(0, dtype=dtype) for name, dtype in _DETAIL_COLUMNS})
+
+    @classmethod
+    def concat(cls, snapshots: List[DetailSnapshot]) -> DetailSnapshot:
+        if not snapshots:
+            return cls.empty()
+
+        return DetailSnapshot({
+            name: np.concatenate([snapshot.columns[name] for snapshot in snapshots])
+            for name, _ in _DETAIL_COLUMNS
+        })
+
+    def capitalization(self) -> np.ndarray:
+        return self.columns['listed_stock_count'] * self.columns['price']
+
+    def _row(self, i: int) -> StockDetail2:
+        return StockDetail2(**{name: self.columns[name][i].item() if dtype is not object else self.columns[name][i]
+                               for name, dtype in _DETAIL_COLUMNS})
+
+    def get(self, code: str) -> Optional[StockDetail2]:
+        i = self.index.get(code)
+        return None if i is None else self._row(i)
+
+    def rows(self) -> Iterator[StockDetail2]:
+        """
+        기존 StockDetail2 로 보기
+        """
+        return (self._row(i) for i in range(len(self)))
+
+
 @limit_safe(req_type=ReqType.NON_TRADE)
-def get_details(stock_codes: List[str]):
-    def request(codes: List[str]):
-        _stockmst2 = stockmst2()
-        _stockmst2.SetInputValue(0, ','.join(codes))
-
-        try:
-            _stockmst2.BlockRequest()
-        except Exception as e:
-            raise CreonRequestError(str(e))
-
-        CreonRequestError.check(_stockmst2)
-
-        count = _stockmst2.GetHeaderValue(0)
-        result = []
-        for i in range(count):
-            result.append(StockDetail2(
-                code=_stockmst2.GetDataValue(0, i),
-                name=_stockmst2.GetDataValue(1, i),
-                time=_stockmst2.GetDataValue(2, i),
-                price=_stockmst2.GetDataValue(3, i),
-                margin=_stockmst2.GetDataValue(4, i),
-                status=_stockmst2.GetDataValue(5, i),
-                open=_stockmst2.GetDataValue(6, i),
-                high=_stockmst2.GetDataValue(7, i),
-                low=_stockmst2.GetDataValue(8, i),
-                ask=_stockmst2.GetDataValue(9, i),
-                bid=_stockmst2.GetDataValue(10, i),
-                volumn_week=_stockmst2.GetDataValue(11, i),
-                transaction=_stockmst2.GetDataValue(12, i),
-                total_selling_balance=_stockmst2.GetDataValue(13, i),
-                total_buying_balance=_stockmst2.GetDataValue(14, i),
-                selling_balance=_stockmst2.GetDataValue(15, i),
-                buying_balance=_stockmst2.GetDataValue(16, i),
-                listed_stock_count=_stockmst2.GetDataValue(17, i),
-                foreign_ownership_ratio=_stockmst2.GetDataValue(18, i),
-                yesterday_close=_stockmst2.GetDataValue(19, i),
-                yesterday_volumn=_stockmst2.GetDataValue(20, i),
-                strength=_stockmst2.GetDataValue(21, i),
-                field_22=_stockmst2.GetDataValue(22, i),
-                field_23=_stockmst2.GetDataValue(23, i),
-                field_24=_stockmst2.GetDataValue(24, i),
-                field_25=_stockmst2.GetDataValue(25, i),
-                field_26=_stockmst2.GetDataValue(26, i),
-                field_27=_stockmst2.GetDataValue(27, i),
-                field_28=_stockmst2.GetDataValue(28, i),
-                field_29=_stockmst2.GetDataValue(29, i),
-            ))
-
-        return result
-
-    stock_codes = stock_codes.copy()
-    while stock_codes:
-        req_limit = 110
-        partial_codes = []
-        for _ in range(req_limit):
-            if stock_codes:
-                partial_codes.append(stock_codes.pop())
-            else:
-                break
-
-        for detail in request(partial_codes):
-            yield detail
+def _request_details(codes: List[str]) -> DetailSnapshot:
+    _stockmst2 = stockmst2()
+    _stockmst2.SetInputValue(0, ','.join(codes))
+
+    try:
+        _stockmst2.BlockRequest()
+    except Exception as e:
+        raise CreonRequestError(str(e))
+
+    CreonRequestError.check(_stockmst2)
+
+    count = _stockmst2.GetHeaderValue(0)
+    get_value = _stockmst2.GetDataValue
+    return DetailSnapshot({
+        name: np.array([get_value(field, i) for i in range(count)], dtype=dtype)
+        for field, (name, dtype) in enumerate(_DETAIL_COLUMNS)
+    })
+
+
+def iter_detail_chunks(stock_codes: List[str], workers: int = 4) -> Iterator[DetailSnapshot]:
+    """
+    DETAILS_CHUNK_SIZE 개씩 나누어 동시에 요청하고 도착하는 순서대로 반환
+    요청 수는 요청 스케줄러가 제한하므로 워커는 차례가 오는 대로 요청을 이어간다
+    """
+    chunks = [stock_codes[i:i + DETAILS_CHUNK_SIZE] for i in range(0, len(stock_codes), DETAILS_CHUNK_SIZE)]
+    if len(chunks) <= 1:
+        for chunk in chunks:
+            yield _request_details(chunk)
+        return
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(chunks)), initializer=init_thread) as executor:
+        futures = [executor.submit(_request_details, chunk) for chunk in chunks]
+        for future in as_completed(futures):
+            yield future.result()
+
+
+def get_snapshot(stock_codes: List[str], workers: int = 4) -> DetailSnapshot:
+    return DetailSnapshot.concat(list(iter_detail_chunks(stock_codes, workers=workers)))
+
+
+def get_details(stock_codes: List[str]) -> Iterator[StockDetail2]:
+    for chunk in iter_detail_chunks(stock_codes):
+        yield from chunk.rows()
 
 
 def get_yesterday_close(code: str):
@@ -1,14 +1,13 @@
 from dataclasses import dataclass
 from enum import Enum
+from typing import *
 
-import win32com.client
-
-from creon.com import limit_safe, ReqType
+from creon.com import limit_safe, ReqType, client
 
 
 @limit_safe(req_type=ReqType.NON_TRADE)
 def get_themes():
-    cpsvr_8561 = win32com.client.Dispatch('Dscbo1.CpSvr8561')
+    cpsvr_8561 = client('Dscbo1.CpSvr8561')
     cpsvr_8561.BlockRequest()
     count = cpsvr_8561.GetHeaderValue(0)
     result = {}
@@ -22,7 +21,7 @@ def get_themes():
 
 
 def get_theme(code: str):
-    cpsvr_8562 = win32com.client.Dispatch('Dscbo1.CpSvr8562')
+    cpsvr_8562 = client('Dscbo1.CpSvr8562')
     cpsvr_8562.SetInputValue(0, code)
     cpsvr_8562.BlockRequest()
     count = cpsvr_8562.GetHeaderValue(0)
@@ -33,7 +32,24 @@ def get_theme(code: str):
     return theme_codes
 
 
-ALL_THEMES = get_themes()
+_all_themes: Optional[Dict[int, str]] = None
+
+
+def get_all_themes() -> Dict[int, str]:
+    global _all_themes
+
+    if _all_themes is None:
+        _all_themes = get_themes()
+
+    return _all_themes
+
+
+def __getattr__(name: str):
+    # ALL_THEMES 는 처음 접근할 때 조회
+    if name == 'ALL_THEMES':
+        return get_all_themes()
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 @dataclass
@@ -51,7 +67,7 @@ class StockByTheme:
 
 @limit_safe(req_type=ReqType.NON_TRADE)
 def get_stocks(theme_code):
-    cpsvr_8561t = win32com.client.Dispatch('Dscbo1.CpSvr8561T')
+    cpsvr_8561t = client('Dscbo1.CpSvr8561T')
     cpsvr_8561t.SetInputValue(0, theme_code)
     cpsvr_8561t.BlockRequest()
     count = cpsvr_8561t.GetHeaderValue(1)
@@ -61,7 +77,7 @@ def get_stocks(theme_code):
     for i in range(count):
         stock_by_theme = StockByTheme(
             theme_code=theme_code,
-            theme_name=ALL_THEMES.get(theme_code),
+            theme_name=get_all_themes().get(theme_code),
             code=cpsvr_8561t.GetDataValue(0, i),
             name=cpsvr_8561t.GetDataValue(1, i),
             price=cpsvr_8561t.GetDataValue(2, i),
@@ -98,7 +114,7 @@ class RankingItem:
 
 @limit_safe(req_type=ReqType.NON_TRADE)
 def get_ranking(ranking_type: RankingType):
-    cpsvr_8563 = win32com.client.Dispatch('Dscbo1.CpSvr8563')
+    cpsvr_8563 = client('Dscbo1.CpSvr8563')
     cpsvr_8563.SetInputValue(0, ranking_type.value)
     cpsvr_8563.BlockRequest()
     count = cpsvr_8563.GetHeaderValue(0)
@@ -1,17 +1,18 @@
+import collections
 import logging
+import queue
+import threading
+import time
 from dataclasses import dataclass
 from datetime import datetime
 
-import win32com.client
-
 from creon import stocks
 from creon.com import *
 
-all_stocks = stocks.get_all(stocks.MarketType.KOSPI) + stocks.get_all(stocks.MarketType.KOSDAQ)
-td_util = win32com.client.Dispatch('CpTrade.CpTdUtil')
+_td_util = None
 
 
-def init():
+def _trade_init(td_util):
     init_code = td_util.TradeInit()
     init_codes = {
         -1: '오류',
@@ -23,7 +24,22 @@ def init():
     assert init_code == 0, init_codes.get(init_code)
 
 
-init()
+def get_td_util():
+    """
+    주문 초기화(TradeInit)는 처음 주문/계좌 조회 시 한번만
+    """
+    global _td_util
+
+    if _td_util is None:
+        td_util = client('CpTrade.CpTdUtil')
+        _trade_init(td_util)
+        _td_util = td_util
+
+    return _td_util
+
+
+def init():
+    get_td_util()
 
 
 # enum 주문 상태 세팅용
@@ -68,64 +84,393 @@ class VirtualOrder:
         self.total_price = self.order_price * self.order_count
 
 
+@dataclass
+class Account:
+    number: str  # 계좌번호
+    goods: str  # 상품구분 - 주식 상품 중 첫번째
+
+
+_account: Optional[Account] = None
+
+
+def get_account() -> Account:
+    """
+    계좌 정보는 처음 한번만 조회
+    """
+    global _account
+
+    if _account is None:
+        acc = get_td_util().AccountNumber[0]
+        _account = Account(number=acc, goods=get_td_util().GoodsList(acc, 1)[0])
+
+    return _account
+
+
+class OrderState(Enum):
+    QUEUED = 'QUEUED'  # 요청 대기
+    SUBMITTED = 'SUBMITTED'  # 주문 접수
+    PARTIALLY_FILLED = 'PARTIALLY_FILLED'
+    FILLED = 'FILLED'
+    REJECTED = 'REJECTED'
+
+
+@dataclass
+class OrderTicket:
+    order_type: OrderType
+    code: str
+    price: int
+    count: int
+    state: OrderState = OrderState.QUEUED
+    order_num: Optional[int] = None
+    filled_count: int = 0
+    filled_total: int = 0
+    error: Optional[str] = None
+    queued_at: float = None
+    submitted_at: Optional[float] = None
+    done_at: Optional[float] = None
+
+    def __post_init__(self):
+        self.queued_at = time.monotonic()
+        self.taken = False  # 주문 스레드가 요청을 시작했는지
+        self._submitted = threading.Event()
+        self._done = threading.Event()
+
+    def is_done(self) -> bool:
+        return self.state in (OrderState.FILLED, OrderState.REJECTED)
+
+    def wait_submitted(self, timeout: float = None) -> bool:
+        return self._submitted.wait(timeout)
+
+    def wait(self, timeout: float = None) -> bool:
+        """
+        체결 완료 또는 거부까지 대기
+        """
+        return self._done.wait(timeout)
+
+    def avg_price(self) -> Optional[float]:
+        return self.filled_total / self.filled_count if self.filled_count else None
+
+
+class LatencyStats:
+    """
+    최근 max_size 개 지연 시간(초)의 백분위
+    """
+
+    def __init__(self, max_size: int = 1000):
+        self._values: Deque[float] = collections.deque(maxlen=max_size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._values.append(seconds)
+
+    def __len__(self):
+        return len(self._values)
+
+    def percentile(self, p: float) -> Optional[float]:
+        with self._lock:
+            values = sorted(self._values)
+
+        if not values:
+            return None
+
+        return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        return {f'p{p}': self.percentile(p) for p in (50, 90, 99)}
+
+
+# CpDib.CpConclusion 체결구분코드
+_CONCLUDED = '1'  # 체결
+_CONFIRMED = '2'  # 확인
+_REFUSED = '3'  # 거부
+_RECEIVED = '4'  # 접수
+
+
+class _ConclusionEvent:
+    # noinspection PyAttributeOutsideInit
+    def set_params(self, obj, manager: 'OrderManager'):
+        self.obj = obj
+        self.manager = manager
+
+    def OnReceived(self):
+        self.manager.conclude(
+            order_num=self.obj.GetHeaderValue(5),
+            flag=self.obj.GetHeaderValue(14),
+            count=self.obj.GetHeaderValue(3),
+            price=self.obj.GetHeaderValue(4)
+        )
+
+
 class OrderManager:
+    """
+    주문 큐 - 전용 스레드 하나가 TRADE 요청 제한 안에서 차례로 주문하고
+    같은 스레드에서 체결 이벤트(CpDib.CpConclusion)를 받아 주문 상태를 갱신한다.
+    주문 스레드 초기화(TradeInit 등)가 실패하면 대기 중인 주문은 모두 거부하고,
+    RESTART_INTERVAL 초 동안 들어오는 주문도 바로 거부한 뒤 다음 주문에서 다시 초기화한다.
+    """
+
+    RESTART_INTERVAL = 10
+
+    # 주문 응답보다 먼저 온 체결 이벤트 보관 - 다른 곳(HTS 등)에서 낸 주문의 이벤트도 들어오므로 제한
+    EARLY_EVENT_TTL = 60
+    MAX_EARLY_EVENTS = 1000
+
+    # 끝난(체결 완료, 거부) 주문은 _tickets 에서 빼서 최근 MAX_HISTORY 개만 보관
+    MAX_HISTORY = 1000
+
+    def __init__(self):
+        self.submit_latency = LatencyStats()  # 큐 → 접수
+        self.fill_latency = LatencyStats()  # 큐 → 체결 완료
+        self._queue: queue.Queue = queue.Queue()
+        self._tickets: Dict[int, OrderTicket] = {}  # 주문번호 → 진행 중인 주문
+        self._history: Deque[OrderTicket] = collections.deque(maxlen=self.MAX_HISTORY)
+        # 주문번호 → (처음 받은 시각, 이벤트 목록) - 받은 순서
+        self._early_events: 'collections.OrderedDict[int, Tuple[float, List[Tuple[str, int, int]]]]' = \
+            collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._started = False
+        self._init_error: Optional[str] = None
+        self._failed_at: Optional[float] = None
+        self._td_311 = None
+        self._conclusion = None
+
+    def _start(self):
+        # self._lock 안에서 호출
+        if self._started:
+            return
+
+        self._started = True
+        threading.Thread(target=self._work, name='OrderManager', daemon=True).start()
+
+    def start(self):
+        with self._lock:
+            self._start()
+
+    def submit(self, order_type: OrderType, code: str, price: int, count: int) -> OrderTicket:
+        """
+        주문을 큐에 넣고 바로 반환
+        """
+        ticket = OrderTicket(order_type=order_type, code=code, price=price, count=count)
+        with self._lock:
+            if self._failed_at is not None and time.monotonic() - self._failed_at < self.RESTART_INTERVAL:
+                self._reject(ticket, f'Order manager is not available: {self._init_error}')
+                return ticket
+
+            self._start()
+            self._queue.put(ticket)
+
+        return ticket
+
+    def order(self, order_type: OrderType, code: str, price: int, count: int, timeout: float = 60):
+        """
+        주문 접수까지 대기, Return: 주문번호
+        timeout 초 안에 접수되지 않으면 RuntimeError - 아직 요청 전이면 주문도 취소된다
+        """
+        ticket = self.submit(order_type=order_type, code=code, price=price, count=count)
+        if not ticket.wait_submitted(timeout):
+            with self._lock:
+                if ticket.state == OrderState.QUEUED and not ticket.taken:
+                    self._reject(ticket, f'Timed out after {timeout} seconds')
+                    raise RuntimeError(f'Order timeout: {code} - not requested in {timeout} seconds')
+
+            raise RuntimeError(f'Order timeout: {code} - requested but no response in {timeout} seconds')
+
+        if ticket.state == OrderState.REJECTED:
+            raise RuntimeError(f'Order failure: {ticket.error}')
+
+        return ticket.order_num
+
+    def pending(self) -> List[OrderTicket]:
+        with self._lock:
+            return list(self._tickets.values())
+
+    def history(self) -> List[OrderTicket]:
+        """
+        최근 끝난 주문 - 오래된 순
+        """
+        with self._lock:
+            return list(self._history)
+
+    def _init_worker(self):
+        init_thread()
+        get_td_util()
+        self._td_311 = client('CpTrade.CpTd0311')
+        self._conclusion = client('CpDib.CpConclusion')
+        handler = with_events(self._conclusion, _ConclusionEvent)
+        handler.set_params(self._conclusion, self)
+        self._conclusion.Subscribe()
+
+    def _work(self):
+        try:
+            self._init_worker()
+        except Exception as e:
+            logging.exception('Failed to initialize the order manager')
+            with self._lock:
+                self._started = False
+                self._init_error = f'{type(e).__name__}: {e}'
+                self._failed_at = time.monotonic()
+                while True:
+                    try:
+                        self._reject(self._queue.get_nowait(), self._init_error)
+                    except queue.Empty:
+                        break
+            return
+
+        with self._lock:
+            self._init_error = None
+            self._failed_at = None
+
+        while True:
+            try:
+                ticket = self._queue.get(timeout=0.01)
+            except queue.Empty:
+                pump(0)
+                continue
+
+            with self._lock:
+                # order() 에서 시간 초과로 취소된 주문
+                if ticket.state != OrderState.QUEUED:
+                    continue
+
+                ticket.taken = True
+
+            try:
+                self._submit(ticket)
+            except Exception as e:
+                logging.exception(f'Failed to order {ticket.code}')
+                self._reject(ticket, str(e))
+
+            pump(0)
 
     @limit_safe(req_type=ReqType.TRADE)
-    def order(self, order_type: OrderType, code: str, price: int, count: int):
-        logging.info(f'Trying to order {code} - {price} * {count}')
-        acc = td_util.AccountNumber[0]  # 계좌번호
-        acc_flag = td_util.GoodsList(acc, 1)  # 주식상품 구분
-        td_311 = win32com.client.Dispatch("CpTrade.CpTd0311")
-        td_311.SetInputValue(0, order_type.value)  # 1: 매도, 2: 매수
-        td_311.SetInputValue(1, acc)  # 계좌번호
-        td_311.SetInputValue(2, acc_flag[0])  # 상품구분 - 주식 상품 중 첫번째
-        td_311.SetInputValue(3, code)  # 종목코드
-        td_311.SetInputValue(4, count)  # 매수수량
-        td_311.SetInputValue(5, price)  # 주문단가 - 필요한 가격으로 변경 필요
+    def _submit(self, ticket: OrderTicket):
+        logging.info(f'Trying to order {ticket.code} - {ticket.price} * {ticket.count}')
+        account = get_account()
+        td_311 = self._td_311
+        td_311.SetInputValue(0, ticket.order_type.value)  # 1: 매도, 2: 매수
+        td_311.SetInputValue(1, account.number)  # 계좌번호
+        td_311.SetInputValue(2, account.goods)  # 상품구분
+        td_311.SetInputValue(3, ticket.code)  # 종목코드
+        td_311.SetInputValue(4, ticket.count)  # 매수수량
+        td_311.SetInputValue(5, ticket.price)  # 주문단가
         td_311.SetInputValue(7, "0")  # 주문 조건 구분 코드, 0: 기본 1: IOC 2:FOK
         td_311.SetInputValue(8, "01")  # 주문호가 구분코드 - 01: 보통
         ret = td_311.BlockRequest()
         logging.info(f'td_311.BlockRequest() => {ret}')
 
-        # 만약 4를 리턴받은 경우는 15초동안 호출 제한을 초과한 경우로 잠시 후 다시 요청이 필요 합니다.
-        # assert ret == 0, f'주문 요청 오류({ret})'  # 0: 정상,  그 외 오류, 4: 주문요청제한 개수 초과
         req_status = td_311.GetDibStatus()
         err_msg = td_311.GetDibMsg1()
-        if req_status == 0 or req_status == -1:  # -1 미보유
-            order_detail = {
-                '주문종목코드': td_311.GetHeaderValue(0),
-                '계좌번호': td_311.GetHeaderValue(1),
-                '상품관리구분코드': td_311.GetHeaderValue(2),
-                '종목코드': td_311.GetHeaderValue(3),
-                '주문수량': td_311.GetHeaderValue(4),
-                '주문단가': td_311.GetHeaderValue(5),
-                '주문번호': td_311.GetHeaderValue(8),
-                '계좌명': td_311.GetHeaderValue(9),
-                '종목명': td_311.GetHeaderValue(10),
-                '주문조건구분코드': td_311.GetHeaderValue(12),
-            }
-
-            str_order_detail = ', '.join([f'{key}: {value}' for key, value in order_detail.items()])
-            logging.info(f'ORDER COMPLETE: {str_order_detail}')
-            order_num = order_detail.get('주문번호')
-            self.review(order_num)
-            return order_num
-        else:
-            raise RuntimeError(f'Order failure: {err_msg}')
-
-    def review(self, order_num: int):
-        # todo: 1분뒤
-        # todo: 미체결 확인
-        pass
+        if req_status != 0 and req_status != -1:  # -1 미보유
+            self._reject(ticket, err_msg)
+            return
+
+        ticket.order_num = td_311.GetHeaderValue(8)
+        ticket.submitted_at = time.monotonic()
+        self.submit_latency.record(ticket.submitted_at - ticket.queued_at)
+        logging.info(f'ORDER COMPLETE: {ticket.code}({td_311.GetHeaderValue(10)}) {ticket.order_type.name} '
+                     f'{ticket.price} * {ticket.count} - 주문번호: {ticket.order_num}')
+
+        with self._lock:
+            ticket.state = OrderState.SUBMITTED
+            self._tickets[ticket.order_num] = ticket
+            _, early_events = self._early_events.pop(ticket.order_num, (None, []))
+
+        ticket._submitted.set()
+
+        # 주문 응답보다 먼저 받은 체결 이벤트
+        for flag, count, price in early_events:
+            self._apply(ticket, flag, count, price)
+
+    def _reject(self, ticket: OrderTicket, error: str):
+        ticket.state = OrderState.REJECTED
+        ticket.error = error
+        ticket.done_at = time.monotonic()
+        ticket._submitted.set()
+        ticket._done.set()
+
+    def conclude(self, order_num: int, flag: str, count: int, price: int):
+        """
+        체결 이벤트 - 이벤트 핸들러에서 호출
+        """
+        with self._lock:
+            ticket = self._tickets.get(order_num)
+            if not ticket:
+                self._keep_early_event(order_num, (flag, count, price))
+                return
+
+        self._apply(ticket, flag, count, price)
+
+    def _keep_early_event(self, order_num: int, event: Tuple[str, int, int]):
+        # self._lock 안에서 호출
+        now = time.monotonic()
+        while self._early_events:
+            received, _ = next(iter(self._early_events.values()))
+            if now - received < self.EARLY_EVENT_TTL and len(self._early_events) < self.MAX_EARLY_EVENTS:
+                break
+
+            self._early_events.popitem(last=False)
+
+        if order_num not in self._early_events:
+            self._early_events[order_num] = (now, [])
+
+        self._early_events[order_num][1].append(event)
+
+    def _apply(self, ticket: OrderTicket, flag: str, count: int, price: int):
+        if ticket.is_done():
+            return
+
+        if flag == _REFUSED:
+            logging.warning(f'Order refused: {ticket.order_num} {ticket.code}')
+            self._reject(ticket, '주문 거부')
+            self._retire(ticket)
+            return
+
+        if flag != _CONCLUDED:
+            return
+
+        ticket.filled_count += count
+        ticket.filled_total += count * price
+        if ticket.filled_count < ticket.count:
+            ticket.state = OrderState.PARTIALLY_FILLED
+            return
+
+        ticket.state = OrderState.FILLED
+        ticket.done_at = time.monotonic()
+        self.fill_latency.record(ticket.done_at - ticket.queued_at)
+        ticket._done.set()
+        self._retire(ticket)
+        logging.info(f'ORDER FILLED: {ticket.order_num} {ticket.code} {ticket.filled_count} @ {ticket.avg_price()}')
+
+    def _retire(self, ticket: OrderTicket):
+        """
+        끝난 주문을 진행 중 목록에서 빼서 기록으로 옮긴다
+        """
+        with self._lock:
+            if self._tickets.pop(ticket.order_num, None) is ticket:
+                self._history.append(ticket)
+
+
+_order_manager: Optional[OrderManager] = None
+_order_manager_lock = threading.Lock()
+
+
+def get_order_manager() -> OrderManager:
+    global _order_manager
+
+    with _order_manager_lock:
+        if _order_manager is None:
+            _order_manager = OrderManager()
+
+    return _order_manager
 
 
 # 예약 주문 내역 조회 및 미체결 리스트 구하기
 def order_list():
-    acc = td_util.AccountNumber[0]  # 계좌번호
-    acc_flag = td_util.GoodsList(acc, 1)  # 주식상품 구분
-    td_9065 = win32com.client.Dispatch("CpTrade.CpTd9065")
-    td_9065.SetInputValue(0, acc)
-    td_9065.SetInputValue(1, acc_flag[0])
+    account = get_account()
+    td_9065 = client("CpTrade.CpTd9065")
+    td_9065.SetInputValue(0, account.number)
+    td_9065.SetInputValue(1, account.goods)
     td_9065.SetInputValue(2, 20)
 
     while True:  # 연속 조회로 전체 예약 주문 가져온다.
@@ -156,10 +501,15 @@ def order_list():
 
 
 def buy(code, price, count):
-    order_manager = OrderManager()
-    order_manager.order(order_type=OrderType.BUY, code=code, price=price, count=count)
+    return get_order_manager().order(order_type=OrderType.BUY, code=code, price=price, count=count)
 
 
 def sell(code, price, count):
-    order_manager = OrderManager()
-    order_manager.order(order_type=OrderType.SELL, code=code, price=price, count=count)
+    return get_order_manager().order(order_type=OrderType.SELL, code=code, price=price, count=count)
+
+
+def submit(order_type: OrderType, code: str, price: int, count: int) -> OrderTicket:
+    """
+    접수를 기다리지 않는 주문 - 여러 건을 연달아 낼 때
+    """
+    return get_order_manager().submit(order_type=order_type, code=code, price=price, count=count)
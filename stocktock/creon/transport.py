@@ -0,0 +1,395 @@
+"""
+크레온 COM 전송 계층
+Win32Transport: 실제 CREON Plus COM 객체 (Windows)
+FakeTransport: 녹화된 응답을 재생하고 요청 제한을 흉내내는 가짜 객체 (Linux 테스트, 부하 측정)
+RecordingTransport: 실제 요청/응답을 FakeTransport 가 읽는 JSON 으로 녹화
+"""
+import abc
+import collections
+import json
+import logging
+import threading
+import time
+from typing import *
+
+from .scheduler import Clock
+
+# 요청 제한 종류 - com.ReqType 값과 같다
+_TRADE = 0
+_NON_TRADE = 1
+
+# 요청 제한 초과 시 BlockRequest 반환값
+LIMIT_EXCEEDED = 4
+
+
+def _key(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, default=str)
+
+
+def req_type_of(prog_id: str) -> int:
+    """
+    주문/계좌(CpTrade.*)는 TRADE, 나머지 BlockRequest 는 NON_TRADE
+    """
+    return _TRADE if prog_id.startswith('CpTrade.') else _NON_TRADE
+
+
+class Transport(abc.ABC):
+
+    @abc.abstractmethod
+    def dispatch(self, prog_id: str):
+        """
+        prog_id 의 COM 객체(또는 같은 인터페이스의 객체) 생성
+        """
+        pass
+
+    @abc.abstractmethod
+    def with_events(self, obj, handler_class):
+        """
+        obj 의 Received 이벤트를 handler_class 인스턴스로 받는다
+        """
+        pass
+
+    @property
+    def requires_client(self) -> bool:
+        """
+        CREON Plus 클라이언트 실행/로그인이 필요한지
+        """
+        return False
+
+    def init_thread(self):
+        """
+        새 스레드에서 COM 객체를 쓰기 전에 호출
+        """
+        pass
+
+    def pump(self, timeout: float):
+        """
+        실시간 이벤트 전달 - 구독한 스레드에서 반복 호출
+        """
+        time.sleep(timeout)
+
+
+class Win32Transport(Transport):
+
+    def __init__(self):
+        # pywinauto 를 win32com 보다 먼저 import 해야 COM 스레드 모델이 맞게 설정된다
+        import pywinauto
+        import win32com.client
+        assert pywinauto
+        self._client = win32com.client
+
+    def dispatch(self, prog_id: str):
+        return self._client.Dispatch(prog_id)
+
+    def with_events(self, obj, handler_class):
+        return self._client.WithEvents(obj, handler_class)
+
+    def init_thread(self):
+        import pythoncom
+        pythoncom.CoInitialize()
+
+    def pump(self, timeout: float):
+        import pythoncom
+        pythoncom.PumpWaitingMessages()
+        time.sleep(timeout)
+
+    @property
+    def requires_client(self) -> bool:
+        return True
+
+
+class RateLimiter:
+    """
+    종류별 period 초 동안 capacity 회 - 크레온 서버의 요청 제한 흉내
+    """
+
+    def __init__(self, quotas: Dict[int, Tuple[int, float]], clock: Clock):
+        self.quotas = quotas
+        self.clock = clock
+        self._history: Dict[int, Deque[float]] = {req_type: collections.deque() for req_type in quotas}
+
+    def _expire(self, req_type: int):
+        _, period = self.quotas[req_type]
+        history = self._history[req_type]
+        now = self.clock.time()
+        while history and history[0] <= now - period:
+            history.popleft()
+
+    def remain_count(self, req_type: int) -> int:
+        self._expire(req_type)
+        capacity, _ = self.quotas[req_type]
+        return capacity - len(self._history[req_type])
+
+    def hit(self, req_type: int) -> bool:
+        """
+        요청 기록, 제한을 넘었으면 False
+        """
+        if self.remain_count(req_type) <= 0:
+            return False
+
+        self._history[req_type].append(self.clock.time())
+        return True
+
+
+class FakeComObject:
+    """
+    녹화된 응답을 재생하는 COM 객체 흉내
+    - SetInputValue / BlockRequest / GetHeaderValue / GetDataValue / GetDibStatus / GetDibMsg1
+    - 그 외 메소드 호출과 속성은 녹화된 calls / properties 에서 찾는다
+    """
+
+    def __init__(self, prog_id: str, transport: 'FakeTransport'):
+        self.__dict__.update({
+            '_prog_id': prog_id,
+            '_transport': transport,
+            '_inputs': {},
+            '_response': None,
+            '_status': 0,
+            '_message': '',
+            '_handler': None,
+        })
+
+    def SetInputValue(self, index: int, value):
+        self._inputs[str(index)] = value
+
+    def BlockRequest(self):
+        self._response, self._status, self._message = self._transport.request(self._prog_id, self._inputs)
+        return LIMIT_EXCEEDED if self._status == LIMIT_EXCEEDED else 0
+
+    def Request(self):
+        return self.BlockRequest()
+
+    def GetDibStatus(self):
+        return self._status
+
+    def GetDibMsg1(self):
+        return self._message
+
+    def GetHeaderValue(self, index: int):
+        return self._response['headers'][str(index)]
+
+    def GetDataValue(self, field: int, row: int):
+        return self._response['data'][str(field)][row]
+
+    @property
+    def Continue(self):
+        return self._response.get('continue', 0) if self._response else 0
+
+    def Subscribe(self):
+        self._transport.subscribe(self)
+
+    def Unsubscribe(self):
+        self._transport.unsubscribe(self)
+
+    def fire(self, headers: Dict[str, Any]):
+        """
+        실시간 이벤트 발생 - 구독 중인 핸들러의 OnReceived 호출
+        """
+        self.__dict__['_response'] = {'headers': headers, 'data': {}}
+        if self._handler:
+            self._handler.OnReceived()
+
+    def __getattr__(self, name: str):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        transport = self._transport
+        if transport.has_property(self._prog_id, name):
+            return transport.get_property(self._prog_id, name)
+
+        return lambda *args: transport.call(self._prog_id, name, list(args))
+
+
+class FakeCybos(FakeComObject):
+    """
+    CpUtil.CpCybos - 항상 연결된 상태, 남은 요청 수는 RateLimiter 기준
+    """
+
+    @property
+    def IsConnect(self):
+        return 1
+
+    def GetLimitRemainCount(self, req_type: int):
+        return self._transport.limiter.remain_count(req_type)
+
+    def PlusDisconnect(self):
+        pass
+
+
+class FakeTransport(Transport):
+    """
+    녹화 파일 형식(JSON):
+    {
+      "requests": [{"prog_id": ..., "inputs": {"0": ...}, "headers": {"0": ...}, "data": {"0": [...]},
+                    "status": 0, "message": ""}],
+      "calls": [{"prog_id": ..., "method": ..., "args": [...], "result": ...}],
+      "properties": [{"prog_id": ..., "name": ..., "value": ...}]
+    }
+    같은 (prog_id, inputs) 녹화가 여러 개면 순서대로 재생하고 마지막 응답을 반복한다.
+    """
+
+    QUOTAS = {
+        _TRADE: (20, 15),
+        _NON_TRADE: (60, 15),
+    }
+
+    # 동시 구독 한도
+    MAX_SUBSCRIPTIONS = 400
+
+    def __init__(self, recordings: Dict[str, list] = None, clock: Clock = None, latency: float = 0,
+                 quotas: Dict[int, Tuple[int, float]] = None, max_subscriptions: int = MAX_SUBSCRIPTIONS):
+        recordings = recordings or {}
+        self.clock = clock or Clock()
+        self.latency = latency
+        self.limiter = RateLimiter(quotas or self.QUOTAS, self.clock)
+        self.max_subscriptions = max_subscriptions
+        self.request_count = 0
+        self.subscriptions: List[FakeComObject] = []
+        self._lock = threading.Lock()
+
+        self._requests: Dict[Tuple[str, str], Deque[dict]] = collections.defaultdict(collections.deque)
+        for request in recordings.get('requests', []):
+            self._requests[(request['prog_id'], _key(request.get('inputs', {})))].append(request)
+
+        self._calls = {(call['prog_id'], call['method'], _key(call.get('args', []))): call['result']
+                       for call in recordings.get('calls', [])}
+        self._properties = {(prop['prog_id'], prop['name']): prop['value']
+                            for prop in recordings.get('properties', [])}
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> 'FakeTransport':
+        with open(path, 'r', encoding='utf-8') as f:
+            return FakeTransport(json.load(f), **kwargs)
+
+    def dispatch(self, prog_id: str):
+        if prog_id == 'CpUtil.CpCybos':
+            return FakeCybos(prog_id, self)
+
+        return FakeComObject(prog_id, self)
+
+    def with_events(self, obj: FakeComObject, handler_class):
+        handler = handler_class()
+        obj.__dict__['_handler'] = handler
+        return handler
+
+    def request(self, prog_id: str, inputs: Dict[str, Any]) -> Tuple[Optional[dict], int, str]:
+        if self.latency:
+            self.clock.sleep(self.latency)
+
+        with self._lock:
+            if not self.limiter.hit(req_type_of(prog_id)):
+                return None, LIMIT_EXCEEDED, '요청 제한 초과'
+
+            self.request_count += 1
+            responses = self._requests.get((prog_id, _key(inputs)))
+            if not responses:
+                return None, -1, f'No recorded response: {prog_id} {inputs}'
+
+            response = responses.popleft() if len(responses) > 1 else responses[0]
+
+        return response, response.get('status', 0), response.get('message', '')
+
+    def has_property(self, prog_id: str, name: str) -> bool:
+        return (prog_id, name) in self._properties
+
+    def get_property(self, prog_id: str, name: str):
+        return self._properties[(prog_id, name)]
+
+    def call(self, prog_id: str, method: str, args: list):
+        key = (prog_id, method, _key(args))
+        if key not in self._calls:
+            raise LookupError(f'No recorded call: {prog_id}.{method}({args})')
+
+        return self._calls[key]
+
+    def subscribe(self, obj: FakeComObject):
+        if len(self.subscriptions) >= self.max_subscriptions:
+            raise RuntimeError('Subscription limit exceeded')
+
+        self.subscriptions.append(obj)
+
+    def unsubscribe(self, obj: FakeComObject):
+        if obj in self.subscriptions:
+            self.subscriptions.remove(obj)
+
+
+class _RecordingObject:
+    """
+    실제 COM 객체를 감싸서 입력과 읽은 응답 값을 기록
+    """
+
+    def __init__(self, prog_id: str, obj, recorder: 'RecordingTransport'):
+        self.__dict__.update({'_prog_id': prog_id, '_obj': obj, '_recorder': recorder, '_inputs': {},
+                              '_current': None})
+
+    def SetInputValue(self, index: int, value):
+        self._inputs[str(index)] = value
+        return self._obj.SetInputValue(index, value)
+
+    def BlockRequest(self):
+        result = self._obj.BlockRequest()
+        current = {'prog_id': self._prog_id, 'inputs': dict(self._inputs), 'headers': {}, 'data': {},
+                   'status': self._obj.GetDibStatus(), 'message': self._obj.GetDibMsg1()}
+        self.__dict__['_current'] = current
+        self._recorder.recordings['requests'].append(current)
+        return result
+
+    def GetHeaderValue(self, index: int):
+        value = self._obj.GetHeaderValue(index)
+        if self._current is not None:
+            self._current['headers'][str(index)] = value
+        return value
+
+    def GetDataValue(self, field: int, row: int):
+        value = self._obj.GetDataValue(field, row)
+        if self._current is not None:
+            column = self._current['data'].setdefault(str(field), [])
+            column.extend([None] * (row + 1 - len(column)))
+            column[row] = value
+        return value
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._obj, name)
+        if not callable(attr):
+            self._recorder.recordings['properties'].append({'prog_id': self._prog_id, 'name': name, 'value': attr})
+            return attr
+
+        def call(*args):
+            result = attr(*args)
+            self._recorder.recordings['calls'].append(
+                {'prog_id': self._prog_id, 'method': name, 'args': list(args), 'result': result})
+            return result
+
+        return call
+
+
+class RecordingTransport(Transport):
+    """
+    다른 전송 계층(보통 Win32Transport)의 요청/응답을 녹화 - save 로 FakeTransport 녹화 파일 저장
+    """
+
+    def __init__(self, inner: Transport):
+        self.inner = inner
+        self.recordings = {'requests': [], 'calls': [], 'properties': []}
+
+    def dispatch(self, prog_id: str):
+        return _RecordingObject(prog_id, self.inner.dispatch(prog_id), self)
+
+    def with_events(self, obj, handler_class):
+        return self.inner.with_events(obj._obj if isinstance(obj, _RecordingObject) else obj, handler_class)
+
+    @property
+    def requires_client(self) -> bool:
+        return self.inner.requires_client
+
+    def init_thread(self):
+        self.inner.init_thread()
+
+    def pump(self, timeout: float):
+        self.inner.pump(timeout)
+
+    def save(self, path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.recordings, f, ensure_ascii=False, indent=2, default=str)
+
+        logging.info(f'{len(self.recordings["requests"])} requests recorded: {path}')
@@ -18,9 +18,9 @@ import jsons
 import database.charts
 import database.metrics
 import database.stocks
-from common.model import CandlesGroupByCode
 from common.virtual_account import VirtualAccount, NotEnoughDepositException
-from krx import is_business_day
+from krx import business_days_between
+from .store import DayCandleStore
 
 
 @dataclass
@@ -58,8 +58,24 @@ class DailyLog:
         return self.deposit + self.holding_eval
 
 
+@dataclass
+class BacktestSummary:
+    begin: date
+    end: date
+    elapsed_seconds: int  # 구동시간
+    initial_deposit: int  # 최초 예수금
+    earnings: float  # 수익금
+    earning_rate: float  # 수익율(%)
+    circulation_rate: float  # 순환율(%) - 일별 (보유 종목 평가금액 / 총 평가금액) 평균
+    max_drawdown: float  # 최대 낙폭(%) - 총 평가금액 고점 대비
+    buy_count: int
+    sell_count: int
+
+
 # noinspection PyMethodMayBeStatic
 class AbcBacktest(abc.ABC):
+    # 시작일 이전에 미리 적재할 일봉 기간(일)
+    LOOKBACK_DAYS = 20
 
     def __init__(
             self,
@@ -80,6 +96,9 @@ class AbcBacktest(abc.ABC):
 
         self.comment = ''
 
+        # 백테스트 기간 동안만 유지하는 일봉 저장소
+        self.store: Optional[DayCandleStore] = None
+
     def _try_buy(
             self,
             when: datetime,
@@ -128,21 +147,21 @@ class AbcBacktest(abc.ABC):
     def run(self, d: date):
         pass
 
-    def _evaluate(self, d: date):
-        with database.charts.DayCandlesTable() as day_candles_table:
-            day_candles = day_candles_table.find_all_at(codes=list(self.account.holdings.keys()), at=d)
+    def on_bar(self, now: datetime, candle: database.charts.MinuteCandle):
+        """
+        분봉 이벤트 - run 에서 BarStream.run(self.on_bar) 로 장중 분봉을 흘려보내는 전략이 구현
+        """
+        pass
 
-        def find_day_candle(code: str):
-            for dc in day_candles:
-                if dc.code == code:
-                    return dc
+    def _evaluate(self, d: date):
+        closes = self.store.closes_at(codes=list(self.account.holdings.keys()), at=d)
 
         holding_eval = 0
         absents = []
         for holding in self.account.holdings.values():
-            day_candle = find_day_candle(holding.code)
-            if day_candle:
-                holding_eval += day_candle.close * holding.quantity
+            close = closes.get(holding.code)
+            if close:
+                holding_eval += close * holding.quantity
             else:
                 holding_eval += holding.total()
                 absents.append(holding.code)
@@ -155,37 +174,72 @@ class AbcBacktest(abc.ABC):
             comment=f'Absents: {absents}'
         )
 
-    def start(self):
-        self.start_time = datetime.now()
-        for d in [self.begin + timedelta(days=i) for i in range((self.end - self.begin).days + 1)]:
-            if not is_business_day(d):
-                continue
+    @classmethod
+    def prepare(cls, begin: date, end: date):
+        """
+        같은 기간 백테스트 여러 개를 돌리기 전에 한번만 준비할 것 (예: 파일 캐시 생성)
+        """
+        pass
+
+    @classmethod
+    def load_store(cls, begin: date, end: date) -> DayCandleStore:
+        return DayCandleStore.load(begin=begin - timedelta(days=cls.LOOKBACK_DAYS), end=end)
 
+    def start(self, store: DayCandleStore = None):
+        """
+        store 가 주어지면 일봉을 다시 읽지 않고 사용 - load_store 와 같은 기간을 포함해야 한다
+        """
+        self.start_time = datetime.now()
+        self.store = store or self.load_store(self.begin, self.end)
+        for d in business_days_between(self.begin, self.end):
             logging.info(f'Backtest at {d}')
             self.run(d)
             self.daily_logs.append(self._evaluate(d))
 
         # 백테스트 종료 모든 보유 종목 매도
-        with database.charts.DayCandlesTable() as day_candles_table:
-            day_candles = day_candles_table.find_all_in(
-                codes=list(self.account.holdings.keys()),
-                begin=self.end - timedelta(days=20), end=self.end
+        for code in self.account.holdings.copy():
+            last = self.store.last(code, self.end)
+            self._try_sell(
+                when=datetime.combine(last.date, time(15, 30)),
+                code=code,
+                price=last.close,
+                comment='백테스트 종료'
             )
 
-            day_candles_by_code = CandlesGroupByCode(day_candles)
-
-            for code in self.account.holdings.copy():
-                last = day_candles_by_code.get(code)[-1]
-                self._try_sell(
-                    when=datetime.combine(last.date, time(15, 30)),
-                    code=code,
-                    price=last.close,
-                    comment='백테스트 종료'
-                )
-
+        # 결과 dump 에 저장소가 포함되지 않도록 해제
+        self.store = None
         self.finish_time = datetime.now()
         logging.info(f'FINISHED: took {(self.finish_time - self.start_time).seconds} seconds.')
 
+    def summary(self) -> BacktestSummary:
+        totals = [daily_log.total() for daily_log in self.daily_logs]
+
+        circulation_rate = 0
+        if self.daily_logs:
+            circulation_rate = sum(
+                daily_log.holding_eval / total for daily_log, total in zip(self.daily_logs, totals)
+            ) / len(self.daily_logs) * 100
+
+        max_drawdown = 0
+        peak = self.initial_deposit
+        for total in totals:
+            peak = max(peak, total)
+            max_drawdown = min(max_drawdown, (total - peak) / peak * 100)
+
+        earnings = self.account.deposit - self.initial_deposit
+        return BacktestSummary(
+            begin=self.begin,
+            end=self.end,
+            elapsed_seconds=(self.finish_time - self.start_time).seconds if self.finish_time else 0,
+            initial_deposit=self.initial_deposit,
+            earnings=earnings,
+            earning_rate=round(earnings / self.initial_deposit * 100, 2),
+            circulation_rate=round(circulation_rate, 2),
+            max_drawdown=round(max_drawdown, 2),
+            buy_count=len([event for event in self.events if isinstance(event, BuyEvent)]),
+            sell_count=len([event for event in self.events if isinstance(event, SellEvent)]),
+        )
+
     def dump(self, target_dir) -> str:
         os.makedirs(target_dir, exist_ok=True)
 
@@ -7,15 +7,16 @@ from typing import *
 import database.charts
 import database.metrics
 import database.stocks
+from common.symbols import SymbolIndex
 
 with database.stocks.StockTable() as stock_table:
     stocks = [stock for stock in stock_table.all() if '스팩' not in stock.name]
 
+symbols: SymbolIndex[database.stocks.Stock] = SymbolIndex(stocks)
+
 
 def get_name(code: str):
-    for stock in stocks:
-        if stock.code == code:
-            return stock.name
+    return symbols.get_name(code)
 
 
 def get_fl_map(codes: List[str], begin: date, end: date):
@@ -231,19 +231,13 @@ class XlsxExporter:
             first, last = fl_map.get(code)
             margin_percentage_list.append(((last - first) / first) * 100)
 
-        sum_of_cirulation_rate = 0
-        for dl in self.backtest.daily_logs:
-            sum_of_cirulation_rate += dl.holding_eval / dl.total()
-
-        ciculation_percent = round(sum_of_cirulation_rate / len(self.backtest.daily_logs) * 100, 2)
-        earnings = self.backtest.account.deposit - self.backtest.initial_deposit
-
+        summary = self.backtest.summary()
         row = [
-            self.backtest.begin, self.backtest.end, (self.backtest.finish_time - self.backtest.start_time).seconds,
-            self.backtest.initial_deposit,
-            earnings,  # 수익금
-            round(earnings / self.backtest.initial_deposit * 100, 2),  # 수익율
-            ciculation_percent  # 순환율
+            summary.begin, summary.end, summary.elapsed_seconds,
+            summary.initial_deposit,
+            summary.earnings,  # 수익금
+            summary.earning_rate,  # 수익율
+            summary.circulation_rate  # 순환율
         ]
 
         indexes = InterestIndexes.load(fromdate=self.backtest.begin, todate=self.backtest.end)
@@ -0,0 +1,272 @@
+# noinspection SpellCheckingInspection
+from __future__ import annotations
+
+__author__ = 'wookjae.jo'
+
+import bisect
+import logging
+from dataclasses import dataclass, field
+from multiprocessing import shared_memory
+from datetime import date, datetime
+from typing import *
+
+import numpy as np
+
+from common.metric import BollingerEngine
+from database.charts import DayCandle, DayCandlesTable
+
+
+@dataclass
+class CandleSlice:
+    """
+    한 종목의 기간 일봉 - 거래가 있었던 날만 포함
+    """
+    code: str
+    dates: List[date]
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    vol: np.ndarray
+
+    def __len__(self):
+        return len(self.dates)
+
+
+@dataclass
+class SharedArray:
+    """
+    공유 메모리에 올린 배열 정보 - 다른 프로세스에서 같은 이름으로 붙는다
+    """
+    name: str
+    shape: Tuple[int, ...]
+    dtype: str
+
+
+@dataclass
+class SharedStoreHandle:
+    """
+    공유 메모리 일봉 저장소 핸들 - 피클로 워커 프로세스에 넘긴다
+    """
+    codes: List[str]
+    dates: List[date]
+    arrays: Dict[str, SharedArray]
+
+    # 만든 프로세스가 release 까지 열어두는 공유 메모리 - Windows 는 열린 핸들이 모두 닫히면 매핑이 사라진다
+    owned: List[shared_memory.SharedMemory] = field(default_factory=list, repr=False, compare=False)
+
+    def __getstate__(self):
+        # 워커에는 이름만 넘긴다
+        state = self.__dict__.copy()
+        state.update(owned=[])
+        return state
+
+    def release(self):
+        """
+        공유 메모리 해제, 만든 프로세스에서 모든 워커가 끝난 뒤 호출
+        """
+        for shm in self.owned:
+            shm.close()
+            shm.unlink()
+
+        self.owned = []
+
+
+_SHARED_FIELDS = ('open', 'high', 'low', 'close', 'vol', 'valid')
+
+
+class DayCandleStore:
+    """
+    일봉 컬럼 저장소
+    (종목, 거래일 순번) 으로 인덱싱된 시가/고가/저가/종가/거래량 배열을 메모리에 올려두고 조회한다.
+    거래가 없는 칸은 valid 가 False 이다.
+    """
+
+    def __init__(
+            self,
+            codes: List[str],
+            dates: List[date],
+            open_: np.ndarray,
+            high: np.ndarray,
+            low: np.ndarray,
+            close: np.ndarray,
+            vol: np.ndarray,
+            valid: np.ndarray
+    ):
+        self.codes = codes
+        self.dates = dates
+        self.code_index: Dict[str, int] = {code: i for i, code in enumerate(codes)}
+        self.date_index: Dict[date, int] = {d: i for i, d in enumerate(dates)}
+        self.open = open_
+        self.high = high
+        self.low = low
+        self.close = close
+        self.vol = vol
+        self.valid = valid
+        self._bollinger_engines: Dict[Tuple[int, float], BollingerEngine] = {}
+
+        # attach 로 만든 경우 배열이 가리키는 공유 메모리 - 저장소보다 먼저 닫히면 안 된다
+        self._shared_memories: List[shared_memory.SharedMemory] = []
+
+    @classmethod
+    def load(cls, begin: date, end: date, codes: List[str] = None) -> DayCandleStore:
+        started = datetime.now()
+        with DayCandlesTable() as day_candles_table:
+            rows = day_candles_table.find_values_in(codes=codes, begin=begin, end=end)
+
+        store = cls.from_rows(rows)
+        logging.info(f'{len(rows)} day candles loaded ({len(store.codes)} codes, {len(store.dates)} days) '
+                     f'in {(datetime.now() - started).total_seconds():.1f} seconds.')
+        return store
+
+    @classmethod
+    def from_rows(cls, rows: List[Tuple[str, date, int, int, int, int, int]]) -> DayCandleStore:
+        codes = sorted({row[0] for row in rows})
+        dates = sorted({row[1] for row in rows})
+        code_index = {code: i for i, code in enumerate(codes)}
+        date_index = {d: i for i, d in enumerate(dates)}
+        shape = (len(codes), len(dates))
+
+        open_ = np.zeros(shape, dtype=np.int32)
+        high = np.zeros(shape, dtype=np.int32)
+        low = np.zeros(shape, dtype=np.int32)
+        close = np.zeros(shape, dtype=np.int32)
+        vol = np.zeros(shape, dtype=np.int64)
+        valid = np.zeros(shape, dtype=bool)
+
+        if rows:
+            i = np.fromiter((code_index[row[0]] for row in rows), dtype=np.int64, count=len(rows))
+            j = np.fromiter((date_index[row[1]] for row in rows), dtype=np.int64, count=len(rows))
+            values = np.array([row[2:] for row in rows], dtype=np.int64)
+            open_[i, j] = values[:, 0]
+            high[i, j] = values[:, 1]
+            low[i, j] = values[:, 2]
+            close[i, j] = values[:, 3]
+            vol[i, j] = values[:, 4]
+            valid[i, j] = True
+
+        return cls(codes, dates, open_, high, low, close, vol, valid)
+
+    def share(self) -> SharedStoreHandle:
+        """
+        배열을 공유 메모리로 복사하고 핸들 반환 - 여러 프로세스가 복사 없이 읽기 전용으로 사용
+        """
+        arrays = {}
+        owned = []
+        for name in _SHARED_FIELDS:
+            array: np.ndarray = getattr(self, name)
+            shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            owned.append(shm)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+            arrays.update({name: SharedArray(name=shm.name, shape=array.shape, dtype=array.dtype.str)})
+
+        return SharedStoreHandle(codes=self.codes, dates=self.dates, arrays=arrays, owned=owned)
+
+    @classmethod
+    def attach(cls, handle: SharedStoreHandle) -> DayCandleStore:
+        shared_memories = []
+        arrays = {}
+        for field, shared in handle.arrays.items():
+            shm = shared_memory.SharedMemory(name=shared.name)
+            array = np.ndarray(shared.shape, dtype=np.dtype(shared.dtype), buffer=shm.buf)
+            array.flags.writeable = False
+            shared_memories.append(shm)
+            arrays.update({field: array})
+
+        store = cls(
+            handle.codes, handle.dates,
+            arrays['open'], arrays['high'], arrays['low'], arrays['close'], arrays['vol'], arrays['valid']
+        )
+        store._shared_memories = shared_memories
+        return store
+
+    def ordinal(self, d: date) -> Optional[int]:
+        """
+        거래일 순번, 저장소에 없는 날이면 None
+        """
+        return self.date_index.get(d)
+
+    def _date_range(self, begin: date, end: date) -> slice:
+        return slice(bisect.bisect_left(self.dates, begin), bisect.bisect_right(self.dates, end))
+
+    def _candle(self, i: int, j: int) -> DayCandle:
+        return DayCandle(
+            code=self.codes[i],
+            date=self.dates[j],
+            open=int(self.open[i, j]),
+            close=int(self.close[i, j]),
+            low=int(self.low[i, j]),
+            high=int(self.high[i, j]),
+            vol=int(self.vol[i, j])
+        )
+
+    def get(self, code: str, at: date) -> Optional[DayCandle]:
+        i = self.code_index.get(code)
+        j = self.date_index.get(at)
+        if i is None or j is None or not self.valid[i, j]:
+            return None
+
+        return self._candle(i, j)
+
+    def find_all_at(self, codes: List[str], at: date) -> List[DayCandle]:
+        return [candle for candle in (self.get(code, at) for code in codes) if candle]
+
+    def last(self, code: str, end: date) -> Optional[DayCandle]:
+        """
+        end 이전(포함) 마지막 일봉
+        """
+        i = self.code_index.get(code)
+        if i is None:
+            return None
+
+        days = np.flatnonzero(self.valid[i, :bisect.bisect_right(self.dates, end)])
+        if not len(days):
+            return None
+
+        return self._candle(i, int(days[-1]))
+
+    def slice(self, code: str, begin: date, end: date) -> CandleSlice:
+        i = self.code_index.get(code)
+        if i is None:
+            empty = np.zeros(0, dtype=np.int32)
+            return CandleSlice(code=code, dates=[], open=empty, high=empty, low=empty, close=empty,
+                               vol=np.zeros(0, dtype=np.int64))
+
+        r = self._date_range(begin, end)
+        days = np.flatnonzero(self.valid[i, r]) + r.start
+        return CandleSlice(
+            code=code,
+            dates=[self.dates[j] for j in days],
+            open=self.open[i, days],
+            high=self.high[i, days],
+            low=self.low[i, days],
+            close=self.close[i, days],
+            vol=self.vol[i, days]
+        )
+
+    def bollinger(self, size: int = 20, width: float = 2) -> BollingerEngine:
+        """
+        종가 볼린저 밴드 계산기, 저장소와 수명을 같이 한다
+        """
+        key = (size, width)
+        if key not in self._bollinger_engines:
+            self._bollinger_engines.update({key: BollingerEngine(self.close, self.valid, size=size, width=width)})
+
+        return self._bollinger_engines.get(key)
+
+    def closes_at(self, codes: List[str], at: date) -> Dict[str, int]:
+        """
+        at 일자 종가, 거래가 없는 종목은 제외
+        """
+        j = self.date_index.get(at)
+        if j is None:
+            return {}
+
+        codes = [code for code in codes if code in self.code_index]
+        rows = np.array([self.code_index[code] for code in codes], dtype=np.int64)
+        if not len(rows):
+            return {}
+
+        valid = self.valid[rows, j]
+        closes = self.close[rows, j]
+        return {code: close for code, close, exists in zip(codes, closes.tolist(), valid.tolist()) if exists}
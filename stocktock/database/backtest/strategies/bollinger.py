@@ -1,14 +1,16 @@
 import logging
-import statistics
 from dataclasses import dataclass
 from datetime import date
-from datetime import timedelta, datetime
+from datetime import datetime
 from typing import *
 
-from common.model import CandlesGroupByCode
-from database.charts import DayCandlesTable, MinuteCandlesTable
-from krx import kospi_n_codes
+import numpy as np
+
+from common.metric import bollinger_band
+from database.charts import MinuteCandle
+from database.universe import get_universe
 from ..backtest import AbcBacktest
+from ..stream import BarStream
 
 
 @dataclass
@@ -25,13 +27,12 @@ class BollingerBand:
             raise cls.NotEnoughArgs(f'{len(prices)} input, but {size} needed.')
 
         prices = prices[-size:]
-        ma = sum(prices) / size
+        return cls.of_sums(sum(prices), sum(price * price for price in prices), size)
 
-        return BollingerBand(
-            upper=ma + (2 * statistics.pstdev(prices)),
-            lower=ma - (2 * statistics.pstdev(prices)),
-            mid=ma
-        )
+    @classmethod
+    def of_sums(cls, total: float, total_sq: float, size: int):
+        mid, upper, lower = bollinger_band(total, total_sq, size)
+        return BollingerBand(mid=mid, upper=upper, lower=lower)
 
 
 def is_overlap(bound_1: Tuple[float, float], bound_2: Tuple[float, float]):
@@ -43,6 +44,7 @@ def is_overlap(bound_1: Tuple[float, float], bound_2: Tuple[float, float]):
 
 class BackTest(AbcBacktest):
     BOLLINGER_SIZE = 20
+    LOOKBACK_DAYS = BOLLINGER_SIZE * 2
 
     def __init__(
             self, begin: date, end: date, initial_deposit: int, once_buy_amount: int,
@@ -58,108 +60,108 @@ class BackTest(AbcBacktest):
         self.trailing_stop_rate = trailing_stop_rate
         self.blacklist = blacklist
 
-    def run(self, today: date):
-        with DayCandlesTable() as day_candles_table:
-            codes = kospi_n_codes(today, 300) + list(self.account.holdings.keys())
-            codes = [code for code in codes if code not in self.blacklist]
-            day_candles = day_candles_table.find_all_in(
-                codes=codes,
-                begin=today - timedelta(days=self.BOLLINGER_SIZE * 2),
-                end=today
-            )
-
-            if not day_candles:
-                return
+        # 장중 분봉 이벤트 처리용 하루치 상태
+        self._previous_sums: Dict[str, Tuple[float, float]] = {}
+        self._day_blacklist: List[str] = []
 
-        day_candles_by_code = CandlesGroupByCode(day_candles)
+    @classmethod
+    def prepare(cls, begin: date, end: date):
+        # 워커마다 유니버스 파일을 만들지 않도록 미리 생성
+        get_universe(begin, end)
 
-        whitelist = []
-        for code in day_candles_by_code.codes():
-            day_candles = day_candles_by_code.get(code)
+    def run(self, today: date):
+        col = self.store.ordinal(today)
+        if col is None:
+            return
 
-            try:
-                blg_with_high = BollingerBand.of(
-                    [candle.close for candle in day_candles[:-1]] + [day_candles[-1].high],
-                    self.BOLLINGER_SIZE
-                )
-            except BollingerBand.NotEnoughArgs:
-                continue
+        codes = get_universe(self.begin, self.end).top_n(today, 300) + list(self.account.holdings.keys())
+        codes = [code for code in codes if code not in self.blacklist]
+        bollinger_engine = self.store.bollinger(self.BOLLINGER_SIZE)
 
-            today_candle = day_candles_by_code.get(code)[-1]
-            if blg_with_high.lower > today_candle.low:
-                whitelist.append(code)
+        # 오늘 거래된 종목에 대해 직전 종가들 + 오늘 고가 밴드 하단이 오늘 저가보다 높으면 화이트리스트
+        rows = np.array([self.store.code_index[code] for code in codes if code in self.store.code_index],
+                        dtype=np.int64)
+        rows = rows[self.store.valid[rows, col]]
+        _, _, lower_with_high = bollinger_engine.with_values(rows, col, self.store.high[rows, col])
+        whitelist = [self.store.codes[row] for row in rows[lower_with_high > self.store.low[rows, col]]]
 
         logging.info(f'{len(whitelist)} codes in whitelist.')
-        with MinuteCandlesTable(d=today, time_unit='5m') as minute_candles_table:
-            minute_candles = minute_candles_table.find_all(codes=whitelist + [code for code in self.account.holdings])
-
         logging.info(f'{len(self.account.holdings)} codes in holding.')
 
-        blacklist = []
-        minute_candles.sort(key=lambda mc: datetime.combine(mc.date, mc.time))
-
-        minute_candles_by_minute = {}
-        for minute_candle in minute_candles:
-            now = minute_candle.datetime()
-            if now not in minute_candles_by_minute:
-                minute_candles_by_minute.update({now: []})
-            minute_candles_by_minute.get(now).append(minute_candle)
-
-        for minute in minute_candles_by_minute:
-            for minute_candle in minute_candles_by_minute.get(minute):
-                now = minute_candle.datetime()
-                code = minute_candle.code
-                price = minute_candle.close
-                bollinger = BollingerBand.of(
-                    prices=[dc.close for dc in day_candles_by_code.get(code)[:-1]] + [price],
-                    size=self.BOLLINGER_SIZE
-                )
+        # 종목별 직전 종가 합계, 제곱합 - 분봉마다 현재가만 더해서 밴드 계산
+        self._previous_sums = {}
+        for code in set(whitelist + list(self.account.holdings.keys())):
+            if code in self.store.code_index:
+                previous = bollinger_engine.previous(self.store.code_index[code], col)
+                if previous:
+                    self._previous_sums.update({code: previous})
+
+        self._day_blacklist = []
+        try:
+            BarStream.load(
+                codes=list(self._previous_sums.keys()),
+                begin=today,
+                end=today,
+                time_unit='5m'
+            ).run(self.on_bar)
+        finally:
+            # 결과 dump 에 하루치 상태가 남지 않도록 해제
+            self._previous_sums = {}
+            self._day_blacklist = []
+
+    def on_bar(self, now: datetime, minute_candle: MinuteCandle):
+        code = minute_candle.code
+        price = minute_candle.close
+        blacklist = self._day_blacklist
+
+        total, total_sq = self._previous_sums.get(code)
+        bollinger = BollingerBand.of_sums(total + price, total_sq + price * price, self.BOLLINGER_SIZE)
+
+        if self.account.has(code):
+            # 보유중 - 매도 시그널 확인
+            holding = self.account.holdings.get(code)
+
+            # 최고가 업데이트
+            if price > holding.max:
+                holding.max = price
+
+            revenue = price - holding.avg_price
+            revenue_rate = revenue / holding.avg_price * 100
+
+            if price >= bollinger.upper:
+                self._try_sell(when=now, code=code, price=price, amount_rate=1,
+                               comment=f'현재가 밴드 상단 돌파')
+                blacklist.append(code)
+                return
 
-                if self.account.has(code):
-                    # 보유중 - 매도 시그널 확인
-                    holding = self.account.holdings.get(code)
-
-                    # 최고가 업데이트
-                    if price > holding.max:
-                        holding.max = price
-
-                    revenue = price - holding.avg_price
-                    revenue_rate = revenue / holding.avg_price * 100
-
-                    if price >= bollinger.upper:
-                        self._try_sell(when=now, code=code, price=price, amount_rate=1,
-                                       comment=f'현재가 밴드 상단 돌파')
-                        blacklist.append(code)
-                        continue
-
-                    if revenue_rate <= self.stop_line:
-                        # 추가매수
-                        if code not in blacklist:
-                            self._try_buy(
-                                when=now, code=code,
-                                price=minute_candle.close,
-                                amount=self.once_buy_amount,
-                                comment=f'추가매수(평단: {holding.avg_price}, 현재가 평단 대비: {revenue_rate})'
-                            )
-
-                        # 손절
-                        blacklist.append(code)
-                        continue
-
-                    if revenue_rate >= self.earning_line_min:
-                        # 익절
-                        if revenue_rate >= self.earning_line_max:
-                            self._try_sell(when=now, code=code, price=price, amount_rate=1,
-                                           comment=f'전량 익절 {self.earning_line_max}%+')
-                            blacklist.append(code)
-                            continue
-
-                else:
-                    # 미보유 - 매수 시그널 확인
-                    if price < bollinger.lower and code not in blacklist:
-                        self._try_buy(
-                            when=now, code=code,
-                            price=minute_candle.close,
-                            amount=self.once_buy_amount,
-                            comment=f'현재가 밴드 하단({bollinger})'
-                        )
+            if revenue_rate <= self.stop_line:
+                # 추가매수
+                if code not in blacklist:
+                    self._try_buy(
+                        when=now, code=code,
+                        price=minute_candle.close,
+                        amount=self.once_buy_amount,
+                        comment=f'추가매수(평단: {holding.avg_price}, 현재가 평단 대비: {revenue_rate})'
+                    )
+
+                # 손절
+                blacklist.append(code)
+                return
+
+            if revenue_rate >= self.earning_line_min:
+                # 익절
+                if revenue_rate >= self.earning_line_max:
+                    self._try_sell(when=now, code=code, price=price, amount_rate=1,
+                                   comment=f'전량 익절 {self.earning_line_max}%+')
+                    blacklist.append(code)
+                    return
+
+        else:
+            # 미보유 - 매수 시그널 확인
+            if price < bollinger.lower and code not in blacklist:
+                self._try_buy(
+                    when=now, code=code,
+                    price=minute_candle.close,
+                    amount=self.once_buy_amount,
+                    comment=f'현재가 밴드 하단({bollinger})'
+                )
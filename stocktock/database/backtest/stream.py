@@ -0,0 +1,51 @@
+# noinspection SpellCheckingInspection
+from __future__ import annotations
+
+__author__ = 'wookjae.jo'
+
+import itertools
+from datetime import date, datetime, time
+from typing import *
+
+from database.charts import MinuteCandle, MinuteCandlesTable
+
+BarKey = Tuple[date, time]
+
+
+def bar_key(candle: MinuteCandle) -> BarKey:
+    return candle.date, candle.time
+
+
+class BarStream:
+    """
+    시간순 분봉 스트림 - 같은 시각의 분봉을 묶어서 한 시각씩 흘려보낸다
+    전체를 메모리에 올리거나 정렬하지 않으므로 원본 스트림이 흘려 받는 방식이면 메모리 사용량이 일정하다
+    """
+
+    def __init__(self, candles: Iterable[MinuteCandle]):
+        # 시간순 정렬되어 있어야 한다
+        self.candles = candles
+
+    @classmethod
+    def load(cls, codes: List[str], begin: date, end: date, time_unit='1m') -> BarStream:
+        """
+        분봉 테이블에서 (date, time) 순으로 흘려 받는 스트림
+        """
+
+        def candles():
+            with MinuteCandlesTable(time_unit=time_unit) as minute_candles_table:
+                yield from minute_candles_table.find_range(codes, begin=begin, end=end, use_yield=True)
+
+        return BarStream(candles() if codes else [])
+
+    def __iter__(self) -> Iterator[Tuple[datetime, List[MinuteCandle]]]:
+        for (d, t), bars in itertools.groupby(self.candles, key=bar_key):
+            yield datetime.combine(d, t), list(bars)
+
+    def run(self, on_bar: Callable[[datetime, MinuteCandle], Any]):
+        """
+        시각 순서대로 분봉마다 on_bar(now, candle) 호출
+        """
+        for now, bars in self:
+            for bar in bars:
+                on_bar(now, bar)
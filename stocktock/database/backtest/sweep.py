@@ -0,0 +1,110 @@
+# noinspection SpellCheckingInspection
+__author__ = 'wookjae.jo'
+
+import csv
+import itertools
+import logging
+import multiprocessing
+from dataclasses import dataclass, asdict
+from datetime import date, datetime
+from typing import *
+
+import krx
+from .backtest import AbcBacktest, BacktestSummary
+from .store import DayCandleStore, SharedStoreHandle
+
+
+class ParameterGrid:
+    """
+    파라미터 이름별 후보 값들의 모든 조합
+    ParameterGrid({'stop_line': [-5, -10], 'earning_line_max': [10, 15]}) -> 4 개 조합
+    """
+
+    def __init__(self, grid: Dict[str, Iterable]):
+        self.grid = {name: list(values) for name, values in grid.items()}
+
+    def __len__(self):
+        count = 1
+        for values in self.grid.values():
+            count *= len(values)
+        return count
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        names = list(self.grid.keys())
+        for values in itertools.product(*self.grid.values()):
+            yield dict(zip(names, values))
+
+
+@dataclass
+class SweepResult:
+    params: Dict[str, Any]
+    summary: BacktestSummary
+
+
+# 워커 프로세스의 공유 메모리 일봉 저장소
+_worker_store: Optional[DayCandleStore] = None
+
+
+def _init_worker(handle: SharedStoreHandle):
+    global _worker_store
+    _worker_store = DayCandleStore.attach(handle)
+
+
+def _run(args: Tuple[Type[AbcBacktest], Dict[str, Any], Dict[str, Any]]) -> SweepResult:
+    backtest_class, params, kwargs = args
+    backtest = backtest_class(**kwargs, **params)
+    backtest.start(store=_worker_store)
+    return SweepResult(params=params, summary=backtest.summary())
+
+
+def sweep(
+        backtest_class: Type[AbcBacktest],
+        begin: date,
+        end: date,
+        grid: ParameterGrid,
+        processes: int = None,
+        **kwargs
+) -> List[SweepResult]:
+    """
+    grid 의 모든 조합으로 backtest_class 백테스트를 프로세스 풀에서 실행
+    일봉 저장소는 한번만 읽어서 공유 메모리로 워커들이 같이 쓴다
+    kwargs: 모든 조합에 공통인 생성자 인자
+    """
+    started = datetime.now()
+
+    # 워커들이 각자 받지 않도록 거래일 달력, 전략별 캐시를 미리 준비
+    krx.business_days_between(begin, end)
+    backtest_class.prepare(begin, end)
+
+    handle = backtest_class.load_store(begin, end).share()
+    tasks = [(backtest_class, params, dict(begin=begin, end=end, **kwargs)) for params in grid]
+
+    results = []
+    try:
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(handle,)) as pool:
+            for result in pool.imap_unordered(_run, tasks):
+                results.append(result)
+                logging.info(f'[{len(results)}/{len(tasks)}] {result.params}: '
+                             f'{result.summary.earning_rate}%, MDD {result.summary.max_drawdown}%')
+    finally:
+        handle.release()
+
+    logging.info(f'Sweep finished: {len(results)} runs in {(datetime.now() - started).seconds} seconds.')
+    return results
+
+
+def export_csv(results: List[SweepResult], target_path: str):
+    """
+    조합별 요약을 하나의 표로 저장 - 수익율 내림차순
+    """
+    results = sorted(results, key=lambda result: result.summary.earning_rate, reverse=True)
+    param_names = list(results[0].params.keys()) if results else []
+    summary_names = list(BacktestSummary.__dataclass_fields__.keys())
+
+    with open(target_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(param_names + summary_names)
+        for result in results:
+            summary = asdict(result.summary)
+            writer.writerow([result.params.get(name) for name in param_names] +
+                            [summary.get(name) for name in summary_names])
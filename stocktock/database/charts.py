@@ -1,6 +1,8 @@
 # noinspection SpellCheckingInspection
 __author__ = 'wookjae.jo'
 
+import logging
+import re
 from dataclasses import dataclass
 from datetime import date, time, datetime
 from typing import *
@@ -9,17 +11,20 @@ import sqlalchemy
 from sqlalchemy import Column, Date, Time, Integer, and_, String, BigInteger
 
 from common.model import Candle
+from model import CandleBatch, pack_dates, pack_times
 from config import config
 from .common import AbstractDynamicTable
 
 
 @dataclass
 class DayCandle(Candle):
-    pass
+    __slots__ = ()
 
 
 @dataclass
 class MinuteCandle(Candle):
+    __slots__ = ('time',)
+
     time: time
 
     def datetime(self):
@@ -60,6 +65,40 @@ class DayCandlesTable(AbstractDynamicTable[DayCandle]):
             )
         ).all()
 
+    def find_values_in(self,
+                       codes: List[str] = None,
+                       begin: date = None,
+                       end: date = None) -> List[Tuple[str, date, int, int, int, int, int]]:
+        """
+        find_all_in 과 같은 조건으로 (code, date, open, high, low, close, vol) 튜플 목록 반환
+        엔티티 객체를 만들지 않으므로 대량 조회에 사용
+        """
+        if begin and end:
+            assert end >= begin, 'The end must be later than the begin, or equals'
+
+        return self.session.query(
+            self.proxy.code,
+            self.proxy.date,
+            self.proxy.open,
+            self.proxy.high,
+            self.proxy.low,
+            self.proxy.close,
+            self.proxy.vol,
+        ).filter(
+            and_(
+                self.proxy.code.in_(codes) if codes else True,
+                begin <= self.proxy.date if begin else True,
+                self.proxy.date <= end if end else True,
+            )
+        ).all()
+
+    def find_batch(self, code: str, begin: date = None, end: date = None) -> CandleBatch:
+        """
+        한 종목 일봉을 CandleBatch 로 - 날짜순
+        """
+        rows = sorted(self.find_values_in([code], begin, end), key=lambda row: row[1])
+        return _to_batch(code, rows)
+
     def find_all_at(self, codes: List[str], at: date) -> List[DayCandle]:
         return self.query().filter(
             and_(
@@ -71,8 +110,143 @@ class DayCandlesTable(AbstractDynamicTable[DayCandle]):
     def find(self, code: str, at: date) -> DayCandle:
         return self.query().filter_by(code=code, date=at).first()
 
+    def find_dates(self) -> List[date]:
+        """
+        일봉이 하나라도 있는 날짜 목록
+        """
+        return [row[0] for row in self.session.query(self.proxy.date).distinct().order_by(self.proxy.date).all()]
+
+
+def _to_batch(code: str, rows: List[tuple]) -> CandleBatch:
+    # rows: (code, date, open, high, low, close, vol[, time])
+    return CandleBatch(
+        code,
+        pack_dates(row[1] for row in rows),
+        pack_times(row[7] for row in rows) if rows and len(rows[0]) > 7 else [0] * len(rows),
+        *[[row[i] for row in rows] for i in range(2, 7)]
+    )
+
+
+def _minute_candles_columns() -> List[Column]:
+    return [
+        Column('code', String, primary_key=True),
+        Column('date', Date, primary_key=True),
+        Column('time', Time, primary_key=True),
+        Column('open', Integer, nullable=False),
+        Column('close', Integer, nullable=False),
+        Column('low', Integer, nullable=False),
+        Column('high', Integer, nullable=False),
+        Column('vol', BigInteger, nullable=False)
+    ]
+
+
+def _minute_candles_table_name(time_unit: str):
+    if time_unit == '1m':
+        # minute_candles
+        return 'minute_candles'
+    else:
+        # minute_candles_{unit}
+        return f'minute_candles_{time_unit}'
+
+
+def _month_begin(d: date) -> date:
+    return date(d.year, d.month, 1)
+
+
+def _next_month_begin(d: date) -> date:
+    return date(d.year + 1, 1, 1) if d.month == 12 else date(d.year, d.month + 1, 1)
+
+
+# 이미 만든 월별 파티션 이름
+_created_partitions: Set[str] = set()
+
 
 class MinuteCandlesTable(AbstractDynamicTable[MinuteCandle]):
+    """
+    분봉 테이블 - (code, date, time) 키, date 기준 월별 range 파티션
+    """
+
+    def __init__(self, time_unit='1m', create_if_not_exists: bool = False):
+        super().__init__(
+            engine,
+            MinuteCandle,
+            _minute_candles_table_name(time_unit),
+            _minute_candles_columns(),
+            create_if_not_exists=create_if_not_exists,
+            table_kwargs={'postgresql_partition_by': 'RANGE (date)'}
+        )
+
+    def ensure_partitions(self, begin: date, end: date):
+        """
+        begin ~ end 를 포함하는 월별 파티션이 없으면 생성
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        month = _month_begin(begin)
+        while month <= end:
+            next_month = _next_month_begin(month)
+            partition_name = f'{self.name}_p{month.strftime("%Y%m")}'
+            if partition_name not in _created_partitions:
+                with self.engine.begin() as conn:
+                    conn.execute(
+                        f'CREATE TABLE IF NOT EXISTS {quote(partition_name)} PARTITION OF {quote(self.name)} '
+                        f'FOR VALUES FROM (\'{month.isoformat()}\') TO (\'{next_month.isoformat()}\')'
+                    )
+
+                _created_partitions.add(partition_name)
+
+            month = next_month
+
+    def find_range(self, codes: List[str], begin: date, end: date, use_yield=False) -> Iterable[MinuteCandle]:
+        """
+        여러 날의 분봉을 한번에 조회 - (date, time, code) 순 정렬
+        use_yield 이면 서버 커서로 흘려 받는다
+        """
+        assert end >= begin, 'The end must be later than the begin, or equals'
+        query = self.query().filter(
+            and_(
+                self.proxy.code.in_(codes) if codes else True,
+                begin <= self.proxy.date,
+                self.proxy.date <= end,
+            )
+        ).order_by(self.proxy.date, self.proxy.time, self.proxy.code)
+
+        if use_yield:
+            return query.yield_per(count=1000)
+        else:
+            return query.all()
+
+    def find_all_at(self, codes: List[str], at: date) -> List[MinuteCandle]:
+        return self.find_range(codes, begin=at, end=at)
+
+    def find_batch(self, code: str, begin: date, end: date) -> CandleBatch:
+        """
+        한 종목 분봉을 CandleBatch 로 - 엔티티 객체를 만들지 않는다
+        """
+        assert end >= begin, 'The end must be later than the begin, or equals'
+        rows = self.session.query(
+            self.proxy.code,
+            self.proxy.date,
+            self.proxy.open,
+            self.proxy.high,
+            self.proxy.low,
+            self.proxy.close,
+            self.proxy.vol,
+            self.proxy.time,
+        ).filter(
+            and_(
+                self.proxy.code == code,
+                begin <= self.proxy.date,
+                self.proxy.date <= end,
+            )
+        ).order_by(self.proxy.date, self.proxy.time).all()
+        return _to_batch(code, rows)
+
+
+class DailyMinuteCandlesTable(AbstractDynamicTable[MinuteCandle]):
+    """
+    일자별 분봉 테이블 - minute_candles[_{unit}]_%Y%m%d
+    MinuteCandlesTable 이전 방식, 이전 데이터 조회용
+    """
 
     def __init__(
             self,
@@ -80,31 +254,13 @@ class MinuteCandlesTable(AbstractDynamicTable[MinuteCandle]):
             time_unit='1m',
             create_if_not_exists: bool = False
     ):
-        columns = [
-            Column('code', String, primary_key=True),
-            Column('date', Date, primary_key=True),
-            Column('time', Time, primary_key=True),
-            Column('open', Integer, nullable=False),
-            Column('close', Integer, nullable=False),
-            Column('low', Integer, nullable=False),
-            Column('high', Integer, nullable=False),
-            Column('vol', BigInteger, nullable=False)
-        ]
-
-        if time_unit == '1m':
-            # minute_candles_%Y%m%d
-            table_name = 'minute_candles'
-        else:
-            # minute_candles_{unit}_%Y%m%d
-            table_name = f'minute_candles_{time_unit}'
-
-        table_name += '_' + d.strftime('%Y%m%d')
+        table_name = _minute_candles_table_name(time_unit) + '_' + d.strftime('%Y%m%d')
 
         super().__init__(
             engine,
             MinuteCandle,
             table_name,
-            columns,
+            _minute_candles_columns(),
             create_if_not_exists=create_if_not_exists
         )
 
@@ -114,3 +270,26 @@ class MinuteCandlesTable(AbstractDynamicTable[MinuteCandle]):
             return query.yield_per(count=1000)
         else:
             return query.all()
+
+
+def migrate_minute_candles(time_unit='1m'):
+    """
+    일자별 분봉 테이블을 파티션 분봉 테이블로 옮긴다. 원본 테이블은 남겨둔다.
+    """
+    with MinuteCandlesTable(time_unit=time_unit, create_if_not_exists=True) as minute_candles_table:
+        quote = engine.dialect.identifier_preparer.quote
+        column_names = ', '.join(quote(column.name) for column in minute_candles_table.columns)
+        pattern = re.compile('^' + re.escape(minute_candles_table.name) + r'_(\d{8})$')
+
+        table_names = sorted(name for name in minute_candles_table.inspector.get_table_names() if pattern.match(name))
+        for i, table_name in enumerate(table_names):
+            d = datetime.strptime(pattern.match(table_name).group(1), '%Y%m%d').date()
+            minute_candles_table.ensure_partitions(d, d)
+
+            with engine.begin() as conn:
+                result = conn.execute(
+                    f'INSERT INTO {quote(minute_candles_table.name)} ({column_names}) '
+                    f'SELECT {column_names} FROM {quote(table_name)} ON CONFLICT DO NOTHING'
+                )
+
+            logging.info(f'[{i + 1}/{len(table_names)}] {table_name}: {result.rowcount} rows migrated.')
@@ -1,15 +1,70 @@
 from __future__ import annotations
 
+import io
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass, fields
+from datetime import date, time as time_, datetime
 from typing import *
 
 import sqlalchemy
 from sqlalchemy import MetaData, Column, Table
 from sqlalchemy.engine.reflection import Inspector
-from sqlalchemy.orm import sessionmaker, mapper
+from sqlalchemy.orm import sessionmaker, mapper, Mapper
 
 T = TypeVar('T')
 
 
+@dataclass
+class MappedTable:
+    table: Table
+    proxy: type
+    mapper: Mapper
+    created: bool = False
+
+
+# (DB URL, 테이블명, 엔티티 타입) 별 테이블/프록시/매퍼 - 한번 만들면 재사용
+_mapped_tables: Dict[Tuple[str, str, type], MappedTable] = {}
+
+# DB URL 별 세션 팩토리 - 커넥션은 엔진 풀에서 재사용
+_session_factories: Dict[str, sessionmaker] = {}
+
+_registry_lock = threading.Lock()
+
+
+def get_mapped_table(
+        engine,
+        entity_type: type,
+        name: str,
+        columns: List[Column],
+        table_kwargs: Dict[str, Any] = None
+) -> MappedTable:
+    key = (str(engine.url), name, entity_type)
+    with _registry_lock:
+        if key not in _mapped_tables:
+            table = Table(name, MetaData(), *columns, **(table_kwargs or {}))
+            proxy = type('TableProxy_' + name, (entity_type,), {})
+            _mapped_tables.update({key: MappedTable(table=table, proxy=proxy, mapper=mapper(proxy, table))})
+
+        return _mapped_tables.get(key)
+
+
+def get_session_factory(engine) -> sessionmaker:
+    key = str(engine.url)
+    with _registry_lock:
+        if key not in _session_factories:
+            _session_factories.update({key: sessionmaker(bind=engine)})
+
+        return _session_factories.get(key)
+
+
+def _fields_of(record) -> Dict[str, Any]:
+    # __slots__ 엔티티는 __dict__ 가 없으므로 dataclass 필드로 읽는다
+    return {field.name: getattr(record, field.name) for field in fields(record)}
+
+
 class AbstractDynamicTable(Generic[T]):
 
     def __init__(
@@ -18,47 +73,45 @@ class AbstractDynamicTable(Generic[T]):
             entity_type: type,
             name: str,
             columns: List[Column],
-            create_if_not_exists: bool = False
+            create_if_not_exists: bool = False,
+            table_kwargs: Dict[str, Any] = None
     ):
         self.engine = engine
-        self.inspector = Inspector.from_engine(self.engine)
         self.entity_type = entity_type
         self.name = name
         self.columns = columns
+        self.table_kwargs = table_kwargs
 
         self.proxy = None
         self.table = None
         self.session = None
-        self.conn = None
         self.mapper = None
         self.create_if_not_exists = create_if_not_exists
+        self._inspector = None
+
+    @property
+    def inspector(self) -> Inspector:
+        if not self._inspector:
+            self._inspector = Inspector.from_engine(self.engine)
+
+        return self._inspector
 
     def __enter__(self):
         return self.open()
 
     def open(self):
-        meta = MetaData()
-        self.proxy = type('TableProxy_' + self.name, (self.entity_type,), {})
-
-        # Create table class
-        self.table = Table(
-            self.name,
-            meta,
-            *self.columns
-        )
+        mapped_table = get_mapped_table(self.engine, self.entity_type, self.name, self.columns, self.table_kwargs)
+        self.table = mapped_table.table
+        self.proxy = mapped_table.proxy
+        self.mapper = mapped_table.mapper
 
         # Create table if not exists
-        if self.create_if_not_exists and self.name not in self.inspector.get_table_names():
-            meta.create_all(bind=self.engine, tables=[self.table])
+        if self.create_if_not_exists and not mapped_table.created:
+            self.table.create(bind=self.engine, checkfirst=True)
+            mapped_table.created = True
 
         # Create session
-        self.session = sessionmaker(bind=self.engine)()
-
-        # Connect
-        self.conn = self.engine.connect()
-
-        # Map table with entity class
-        self.mapper = mapper(self.proxy, self.table)
+        self.session = get_session_factory(self.engine)()
 
         return self
 
@@ -66,7 +119,6 @@ class AbstractDynamicTable(Generic[T]):
         self.close()
 
     def close(self):
-        self.conn.close()
         self.session.close()
 
     def query(self):
@@ -92,7 +144,7 @@ class AbstractDynamicTable(Generic[T]):
         Add and commit a record
         """
         # noinspection PyArgumentList
-        self.session.add(self.proxy(**record.__dict__))
+        self.session.add(self.proxy(**_fields_of(record)))
         self.session.commit()
 
     def insert_all(self, records: List[T]):
@@ -101,10 +153,99 @@ class AbstractDynamicTable(Generic[T]):
         """
         for record in records:
             # noinspection PyArgumentList
-            self.session.add(self.proxy(**record.__dict__))
+            self.session.add(self.proxy(**_fields_of(record)))
 
         self.session.commit()
 
+    def bulk_insert(self, records: Iterable[T], ignore_conflicts: bool = True, batch_size: int = 10000,
+                    update_conflicts: bool = False) -> int:
+        """
+        COPY FROM STDIN 으로 대량 적재 (PostgreSQL)
+        ignore_conflicts 이면 임시 테이블에 COPY 한 뒤 INSERT ... ON CONFLICT DO NOTHING 으로 중복을 건너뛴다.
+        update_conflicts 이면 중복 행은 새 값으로 덮어쓴다(ON CONFLICT DO UPDATE).
+        Return: 적재된 행 수
+        """
+        quote = self.engine.dialect.identifier_preparer.quote
+        column_names = ', '.join(quote(column.name) for column in self.columns)
+        target = quote(self.name)
+        staging = quote('staging_' + self.name)
+        ignore_conflicts = ignore_conflicts or update_conflicts
+
+        started = time.time()
+        received = 0
+        raw_conn = self.engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            if ignore_conflicts:
+                cursor.execute(f'CREATE TEMP TABLE {staging} (LIKE {target} INCLUDING DEFAULTS) ON COMMIT DROP')
+
+            records = iter(records)
+            while True:
+                batch = list(itertools.islice(records, batch_size))
+                if not batch:
+                    break
+
+                buffer = io.StringIO()
+                for record in batch:
+                    buffer.write('\t'.join(self._to_copy_value(column, getattr(record, column.name))
+                                           for column in self.columns))
+                    buffer.write('\n')
+
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY {staging if ignore_conflicts else target} ({column_names}) FROM STDIN',
+                                   buffer)
+                received += len(batch)
+
+            if update_conflicts:
+                keys = ', '.join(quote(column.name) for column in self.columns if column.primary_key)
+                updates = ', '.join(f'{quote(column.name)} = EXCLUDED.{quote(column.name)}'
+                                    for column in self.columns if not column.primary_key)
+                # 같은 키가 여러 번 들어오면 DO UPDATE 가 실패하므로 키별 한 행만
+                cursor.execute(f'INSERT INTO {target} ({column_names}) '
+                               f'SELECT DISTINCT ON ({keys}) {column_names} FROM {staging} '
+                               f'ON CONFLICT ({keys}) DO UPDATE SET {updates}')
+                inserted = cursor.rowcount
+            elif ignore_conflicts:
+                cursor.execute(f'INSERT INTO {target} ({column_names}) '
+                               f'SELECT {column_names} FROM {staging} ON CONFLICT DO NOTHING')
+                inserted = cursor.rowcount
+            else:
+                inserted = received
+
+            raw_conn.commit()
+        except:
+            raw_conn.rollback()
+            raise
+        finally:
+            raw_conn.close()
+
+        elapsed = time.time() - started
+        logging.info(f'{self.name}: {inserted}/{received} rows inserted in {elapsed:.2f} seconds '
+                     f'({received / elapsed if elapsed else received:.0f} rows/s)')
+        return inserted
+
+    def _to_copy_value(self, column: Column, value) -> str:
+        """
+        COPY text 포맷 값으로 변환
+        """
+        if isinstance(column.type, sqlalchemy.TypeDecorator):
+            value = column.type.process_bind_param(value, self.engine.dialect)
+
+        if value is None:
+            return '\\N'
+
+        if isinstance(value, (date, time_, datetime)):
+            return value.isoformat()
+
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+
+        return str(value) \
+            .replace('\\', '\\\\') \
+            .replace('\t', '\\t') \
+            .replace('\n', '\\n') \
+            .replace('\r', '\\r')
+
 
 # noinspection PyAbstractClass
 class StringEnum(sqlalchemy.TypeDecorator):
@@ -1,15 +1,20 @@
+from __future__ import annotations
+
+import logging
 from dataclasses import dataclass
 from datetime import date, timedelta
 from typing import *
 
 import numpy as np
 import psycopg2
+import sqlalchemy
 from psycopg2.extensions import register_adapter
 from pykrx import stock as pykrx_stock
 from sqlalchemy import create_engine, Date, Float, Column, BigInteger, String, and_, extract
 
 from config import config
 from .common import AbstractDynamicTable
+from .gaps import Bounds, find_gaps, listing_bounds
 
 psycopg2.extensions.register_adapter(np.int64, psycopg2._psycopg.AsIs)
 
@@ -25,6 +30,18 @@ class Fundamental:
     dps: float
 
 
+@dataclass
+class StockFundamental:
+    code: str
+    date: date
+    bps: float
+    per: float
+    pbr: float
+    eps: float
+    div: float
+    dps: float
+
+
 @dataclass
 class Capital:
     code: str
@@ -86,6 +103,17 @@ class AllCapitalTable(AbstractDynamicTable[Capital]):
             )
         ).all()
 
+    def find_values_in(self, begin: date, end: date) -> List[Tuple[str, date, int]]:
+        """
+        기간 내 (code, date, cap) 튜플 목록 - 엔티티 객체를 만들지 않는 대량 조회용
+        """
+        return self.session.query(self.proxy.code, self.proxy.date, self.proxy.cap).filter(
+            and_(
+                begin <= self.proxy.date,
+                self.proxy.date <= end,
+            )
+        ).all()
+
     def find_all_by_year_and_month(self, year: int, month: int):
         return self.query().filter(
             and_(
@@ -95,84 +123,185 @@ class AllCapitalTable(AbstractDynamicTable[Capital]):
         ).all()
 
 
+FUNDAMENTAL_FIELDS = ('bps', 'per', 'pbr', 'eps', 'div', 'dps')
+
+
+@dataclass
+class FundamentalColumns:
+    """
+    (code, date) 행의 컬럼 배열 - 값이 없으면 NaN
+    """
+    codes: np.ndarray
+    dates: np.ndarray
+    bps: np.ndarray
+    per: np.ndarray
+    pbr: np.ndarray
+    eps: np.ndarray
+    div: np.ndarray
+    dps: np.ndarray
+
+    @classmethod
+    def of(cls, rows: List[tuple]) -> FundamentalColumns:
+        """
+        rows: (code, date, bps, per, pbr, eps, div, dps)
+        """
+        columns = list(zip(*rows)) if rows else [()] * 8
+        return FundamentalColumns(
+            np.array(columns[0], dtype=object),
+            np.array(columns[1], dtype=object),
+            *[np.array(values, dtype=float) for values in columns[2:]]
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    def column(self, name: str) -> np.ndarray:
+        return getattr(self, name)
+
+    def where(self, mask: np.ndarray) -> FundamentalColumns:
+        return FundamentalColumns(*[getattr(self, name)[mask] for name in ('codes', 'dates') + FUNDAMENTAL_FIELDS])
+
+    def rows(self) -> List[StockFundamental]:
+        return [
+            StockFundamental(code, d, *values)
+            for code, d, *values in zip(self.codes, self.dates, *[getattr(self, name).tolist()
+                                                                  for name in FUNDAMENTAL_FIELDS])
+        ]
+
+
+class AllFundamentalTable(AbstractDynamicTable[StockFundamental]):
+    """
+    전 종목 펀더멘털 - (code, date) 키 하나의 테이블
+    """
+
+    def __init__(self, create_if_not_exists: bool = False):
+        columns = [
+            Column('code', String, primary_key=True),
+            Column('date', Date, primary_key=True),
+            Column('bps', Float),
+            Column('per', Float),
+            Column('pbr', Float),
+            Column('eps', Float),
+            Column('div', Float),
+            Column('dps', Float),
+        ]
+
+        super().__init__(engine, StockFundamental, 'fundamentals', columns,
+                         create_if_not_exists=create_if_not_exists)
+
+    def _query_values(self):
+        return self.session.query(
+            self.proxy.code,
+            self.proxy.date,
+            *[getattr(self.proxy, name) for name in FUNDAMENTAL_FIELDS]
+        )
+
+    def find_all_at(self, at: date) -> FundamentalColumns:
+        """
+        한 날짜의 전 종목 값
+        """
+        return FundamentalColumns.of(self._query_values().filter(self.proxy.date == at).all())
+
+    def find_all_in(self, codes: List[str] = None, begin: date = None, end: date = None) -> FundamentalColumns:
+        """
+        (code, date) 순
+        """
+        return FundamentalColumns.of(self._query_values().filter(
+            and_(
+                self.proxy.code.in_(codes) if codes else True,
+                begin <= self.proxy.date if begin else True,
+                self.proxy.date <= end if end else True,
+            )
+        ).order_by(self.proxy.code, self.proxy.date).all())
+
+    def screen(self, at: date, **bounds: Tuple[Optional[float], Optional[float]]) -> FundamentalColumns:
+        """
+        한 날짜에 값이 범위 안인 종목 - 쿼리 한 번
+        Usage: screen(date(2021, 7, 15), per=(0, 10), pbr=(None, 1))
+        """
+        conditions = [self.proxy.date == at]
+        for name, (low, high) in bounds.items():
+            assert name in FUNDAMENTAL_FIELDS, f'Not supported field: {name}'
+            if low is not None:
+                conditions.append(getattr(self.proxy, name) >= low)
+            if high is not None:
+                conditions.append(getattr(self.proxy, name) <= high)
+
+        return FundamentalColumns.of(self._query_values().filter(and_(*conditions)).all())
+
+    def upsert(self, records: Iterable[StockFundamental]) -> int:
+        return self.bulk_insert(records, update_conflicts=True)
+
+
 def _date_to_str(d: date):
     return d.strftime('%Y%m%d')
 
 
-def _update_fundamentals(code: str, fromdate: date, todate: date):
-    df = pykrx_stock.get_market_fundamental_by_date(
-        fromdate=_date_to_str(fromdate),
-        todate=_date_to_str(todate),
-        ticker=code
-    )
-
-    funds = []
-    for idx, row in df.iterrows():
-        all_nan = True
-        for v in row:
-            if v:
-                all_nan = False
-                break
-
-        if not all_nan:
-            # noinspection PyUnresolvedReferences
-            funds.append(
-                Fundamental(
-                    date=idx.date(),
-                    bps=row.get('BPS'),
-                    per=row.get('PER'),
-                    pbr=row.get('PBR'),
-                    eps=row.get('EPS'),
-                    div=row.get('DIV'),
-                    dps=row.get('DPS'),
-                )
+def _update_fundamentals(code: str, fromdate: date, todate: date, bounds: Bounds = None):
+    with AllFundamentalTable(create_if_not_exists=True) as fund_table:
+        # 테이블에 없는 거래일 구간만 요청 - bounds(거래 기간) 밖은 제외
+        for gap_begin, gap_end in find_gaps(fund_table, code, fromdate, todate, bounds=bounds):
+            df = pykrx_stock.get_market_fundamental_by_date(
+                fromdate=_date_to_str(gap_begin),
+                todate=_date_to_str(gap_end),
+                ticker=code
             )
 
-    with FundamentalTable(code=code, create_if_not_exists=True) as fund_table:
-        whitelist = []
-        exists_rows = fund_table.all()
-        for fund in funds:
-            if fund.date not in [row.date for row in exists_rows]:
-                whitelist.append(fund)
-
-        print(f'Inserting {len(whitelist)} records...')
-        fund_table.insert_all(whitelist)
-
-
-def _update_capitals(code: str, fromdate: date, todate: date):
-    df = pykrx_stock.get_market_cap_by_date(
-        fromdate=_date_to_str(fromdate),
-        todate=_date_to_str(todate),
-        ticker=code
-    )
-
-    capitals = []
-    for idx, row in df.iterrows():
-        all_nan = True
-        for v in row:
-            if v:
-                all_nan = False
-                break
-
-        if not all_nan:
-            # noinspection PyUnresolvedReferences
-            capitals.append(
-                Capital(
-                    code=code,
-                    date=idx.date(),
-                    cap=row.get('시가총액'),
-                )
+            funds = []
+            for idx, row in df.iterrows():
+                all_nan = True
+                for v in row:
+                    if v:
+                        all_nan = False
+                        break
+
+                if not all_nan:
+                    # noinspection PyUnresolvedReferences
+                    funds.append(
+                        StockFundamental(
+                            code=code,
+                            date=idx.date(),
+                            bps=row.get('BPS'),
+                            per=row.get('PER'),
+                            pbr=row.get('PBR'),
+                            eps=row.get('EPS'),
+                            div=row.get('DIV'),
+                            dps=row.get('DPS'),
+                        )
+                    )
+
+            fund_table.upsert(funds)
+
+
+def _update_capitals(code: str, fromdate: date, todate: date, bounds: Bounds = None):
+    with AllCapitalTable() as cap_table:
+        # 테이블에 없는 거래일 구간만 요청 - bounds(거래 기간) 밖은 제외
+        for gap_begin, gap_end in find_gaps(cap_table, code, fromdate, todate, bounds=bounds):
+            df = pykrx_stock.get_market_cap_by_date(
+                fromdate=_date_to_str(gap_begin),
+                todate=_date_to_str(gap_end),
+                ticker=code
             )
 
-    with AllCapitalTable() as cap_table:
-        whitelist = []
-        exists_rows = cap_table.all()
-        for cap in capitals:
-            if cap.date not in [row.date for row in exists_rows]:
-                whitelist.append(cap)
+            capitals = []
+            for idx, row in df.iterrows():
+                all_nan = True
+                for v in row:
+                    if v:
+                        all_nan = False
+                        break
+
+                if not all_nan:
+                    # noinspection PyUnresolvedReferences
+                    capitals.append(
+                        Capital(
+                            code=code,
+                            date=idx.date(),
+                            cap=row.get('시가총액'),
+                        )
+                    )
 
-        print(f'Inserting {len(whitelist)} records...')
-        cap_table.insert_all(whitelist)
+            cap_table.bulk_insert(capitals)
 
 
 def find_all_codes(fromdate: date, todate: date):
@@ -204,20 +333,47 @@ def integrate_capitals():
 
         for code in codes:
             with CapitalTable(code=code) as capital_table:
-                all_capital_table.insert_all(
+                all_capital_table.bulk_insert(
                     [Capital(code=code, date=capital.date, cap=capital.cap) for capital in capital_table.all()]
                 )
 
 
+def integrate_fundamentals():
+    """
+    종목별 fundamentals_{code} 테이블을 fundamentals 테이블로 옮긴다 - 테이블마다 INSERT ... SELECT 한 번
+    """
+    with AllFundamentalTable(create_if_not_exists=True) as all_fundamental_table:
+        quote = engine.dialect.identifier_preparer.quote
+        column_names = ', '.join(quote(name) for name in ('date',) + FUNDAMENTAL_FIELDS)
+        table_names = [table_name for table_name in all_fundamental_table.inspector.get_table_names()
+                       if table_name.startswith('fundamentals_')]
+
+        for table_name in table_names:
+            code = table_name.split('_')[1]
+            with engine.begin() as conn:
+                result = conn.execute(
+                    sqlalchemy.text(
+                        f'INSERT INTO {quote(all_fundamental_table.name)} (code, {column_names}) '
+                        f'SELECT :code, {column_names} FROM {quote(table_name)} ON CONFLICT DO NOTHING'
+                    ),
+                    code=code
+                )
+
+            logging.info(f'[{table_names.index(table_name) + 1}/{len(table_names)}] {table_name}: '
+                         f'{result.rowcount} rows')
+
+
 def update_all():
     fromdate = date(2021, 7, 15)
     todate = date.today()
     codes = find_all_codes(fromdate, todate)
 
     total = [code for code, name in codes.items() if name]
-    num = 0
-    for code in [code for code, name in codes.items() if name]:
-        num += 1
-        print(f'{num}/{len(total)}')
-        _update_fundamentals(code, fromdate=fromdate, todate=todate)
-        _update_capitals(code, fromdate=fromdate, todate=todate)
+
+    # 상장일을 아는 종목은 상장 전을 요청하지 않는다
+    bounds = listing_bounds(total)
+
+    for num, code in enumerate(total, start=1):
+        logging.info(f'[{num}/{len(total)}] {code}')
+        _update_fundamentals(code, fromdate=fromdate, todate=todate, bounds=bounds.get(code))
+        _update_capitals(code, fromdate=fromdate, todate=todate, bounds=bounds.get(code))
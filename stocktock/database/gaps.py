@@ -0,0 +1,196 @@
+# noinspection SpellCheckingInspection
+__author__ = 'wookjae.jo'
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+from typing import *
+
+from sqlalchemy import and_, func
+
+import krx
+from .common import AbstractDynamicTable
+from .stocks import all_stocks
+
+# (시작일, 종료일) - 양 끝 포함
+DateRange = Tuple[date, date]
+
+# 종목이 거래된 (첫 날, 마지막 날) - 모르면 None
+Bounds = Tuple[Optional[date], Optional[date]]
+
+# 이 거래일 수 이하로 떨어진 빈 구간은 한 번에 요청 (사이의 있는 날은 다시 받는다)
+MERGE_WITHIN = 5
+
+
+@dataclass
+class Coverage:
+    code: str
+    first: date
+    last: date
+    count: int  # 데이터가 있는 날 수
+
+
+def missing_ranges(expected: Sequence[date], present: Set[date]) -> List[DateRange]:
+    """
+    expected(정렬된 거래일) 중 present 에 없는 날을 연속 구간으로 묶는다
+    """
+    ranges = []
+    begin = None
+    previous = None
+    for d in expected:
+        if d in present:
+            if begin:
+                ranges.append((begin, previous))
+                begin = None
+        elif not begin:
+            begin = d
+
+        previous = d
+
+    if begin:
+        ranges.append((begin, previous))
+
+    return ranges
+
+
+def merge_ranges(ranges: List[DateRange], sessions: Sequence[date], within: int = MERGE_WITHIN) -> List[DateRange]:
+    """
+    사이에 있는 거래일이 within 일 이하인 구간끼리 합친다
+    """
+    if not ranges or within <= 0:
+        return ranges
+
+    ordinals = {d: i for i, d in enumerate(sessions)}
+    merged = [ranges[0]]
+    for begin, end in ranges[1:]:
+        previous_begin, previous_end = merged[-1]
+        if ordinals[begin] - ordinals[previous_end] - 1 <= within:
+            merged[-1] = (previous_begin, end)
+        else:
+            merged.append((begin, end))
+
+    return merged
+
+
+def clamp(sessions: List[date], bounds: Optional[Bounds]) -> List[date]:
+    """
+    상장 전, 상장폐지 후 거래일 제외
+    """
+    if not bounds:
+        return sessions
+
+    first, last = bounds
+    return [d for d in sessions if (first is None or first <= d) and (last is None or d <= last)]
+
+
+def _code_filter(table: AbstractDynamicTable, codes: Optional[Iterable[str]]):
+    # 종목별 테이블(fundamentals_{code} 등)은 code 컬럼이 없다
+    if codes is None or not hasattr(table.proxy, 'code'):
+        return True
+
+    return table.proxy.code.in_(list(codes))
+
+
+def present_dates(table: AbstractDynamicTable, code: Optional[str], begin: date, end: date,
+                  min_rows: int = 1) -> Set[date]:
+    """
+    데이터가 min_rows 행 이상 있는 날짜 - 분봉 테이블이면 하루치가 모자란 날을 빼는 데 사용
+    """
+    query = table.session.query(table.proxy.date).filter(
+        and_(
+            _code_filter(table, None if code is None else [code]),
+            begin <= table.proxy.date,
+            table.proxy.date <= end,
+        )
+    ).group_by(table.proxy.date)
+
+    if min_rows > 1:
+        query = query.having(func.count() >= min_rows)
+
+    return {row[0] for row in query.all()}
+
+
+def find_gaps(table: AbstractDynamicTable, code: Optional[str], begin: date, end: date, min_rows: int = 1,
+              bounds: Bounds = None, merge_within: int = MERGE_WITHIN) -> List[DateRange]:
+    """
+    begin ~ end 거래일(bounds 안) 중 table 에 없는 구간
+    """
+    sessions = clamp(krx.business_days_between(begin, end), bounds)
+    if not sessions:
+        return []
+
+    present = present_dates(table, code, sessions[0], sessions[-1], min_rows)
+    return merge_ranges(missing_ranges(sessions, present), sessions, merge_within)
+
+
+def coverages(table: AbstractDynamicTable, codes: Iterable[str], begin: date, end: date) -> Dict[str, Coverage]:
+    """
+    종목별 (첫 날, 마지막 날, 날 수) - 한 번의 GROUP BY
+    """
+    rows = table.session.query(
+        table.proxy.code,
+        func.min(table.proxy.date),
+        func.max(table.proxy.date),
+        func.count(func.distinct(table.proxy.date)),
+    ).filter(
+        and_(
+            _code_filter(table, codes),
+            begin <= table.proxy.date,
+            table.proxy.date <= end,
+        )
+    ).group_by(table.proxy.code).all()
+
+    return {code: Coverage(code=code, first=first, last=last, count=count) for code, first, last, count in rows}
+
+
+def listing_bounds(codes: Iterable[str]) -> Dict[str, Bounds]:
+    """
+    stocks 테이블의 상장일로 본 종목별 거래 기간 - 상장일을 아는 종목만 제한한다
+    상장폐지일은 테이블에 없으므로 끝은 제한하지 않는다.
+    """
+    codes = set(codes)
+    bounds = {stock.code: (stock.since, None) for stock in all_stocks() if stock.code in codes and stock.since}
+    logging.info(f'{len(bounds)}/{len(codes)} codes are bounded by their listing dates')
+    logging.debug(f'Bounded codes: {sorted(bounds)}')
+    return bounds
+
+
+def find_all_gaps(table: AbstractDynamicTable, codes: List[str], begin: date, end: date, min_rows: int = 1,
+                  bounds: Dict[str, Bounds] = None, merge_within: int = MERGE_WITHIN) -> Dict[str, List[DateRange]]:
+    """
+    여러 종목의 빈 구간 - bounds(종목별 상장 기간) 밖의 거래일은 보지 않는다
+    first ~ last 사이가 빈틈없이 차 있는 종목은 양 끝만 비교하고, 중간이 빈 종목만 날짜를 조회한다.
+    """
+    all_sessions = krx.business_days_between(begin, end)
+    all_ordinals = {d: i for i, d in enumerate(all_sessions)}
+    covered = coverages(table, codes, begin, end) if min_rows <= 1 else {}
+    bounds = bounds or {}
+
+    gaps = {}
+    for code in codes:
+        sessions = clamp(all_sessions, bounds.get(code))
+        if not sessions:
+            continue
+
+        ordinals = all_ordinals if sessions is all_sessions else {d: i for i, d in enumerate(sessions)}
+        coverage = covered.get(code)
+        if coverage is None and min_rows <= 1:
+            # 데이터 없음 - 전체
+            ranges = missing_ranges(sessions, set())
+        elif coverage and coverage.first in ordinals and coverage.last in ordinals \
+                and ordinals[coverage.last] - ordinals[coverage.first] + 1 == coverage.count:
+            # 연속 - 앞뒤만
+            first, last = ordinals[coverage.first], ordinals[coverage.last]
+            ranges = []
+            if first > 0:
+                ranges.append((sessions[0], sessions[first - 1]))
+            if last < len(sessions) - 1:
+                ranges.append((sessions[last + 1], sessions[-1]))
+        else:
+            ranges = missing_ranges(sessions, present_dates(table, code, sessions[0], sessions[-1], min_rows))
+
+        ranges = merge_ranges(ranges, sessions, merge_within)
+        if ranges:
+            gaps[code] = ranges
+
+    return gaps
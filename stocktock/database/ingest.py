@@ -0,0 +1,367 @@
+# noinspection SpellCheckingInspection
+__author__ = 'wookjae.jo'
+
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+from typing import *
+
+LEDGER_PATH = os.path.join(Path.home(), '.stocktock.ingest.sqlite')
+
+# 작업 상태
+PENDING = 'PENDING'
+DONE = 'DONE'
+FAILED = 'FAILED'
+
+
+@dataclass
+class Job:
+    code: str
+    chart_type: str  # DAY, MINUTE
+    period: int
+    begin: date
+    end: date
+    chunk: date = None  # 작업 단위(달력 월)의 첫 날 - 없으면 begin 이 속한 달
+    status: str = PENDING
+    attempts: int = 0
+    rows: int = 0
+    error: Optional[str] = None
+
+    def __post_init__(self):
+        if self.chunk is None:
+            self.chunk = self.begin.replace(day=1)
+
+    @property
+    def key(self) -> str:
+        """
+        (종목, 봉 타입, 주기, 월) - 빈 구간이 바뀌어도 같은 달 작업은 같은 키
+        """
+        return f'{self.code}|{self.chart_type}|{self.period}|{self.chunk.isoformat()}'
+
+    def __str__(self):
+        return f'{self.code} {self.chart_type}({self.period}) {self.begin} ~ {self.end}'
+
+
+def _next_month(d: date) -> date:
+    return (d.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+def plan_jobs(ranges: Dict[str, List[Tuple[date, date]]], chart_type: str, period: int = 1) -> List[Job]:
+    """
+    종목별 구간들을 달력 월 단위 작업으로 나눈다 - 한 달 안에 구간이 여럿이면 처음 ~ 끝을 한 작업으로
+    """
+    jobs = []
+    for code, code_ranges in ranges.items():
+        chunks: Dict[date, Tuple[date, date]] = {}
+        for begin, end in code_ranges:
+            b = begin
+            while b <= end:
+                chunk = b.replace(day=1)
+                e = min(end, _next_month(b) - timedelta(days=1))
+                if chunk in chunks:
+                    first, last = chunks[chunk]
+                    b, e = min(first, b), max(last, e)
+
+                chunks[chunk] = (b, e)
+                b = _next_month(b)
+
+        jobs.extend(
+            Job(code=code, chart_type=chart_type, period=period, begin=b, end=e, chunk=chunk)
+            for chunk, (b, e) in sorted(chunks.items())
+        )
+
+    return jobs
+
+
+class JobLedger:
+    """
+    작업 장부 (SQLite) - 끝난 작업은 다시 실행하지 않는다
+    작업은 (종목, 봉 타입, 주기, 월) 키로 기록하므로 다시 계산한 빈 구간으로 만든 작업도 같은 키로 찾는다.
+    """
+
+    def __init__(self, path: str = LEDGER_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            'key TEXT PRIMARY KEY, code TEXT NOT NULL, chart_type TEXT NOT NULL, period INTEGER NOT NULL, '
+            'begin TEXT NOT NULL, end TEXT NOT NULL, status TEXT NOT NULL, attempts INTEGER NOT NULL, '
+            'rows INTEGER NOT NULL, error TEXT, updated REAL NOT NULL)'
+        )
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status)')
+        self._conn.commit()
+
+    def add(self, jobs: Iterable[Job]):
+        """
+        없는 작업만 추가
+        """
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR IGNORE INTO jobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                [(job.key, job.code, job.chart_type, job.period, job.begin.isoformat(), job.end.isoformat(),
+                  job.status, job.attempts, job.rows, job.error, time.time()) for job in jobs]
+            )
+            self._conn.commit()
+
+    def pending(self, jobs: Iterable[Job] = None, max_attempts: int = 5) -> List[Job]:
+        """
+        끝나지 않은 작업 - jobs 가 주어지면 그 중에서만 (기간은 jobs 의 것, 상태와 시도 횟수는 장부의 것)
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT key, code, chart_type, period, begin, end, status, attempts, rows, error FROM jobs '
+                'WHERE status != ? AND attempts < ? ORDER BY code, begin', (DONE, max_attempts)
+            ).fetchall()
+
+        if jobs is None:
+            return [
+                Job(code=code, chart_type=chart_type, period=period, begin=date.fromisoformat(begin),
+                    end=date.fromisoformat(end), status=status, attempts=attempts, rows=rows, error=error)
+                for _, code, chart_type, period, begin, end, status, attempts, rows, error in rows
+            ]
+
+        states = {row[0]: row[6:] for row in rows}
+        pending = []
+        for job in jobs:
+            if job.key in states:
+                job.status, job.attempts, job.rows, job.error = states[job.key]
+                pending.append(job)
+
+        return pending
+
+    def _update(self, job: Job):
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET begin = ?, end = ?, status = ?, attempts = ?, rows = ?, error = ?, updated = ? '
+                'WHERE key = ?',
+                (job.begin.isoformat(), job.end.isoformat(), job.status, job.attempts, job.rows, job.error,
+                 time.time(), job.key)
+            )
+            self._conn.commit()
+
+    def done(self, job: Job, rows: int):
+        job.status = DONE
+        job.rows = rows
+        job.error = None
+        self._update(job)
+
+    def failed(self, job: Job, error: str):
+        job.status = FAILED
+        job.attempts += 1
+        job.error = error
+        self._update(job)
+
+    def prune(self, jobs: Iterable[Job] = None) -> int:
+        """
+        끝난 작업 삭제 - jobs 가 주어지면 그 중에서만, Return: 삭제한 작업 수
+        """
+        with self._lock:
+            if jobs is None:
+                cursor = self._conn.execute('DELETE FROM jobs WHERE status = ?', (DONE,))
+            else:
+                cursor = self._conn.executemany('DELETE FROM jobs WHERE key = ? AND status = ?',
+                                                [(job.key, DONE) for job in jobs])
+            self._conn.commit()
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+
+class Progress:
+    """
+    처리량, 남은 시간
+    """
+
+    def __init__(self, total: int, log_interval: float = 10):
+        self.total = total
+        self.done = 0
+        self.failed = 0
+        self.rows = 0
+        self.started = time.time()
+        self.log_interval = log_interval
+        self._logged = self.started
+        self._lock = threading.Lock()
+
+    def update(self, rows: int = 0, failed: bool = False):
+        with self._lock:
+            if failed:
+                self.failed += 1
+            else:
+                self.done += 1
+                self.rows += rows
+
+            now = time.time()
+            if now - self._logged >= self.log_interval:
+                self._logged = now
+                logging.info(str(self))
+
+    def elapsed(self) -> float:
+        return time.time() - self.started
+
+    def jobs_per_second(self) -> float:
+        elapsed = self.elapsed()
+        return (self.done + self.failed) / elapsed if elapsed else 0
+
+    def rows_per_second(self) -> float:
+        elapsed = self.elapsed()
+        return self.rows / elapsed if elapsed else 0
+
+    def eta(self) -> Optional[timedelta]:
+        rate = self.jobs_per_second()
+        if not rate:
+            return None
+
+        return timedelta(seconds=int((self.total - self.done - self.failed) / rate))
+
+    def __str__(self):
+        return f'[{self.done + self.failed}/{self.total}] failed: {self.failed}, ' \
+               f'{self.jobs_per_second():.2f} jobs/s, {self.rows_per_second():.0f} rows/s, ETA: {self.eta()}'
+
+
+def quota_workers(capacity: int, period: float, latency: float = 0.5) -> int:
+    """
+    요청 제한(period 초에 capacity 회)을 다 쓰는 데 필요한 동시 요청 수 - 요청 하나가 latency 초 걸릴 때
+    """
+    return max(1, math.ceil(capacity / period * latency)) + 1
+
+
+class Ingestor:
+    """
+    작업 파이프라인
+    - 조회: workers 개 스레드가 fetch(job) 로 요청 + 디코딩, 실패하면 backoff 후 재시도
+    - 적재: 스레드 하나가 write(job, batch) 로 DB 에 쓰고 장부에 기록
+    두 단계 사이 큐 크기를 제한해서 적재가 밀리면 조회도 쉰다.
+    중단(Ctrl-C, 예외)되면 남은 작업은 취소하고 장부에 PENDING 으로 남겨 다음 실행에서 이어한다.
+    """
+
+    # 큐가 차 있을 때 중단 여부를 다시 확인하는 간격 (초)
+    PUT_INTERVAL = 0.5
+
+    def __init__(
+            self,
+            fetch: Callable[[Job], Any],
+            write: Callable[[Job, Any], int],
+            ledger: JobLedger = None,
+            workers: int = 4,
+            retries: int = 3,
+            backoff: float = 2,
+            init_worker: Callable[[], None] = None,
+            max_attempts: int = 5
+    ):
+        self.fetch = fetch
+        self.write = write
+        self.ledger = ledger or JobLedger()
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.init_worker = init_worker
+        self.max_attempts = max_attempts
+        self.progress: Optional[Progress] = None
+        self._stop = threading.Event()
+
+    def run(self, jobs: List[Job]) -> Progress:
+        self.ledger.add(jobs)
+        pending = self.ledger.pending(jobs, max_attempts=self.max_attempts)
+        logging.info(f'{len(pending)}/{len(jobs)} jobs to run with {self.workers} workers')
+
+        self.progress = Progress(total=len(pending))
+        self._stop.clear()
+        fetched: queue.Queue = queue.Queue(maxsize=self.workers * 2)
+
+        writer = threading.Thread(target=self._write_all, args=(fetched,), name='Ingestor-writer', daemon=True)
+        writer.start()
+
+        executor = ThreadPoolExecutor(max_workers=self.workers, initializer=self.init_worker)
+        futures: List[Future] = []
+        try:
+            for job in pending:
+                futures.append(executor.submit(self._fetch, job, fetched))
+
+            executor.shutdown(wait=True)
+        except BaseException:
+            logging.warning('Stopping - pending jobs are left for the next run')
+            self._stop.set()
+            # Python 3.8 에는 shutdown(cancel_futures=True) 가 없다
+            for future in futures:
+                future.cancel()
+
+            executor.shutdown(wait=True)
+            raise
+        finally:
+            # 조회 스레드가 모두 끝난 뒤에 종료 신호
+            fetched.put(None)
+            writer.join()
+
+        logging.info(f'FINISHED: {self.progress} - {self.ledger.counts()}')
+
+        # 모두 끝났으면 장부에서 지운다 - 실패한 작업이 있으면 다음 실행에서 끝난 작업을 건너뛰도록 남긴다
+        if not self.progress.failed:
+            logging.info(f'{self.ledger.prune(jobs)} finished jobs pruned from the ledger')
+
+        return self.progress
+
+    def _put(self, fetched: queue.Queue, item) -> bool:
+        """
+        적재 큐에 넣는다 - 중단되면 False
+        """
+        while not self._stop.is_set():
+            try:
+                fetched.put(item, timeout=self.PUT_INTERVAL)
+                return True
+            except queue.Full:
+                pass
+
+        return False
+
+    def _fetch(self, job: Job, fetched: queue.Queue):
+        for attempt in range(self.retries + 1):
+            if self._stop.is_set():
+                return
+
+            try:
+                batch = self.fetch(job)
+            except Exception as e:
+                if attempt == self.retries:
+                    logging.exception(f'Failed to fetch {job}')
+                    self.ledger.failed(job, f'{type(e).__name__}: {e}')
+                    self.progress.update(failed=True)
+                    return
+
+                wait = self.backoff * 2 ** attempt
+                logging.warning(f'Failed to fetch {job} - retry in {wait} seconds: {e}')
+                self._stop.wait(wait)
+                continue
+
+            self._put(fetched, (job, batch))
+            return
+
+    def _write_all(self, fetched: queue.Queue):
+        while True:
+            item = fetched.get()
+            if item is None:
+                break
+
+            if self._stop.is_set():
+                # 중단 - 적재하지 않고 비우기만 한다
+                continue
+
+            job, batch = item
+            try:
+                rows = self.write(job, batch)
+                self.ledger.done(job, rows)
+                self.progress.update(rows=rows)
+            except Exception as e:
+                logging.exception(f'Failed to write {job}')
+                self.ledger.failed(job, f'{type(e).__name__}: {e}')
+                self.progress.update(failed=True)
@@ -1,30 +1,140 @@
-# from typing import *
-#
-# from database.candles.day import DayCandle
-#
-#
-# def avg(values: List[int]) -> float:
-#     return sum(values) / len(values)
-#
-#
-# class MaCalculator:
-#     """
-#     이동 평균 관리자
-#     주의: 일봉
-#     """
-#
-#     def __init__(self, candles: List[DayCandle] = None):
-#         self.candles = candles
-#
-#     def get(self, length: int, cur_price: int = None, pos: int = 0):
-#         """
-#         Ex) 오늘 ma 조회 get(ma, cur_price)
-#         Ex) 어제 ma 조회 get(ma, pos=-1)
-#         """
-#
-#         closes = [cd.close for cd in self.candles] + [cur_price]
-#         assert len(closes) >= length, 'Not enough chart'
-#         if pos:
-#             return avg(closes[-length + pos: pos])
-#         else:
-#             return avg(closes[-length:])
+# noinspection SpellCheckingInspection
+__author__ = 'wookjae.jo'
+
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import *
+
+import numpy as np
+from sqlalchemy import Column, Date, Float, String, and_, func
+
+from common.metric import BollingerEngine, RollingMean
+from .charts import DayCandlesTable, engine
+from .common import AbstractDynamicTable
+
+MA_LENGTHS = (5, 10, 20, 60, 120)
+BOLLINGER_SIZE = 20
+BOLLINGER_WIDTH = 2
+
+# 가장 긴 지표(MA120)를 다시 계산하기 위해 마지막 지표 이전에 읽을 기간(일) - 거래일 120일 + 휴일 여유
+_LOOKBACK_DAYS = 250
+
+
+@dataclass
+class DailyIndicator:
+    code: str
+    date: date
+    ma_5: Optional[float]
+    ma_10: Optional[float]
+    ma_20: Optional[float]
+    ma_60: Optional[float]
+    ma_120: Optional[float]
+    bb_upper: Optional[float]  # 볼린저 밴드 상단 (중심선은 ma_20)
+    bb_lower: Optional[float]  # 볼린저 밴드 하단
+
+
+class DailyIndicatorTable(AbstractDynamicTable[DailyIndicator]):
+    """
+    일봉 종가 기준 (종목, 일자) 별 지표 - 일봉 적재 후 update_indicators 로 채운다
+    """
+
+    def __init__(self, create_if_not_exists: bool = False):
+        columns = [
+            Column('code', String, primary_key=True),
+            Column('date', Date, primary_key=True),
+            Column('ma_5', Float),
+            Column('ma_10', Float),
+            Column('ma_20', Float),
+            Column('ma_60', Float),
+            Column('ma_120', Float),
+            Column('bb_upper', Float),
+            Column('bb_lower', Float),
+        ]
+
+        super().__init__(engine, DailyIndicator, 'daily_indicators', columns,
+                         create_if_not_exists=create_if_not_exists)
+
+    def find_all_in(self, code: str, begin: date, end: date) -> List[DailyIndicator]:
+        return self.query().filter(
+            and_(
+                self.proxy.code == code,
+                begin <= self.proxy.date,
+                self.proxy.date <= end,
+            )
+        ).order_by(self.proxy.date).all()
+
+    def find_last_date(self, code: str) -> Optional[date]:
+        return self.session.query(func.max(self.proxy.date)).filter(self.proxy.code == code).scalar()
+
+
+def calculate(code: str, dates: List[date], closes: List[int]) -> List[DailyIndicator]:
+    """
+    날짜순 일봉 종가로 일자별 지표 계산 - 이동평균은 RollingMean, 볼린저 밴드는 BollingerEngine
+    """
+    averages = RollingMean(closes)
+    values = np.asarray(closes, dtype=np.int64)[np.newaxis, :]
+    _, upper, lower = BollingerEngine(values, np.ones(values.shape, dtype=bool),
+                                      size=BOLLINGER_SIZE, width=BOLLINGER_WIDTH).bands()
+
+    def nullable(array: np.ndarray) -> List[Optional[float]]:
+        return [None if np.isnan(value) else value for value in array.tolist()]
+
+    columns = [averages.means(length) for length in MA_LENGTHS] + [nullable(upper[0]), nullable(lower[0])]
+    return [DailyIndicator(code, d, *row) for d, row in zip(dates, zip(*columns))]
+
+
+def update_indicators(code: str, end: date = None, since: date = None) -> int:
+    """
+    마지막으로 계산된 지표 이후의 일봉에 대해서만 지표 계산 후 적재
+    since: 새로 적재된 가장 이른 일봉 날짜 - 그 이후 지표는 앞쪽 값이 바뀌었으므로 다시 계산해서 덮어쓴다
+    """
+    with DailyIndicatorTable(create_if_not_exists=True) as indicator_table:
+        last = indicator_table.find_last_date(code)
+
+        # 다시 계산할 첫 날, None 이면 전체
+        first = None
+        if last:
+            first = last + timedelta(days=1)
+            if since and since < first:
+                first = since
+
+        with DayCandlesTable() as day_candles_table:
+            rows = day_candles_table.find_values_in(
+                codes=[code],
+                begin=first - timedelta(days=_LOOKBACK_DAYS) if first else None,
+                end=end
+            )
+
+        rows.sort(key=lambda row: row[1])
+        indicators = [
+            indicator for indicator in calculate(code, [row[1] for row in rows], [row[5] for row in rows])
+            if not first or indicator.date >= first
+        ]
+
+        count = indicator_table.bulk_insert(indicators, update_conflicts=True)
+
+    logging.debug(f'{count} indicators of {code} updated.')
+    return count
+
+
+def backfill_indicators(codes: List[str] = None) -> int:
+    """
+    이미 적재된 일봉 전체로 지표를 다시 계산 - 지표 테이블이 생기기 전 일봉, 예전 계산 결과 보정
+    codes 가 없으면 일봉이 있는 모든 종목
+    """
+    with DayCandlesTable() as day_candles_table:
+        query = day_candles_table.session.query(day_candles_table.proxy.code, func.min(day_candles_table.proxy.date))
+        if codes is not None:
+            query = query.filter(day_candles_table.proxy.code.in_(codes))
+
+        firsts = query.group_by(day_candles_table.proxy.code).order_by(day_candles_table.proxy.code).all()
+
+    total = 0
+    for i, (code, first) in enumerate(firsts):
+        total += update_indicators(code, since=first)
+        if (i + 1) % 100 == 0:
+            logging.info(f'[{i + 1}/{len(firsts)}] indicators updated: {total} rows')
+
+    logging.info(f'Indicators backfilled: {len(firsts)} codes, {total} rows')
+    return total
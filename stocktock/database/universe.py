@@ -0,0 +1,179 @@
+# noinspection SpellCheckingInspection
+from __future__ import annotations
+
+__author__ = 'wookjae.jo'
+
+import bisect
+import logging
+import os
+from datetime import date, timedelta
+from pathlib import Path
+from typing import *
+
+import numpy as np
+from pykrx import stock as pykrx_stock
+
+from .fundamental import AllCapitalTable
+from .stocks import Market, all_stocks
+
+UNIVERSE_PATH = os.path.join(Path.home(), '.krx.universe.npz')
+
+
+class MarketCapUniverse:
+    """
+    일자별 시가총액 상위 종목 인덱스 - capitals 테이블로 한번 만들어 두고 메모리/파일에서 조회
+    ranks[i] 는 dates[i] 의 시가총액 내림차순 종목 번호(codes 의 인덱스), 빈 칸은 -1
+    시장 구분은 매월 첫 거래일 기준(상장폐지, 이전상장 반영)이다.
+    """
+
+    def __init__(self, begin: date, end: date, dates: List[date], codes: List[str], ranks: np.ndarray,
+                 market: Optional[Market]):
+        self.begin = begin
+        self.end = end
+        self.dates = dates
+        self.codes = codes
+        self.ranks = ranks
+        self.market = market
+
+    @property
+    def depth(self) -> int:
+        return self.ranks.shape[1]
+
+    def covers(self, begin: date, end: date) -> bool:
+        return self.begin <= begin and end <= self.end
+
+    def matches(self, depth: int, market: Optional[Market]) -> bool:
+        return depth <= self.depth and market == self.market
+
+    def top_n(self, at: date, n: int) -> List[str]:
+        """
+        at 시점(당일 포함 가장 최근 거래일) 시가총액 상위 n 개 종목
+        """
+        i = bisect.bisect_right(self.dates, at) - 1
+        if i < 0:
+            return []
+
+        assert n <= self.ranks.shape[1], f'The universe has only top {self.ranks.shape[1]} codes.'
+        return [self.codes[j] for j in self.ranks[i, :n] if j >= 0]
+
+    @classmethod
+    def build(cls, begin: date, end: date, depth: int = 500, market: Optional[Market] = Market.KOSPI):
+        with AllCapitalTable() as capital_table:
+            rows = capital_table.find_values_in(begin, end)
+
+        if market:
+            rows = _filter_market(rows, market)
+
+        codes = sorted({row[0] for row in rows})
+        dates = sorted({row[1] for row in rows})
+        code_index = {code: i for i, code in enumerate(codes)}
+        date_index = {d: i for i, d in enumerate(dates)}
+
+        code_ids = np.fromiter((code_index[row[0]] for row in rows), dtype=np.int32, count=len(rows))
+        date_ids = np.fromiter((date_index[row[1]] for row in rows), dtype=np.int32, count=len(rows))
+        caps = np.fromiter((row[2] or 0 for row in rows), dtype=np.int64, count=len(rows))
+
+        # 날짜 오름차순, 같은 날짜 안에서는 시가총액 내림차순
+        order = np.lexsort((-caps, date_ids))
+        code_ids, date_ids = code_ids[order], date_ids[order]
+        starts = np.searchsorted(date_ids, np.arange(len(dates)))
+        counts = np.diff(np.append(starts, len(date_ids)))
+
+        ranks = np.full((len(dates), depth), -1, dtype=np.int32)
+        for i, (start, count) in enumerate(zip(starts, counts)):
+            count = min(count, depth)
+            ranks[i, :count] = code_ids[start:start + count]
+
+        logging.info(f'Market cap universe built: {len(dates)} days, {len(codes)} codes')
+        return MarketCapUniverse(begin=begin, end=end, dates=dates, codes=codes, ranks=ranks, market=market)
+
+    def save(self, path: str = UNIVERSE_PATH):
+        np.savez_compressed(
+            path,
+            period=np.array([self.begin.toordinal(), self.end.toordinal()], dtype=np.int32),
+            dates=np.array([d.toordinal() for d in self.dates], dtype=np.int32),
+            codes=np.array(self.codes),
+            ranks=self.ranks,
+            market=np.array(self.market.name if self.market else '')
+        )
+
+    @classmethod
+    def load(cls, path: str = UNIVERSE_PATH) -> Optional[MarketCapUniverse]:
+        """
+        시장 구분이 없는 예전 파일이면 None
+        """
+        with np.load(path) as npz:
+            if 'market' not in npz.files:
+                return None
+
+            begin, end = npz['period'].tolist()
+            market = str(npz['market'])
+            return MarketCapUniverse(
+                begin=date.fromordinal(begin),
+                end=date.fromordinal(end),
+                dates=[date.fromordinal(d) for d in npz['dates'].tolist()],
+                codes=npz['codes'].tolist(),
+                ranks=npz['ranks'],
+                market=Market[market] if market else None
+            )
+
+
+def _rebalance_dates(dates: List[date]) -> List[date]:
+    """
+    매월 첫 거래일 - 시장 구분은 이 날들에만 확인한다
+    """
+    return [d for i, d in enumerate(dates) if i == 0 or (d.year, d.month) != (dates[i - 1].year, dates[i - 1].month)]
+
+
+def _filter_market(rows: List[Tuple[str, date, int]], market: Market) -> List[Tuple[str, date, int]]:
+    """
+    그 날 market 에 속한 종목의 행만 남긴다
+    시장 구분은 매월 첫 거래일에만 pykrx 로 확인하고 다음 확인일까지 그대로 쓴다.
+    확인일 이후 상장한 종목은 stocks 테이블의 시장 구분을 따른다.
+    """
+    dates = sorted({row[1] for row in rows})
+    samples = _rebalance_dates(dates)
+
+    members = {}
+    for i, d in enumerate(samples):
+        members[d] = set(pykrx_stock.get_market_ticker_list(d.strftime('%Y%m%d'), market=market.name))
+        if (i + 1) % 12 == 0:
+            logging.info(f'[{i + 1}/{len(samples)}] {market.name} members loaded')
+
+    listed = {stock.code for stock in all_stocks() if stock.market == market}
+
+    first_dates = {}
+    for code, d, _ in rows:
+        if code not in first_dates or d < first_dates[code]:
+            first_dates[code] = d
+
+    def is_member(code: str, d: date) -> bool:
+        sample = samples[bisect.bisect_right(samples, d) - 1]
+        if code in members[sample]:
+            return True
+
+        return first_dates[code] > sample and code in listed
+
+    return [row for row in rows if is_member(row[0], row[1])]
+
+
+_universe: Optional[MarketCapUniverse] = None
+
+
+def get_universe(begin: date, end: date, depth: int = 500,
+                 market: Optional[Market] = Market.KOSPI) -> MarketCapUniverse:
+    """
+    begin ~ end 를 포함하는 유니버스 - 메모리, 파일 순으로 찾고 없으면 만들어서 저장
+    깊이나 시장이 다르면 다시 만든다.
+    """
+    global _universe
+
+    if _universe is None and os.path.isfile(UNIVERSE_PATH):
+        _universe = MarketCapUniverse.load()
+
+    if _universe is None or not _universe.covers(begin, end) or not _universe.matches(depth, market):
+        # 시작일이 휴일이어도 직전 거래일 순위를 쓸 수 있도록 여유를 둔다
+        _universe = MarketCapUniverse.build(begin - timedelta(days=14), end, depth=depth, market=market)
+        _universe.save()
+
+    return _universe
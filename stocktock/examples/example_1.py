@@ -6,7 +6,7 @@ from datetime import date
 from typing import *
 
 from database.charts import DayCandlesTable
-from database.fundamental import FundamentalTable
+from database.fundamental import AllFundamentalTable
 from database.stocks import StockTable
 
 
@@ -27,9 +27,13 @@ def main():
         print(result)
 
     # 특정 종목 일자별 제무재표 조회
-    with FundamentalTable(code='005930') as fundamental_table:
-        result = fundamental_table.all()  # 삼성전자 일자별 재무재표 조회
-        print_items(result)
+    with AllFundamentalTable() as fundamental_table:
+        result = fundamental_table.find_all_in(codes=['005930'])  # 삼성전자 일자별 재무재표 조회
+        print_items(result.rows())
+
+        # 특정일 PER 0 ~ 10, PBR 1 이하 종목 - 쿼리 한 번
+        result = fundamental_table.screen(date(2021, 7, 15), per=(0, 10), pbr=(None, 1))
+        print(list(result.codes))
 
     # 여러 종목 일봉 차트 조회
     with DayCandlesTable() as day_candles_table:
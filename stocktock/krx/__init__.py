@@ -3,6 +3,8 @@ from typing import *
 
 from pykrx import stock
 
+from .sessions import get_calendar_until
+
 
 def __date_to_str(d: date):
     return d.strftime('%Y%m%d')
@@ -14,9 +16,11 @@ def kospi_n_codes(at: date, n: int) -> List[str]:
 
 
 def is_business_day(at: date):
-    business_days = [date(ts.year, ts.month, ts.day) for ts in
-                     stock.get_previous_business_days(year=at.year, month=at.month)]
-    return at in business_days
+    return get_calendar_until(at).is_session(at)
+
+
+def business_days_between(begin: date, end: date) -> List[date]:
+    return get_calendar_until(end).sessions_between(begin, end)
 
 
 name_cache = {}
@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+from datetime import date, datetime, time, timedelta, timezone
+from pathlib import Path
+from typing import *
+
+from pykrx import stock
+
+SESSIONS_PATH = os.path.join(Path.home(), '.krx.sessions')
+
+# 거래일 조회 기준 지수 - 코스피
+_BASE_INDEX_TICKER = '1001'
+
+
+def _date_to_str(d: date):
+    return d.strftime('%Y%m%d')
+
+
+class TradingCalendar:
+    """
+    KRX 거래일 달력
+    정렬된 거래일 목록을 메모리에 두고 조회한다 - 네트워크 사용 없음
+    """
+
+    def __init__(self, sessions: Iterable[date]):
+        self.sessions: List[date] = sorted(set(sessions))
+        self._ordinals: Dict[date, int] = {d: i for i, d in enumerate(self.sessions)}
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def covers(self, d: date) -> bool:
+        return bool(self.sessions) and self.sessions[0] <= d <= self.sessions[-1]
+
+    def is_session(self, d: date) -> bool:
+        return d in self._ordinals
+
+    def ordinal(self, d: date) -> Optional[int]:
+        """
+        거래일 순번, 거래일이 아니면 None
+        """
+        return self._ordinals.get(d)
+
+    def next_session(self, d: date) -> Optional[date]:
+        """
+        d 다음 거래일(d 제외)
+        """
+        i = bisect.bisect_right(self.sessions, d)
+        return self.sessions[i] if i < len(self.sessions) else None
+
+    def previous_session(self, d: date) -> Optional[date]:
+        """
+        d 이전 거래일(d 제외)
+        """
+        i = bisect.bisect_left(self.sessions, d)
+        return self.sessions[i - 1] if i > 0 else None
+
+    def sessions_between(self, begin: date, end: date) -> List[date]:
+        """
+        begin ~ end (모두 포함) 거래일 목록
+        """
+        return self.sessions[bisect.bisect_left(self.sessions, begin):bisect.bisect_right(self.sessions, end)]
+
+    def merge(self, other: TradingCalendar) -> TradingCalendar:
+        return TradingCalendar(self.sessions + other.sessions)
+
+    def save(self, path: str = SESSIONS_PATH):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(_date_to_str(d) for d in self.sessions))
+
+    @classmethod
+    def load(cls, path: str = SESSIONS_PATH) -> TradingCalendar:
+        with open(path, 'r', encoding='utf-8') as f:
+            return TradingCalendar(datetime.strptime(line.strip(), '%Y%m%d').date() for line in f if line.strip())
+
+    @classmethod
+    def from_pykrx(cls, begin: date, end: date) -> TradingCalendar:
+        """
+        코스피 지수 시세가 있는 날을 거래일로 본다
+        """
+        df = stock.get_index_ohlcv_by_date(
+            fromdate=_date_to_str(begin),
+            todate=_date_to_str(end),
+            ticker=_BASE_INDEX_TICKER
+        )
+
+        # noinspection PyUnresolvedReferences
+        return TradingCalendar(timestamp.date() for timestamp in df.index)
+
+    @classmethod
+    def from_day_candles(cls, begin: date, end: date) -> TradingCalendar:
+        """
+        일봉 테이블에 일봉이 있는 날을 거래일로 본다
+        """
+        from database.charts import DayCandlesTable
+        with DayCandlesTable() as day_candles_table:
+            return TradingCalendar(d for d in day_candles_table.find_dates() if begin <= d <= end)
+
+
+_calendar: Optional[TradingCalendar] = None
+
+# 파일이 없을 때 받아오는 첫 거래일
+_FIRST_DATE = date(2000, 1, 1)
+
+
+def get_calendar() -> TradingCalendar:
+    """
+    디스크에 저장된 거래일 달력, 없으면 pykrx 에서 받아 저장
+    """
+    global _calendar
+
+    if _calendar is None:
+        if os.path.isfile(SESSIONS_PATH):
+            _calendar = TradingCalendar.load()
+        else:
+            refresh(_FIRST_DATE, date.today())
+
+    return _calendar
+
+
+def refresh(begin: date, end: date, from_day_candles=False) -> TradingCalendar:
+    """
+    begin ~ end 거래일을 다시 받아 기존 달력에 합치고 저장
+    """
+    global _calendar
+
+    logging.info(f'Refreshing KRX sessions: {begin} ~ {end}')
+    if from_day_candles:
+        fetched = TradingCalendar.from_day_candles(begin, end)
+    else:
+        fetched = TradingCalendar.from_pykrx(begin, end)
+
+    _calendar = _calendar.merge(fetched) if _calendar else fetched
+    _calendar.save()
+    return _calendar
+
+
+_KST = timezone(timedelta(hours=9))
+
+# 장 마감 - 이후에도 오늘 데이터가 없으면 휴장일
+_MARKET_CLOSED_AT = time(15, 30)
+
+# 장 마감 전에 오늘을 다시 확인하는 최소 간격 (초)
+_RECHECK_INTERVAL = 600
+
+# 이 프로세스에서 pykrx 로 확인한 마지막 날 - 같은 구간을 반복해서 받지 않기 위함
+_checked_until: Optional[date] = None
+_checked_at: Optional[datetime] = None
+
+
+def get_calendar_until(d: date) -> TradingCalendar:
+    """
+    d 까지 포함하는 달력 - 마지막 거래일 이후 ~ 오늘 사이의 날이면 그 구간만 새로 받는다
+    장 마감 전에 받아서 오늘 데이터가 없으면 어제까지만 확인한 것으로 보고 나중에 다시 받는다.
+    """
+    global _checked_until, _checked_at
+
+    now = datetime.now(_KST)
+    today = now.date()
+    calendar = get_calendar()
+    checked_until = max(calendar.sessions[-1], _checked_until or _FIRST_DATE) if calendar.sessions else _FIRST_DATE
+    if checked_until < d <= today:
+        if _checked_at and (now - _checked_at).total_seconds() < _RECHECK_INTERVAL:
+            return calendar
+
+        calendar = refresh(checked_until, today)
+        if calendar.sessions and calendar.sessions[-1] == today or now.time() >= _MARKET_CLOSED_AT:
+            _checked_until = today
+        else:
+            _checked_until = today - timedelta(days=1)
+        _checked_at = now
+
+    return calendar
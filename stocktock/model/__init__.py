@@ -1,9 +1,14 @@
 from dataclasses import dataclass
 from datetime import date, time
+from typing import *
+
+import numpy as np
 
 
 @dataclass
 class Candle:
+    __slots__ = ('code', 'date', 'time', 'open', 'high', 'low', 'close', 'vol')
+
     code: str
     date: date
     time: time
@@ -12,3 +17,214 @@ class Candle:
     low: int
     close: int
     vol: int
+
+
+def pack_dates(dates: Iterable[date]) -> np.ndarray:
+    """
+    date 목록 → YYYYMMDD int32 배열
+    """
+    days = np.array(list(dates), dtype='datetime64[D]')
+    months = days.astype('datetime64[M]')
+    years = months.astype('datetime64[Y]')
+    return ((years.astype(np.int32) + 1970) * 10000
+            + (months - years).astype(np.int32) * 100 + 100
+            + (days - months).astype(np.int32) + 1).astype(np.int32)
+
+
+def pack_times(times: Iterable[time]) -> np.ndarray:
+    """
+    time 목록 → HHMM int32 배열
+    """
+    return np.array([t.hour * 100 + t.minute for t in times], dtype=np.int32)
+
+
+def unpack_date(value: int) -> date:
+    return date(value // 10000, value // 100 % 100, value % 100)
+
+
+def unpack_time(value: int) -> time:
+    return time(value // 100, value % 100)
+
+
+class CandleView:
+    """
+    CandleBatch 한 행 - 값은 접근할 때 배열에서 읽는다
+    """
+    __slots__ = ('_batch', '_i')
+
+    def __init__(self, batch: 'CandleBatch', i: int):
+        self._batch = batch
+        self._i = i
+
+    @property
+    def code(self) -> str:
+        return self._batch.code
+
+    @property
+    def date(self) -> date:
+        return unpack_date(int(self._batch.dates[self._i]))
+
+    @property
+    def time(self) -> time:
+        return unpack_time(int(self._batch.times[self._i]))
+
+    @property
+    def open(self) -> int:
+        return int(self._batch.opens[self._i])
+
+    @property
+    def high(self) -> int:
+        return int(self._batch.highs[self._i])
+
+    @property
+    def low(self) -> int:
+        return int(self._batch.lows[self._i])
+
+    @property
+    def close(self) -> int:
+        return int(self._batch.closes[self._i])
+
+    @property
+    def vol(self) -> int:
+        return int(self._batch.vols[self._i])
+
+    def to_candle(self) -> Candle:
+        return Candle(code=self.code, date=self.date, time=self.time, open=self.open, high=self.high,
+                      low=self.low, close=self.close, vol=self.vol)
+
+    def __repr__(self):
+        return f'CandleView({self.code}, {self.date}, {self.time}, {self.open}, {self.high}, {self.low}, ' \
+               f'{self.close}, {self.vol})'
+
+
+class CandleBatch:
+    """
+    한 종목 캔들의 컬럼 배열
+    dates: YYYYMMDD, times: HHMM (int32) - 일봉은 time 0
+    opens/highs/lows/closes: int32, vols: int64
+    dtype 이 맞는 배열은 복사하지 않고 그대로 쓴다.
+    """
+
+    COLUMNS = ('dates', 'times', 'opens', 'highs', 'lows', 'closes', 'vols')
+
+    def __init__(self, code: str, dates, times, opens, highs, lows, closes, vols):
+        self.code = code
+        self.dates = np.asarray(dates, dtype=np.int32)
+        self.times = np.asarray(times, dtype=np.int32)
+        self.opens = np.asarray(opens, dtype=np.int32)
+        self.highs = np.asarray(highs, dtype=np.int32)
+        self.lows = np.asarray(lows, dtype=np.int32)
+        self.closes = np.asarray(closes, dtype=np.int32)
+        self.vols = np.asarray(vols, dtype=np.int64)
+
+    @classmethod
+    def empty(cls, code: str) -> 'CandleBatch':
+        return CandleBatch(code, *[[] for _ in cls.COLUMNS])
+
+    @classmethod
+    def from_candles(cls, code: str, candles: Sequence) -> 'CandleBatch':
+        """
+        Candle 과 같은 속성을 가진 객체 목록 - time 속성이 없으면(일봉) 0
+        """
+        return CandleBatch(
+            code,
+            pack_dates(candle.date for candle in candles),
+            pack_times(candle.time for candle in candles) if candles and hasattr(candles[0], 'time') else
+            np.zeros(len(candles), dtype=np.int32),
+            [candle.open for candle in candles],
+            [candle.high for candle in candles],
+            [candle.low for candle in candles],
+            [candle.close for candle in candles],
+            [candle.vol for candle in candles],
+        )
+
+    @classmethod
+    def from_numpy(cls, code: str, columns: Dict[str, np.ndarray]) -> 'CandleBatch':
+        return CandleBatch(code, *[columns[column] for column in cls.COLUMNS])
+
+    def to_numpy(self) -> Dict[str, np.ndarray]:
+        """
+        컬럼명 → 배열 (복사 없음)
+        """
+        return {column: getattr(self, column) for column in self.COLUMNS}
+
+    @classmethod
+    def from_records(cls, code: str, records: List[Dict[str, Any]]) -> 'CandleBatch':
+        """
+        to_records 형식(JSON API) → CandleBatch
+        """
+        return CandleBatch(
+            code,
+            [int(record['date'].replace('-', '')) for record in records],
+            [int(record['time'].replace(':', '')[:4]) if record.get('time') else 0 for record in records],
+            *[[record[key] for record in records] for key in ('open', 'high', 'low', 'close', 'vol')]
+        )
+
+    def to_records(self) -> List[Dict[str, Any]]:
+        """
+        JSON API 응답 형식 - Candle 을 jsons 로 직렬화한 것과 같은 키/값
+        """
+        code = self.code
+        return [
+            {
+                'code': code,
+                'date': f'{d // 10000:04d}-{d // 100 % 100:02d}-{d % 100:02d}',
+                'time': f'{t // 100:02d}:{t % 100:02d}:00',
+                'open': open_, 'high': high, 'low': low, 'close': close, 'vol': vol
+            } for d, t, open_, high, low, close, vol in zip(*[values.tolist() for values in self.columns()])
+        ]
+
+    @classmethod
+    def concat(cls, code: str, batches: Iterable['CandleBatch']) -> 'CandleBatch':
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls.empty(code)
+
+        return CandleBatch(code, *[np.concatenate([getattr(batch, column) for batch in batches])
+                                   for column in cls.COLUMNS])
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __getitem__(self, i: int) -> CandleView:
+        if i < 0:
+            i += len(self)
+
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+
+        return CandleView(self, i)
+
+    def __iter__(self) -> Iterator[CandleView]:
+        for i in range(len(self)):
+            yield CandleView(self, i)
+
+    def columns(self) -> List[np.ndarray]:
+        return [getattr(self, column) for column in self.COLUMNS]
+
+    def with_code(self, code: str) -> 'CandleBatch':
+        return CandleBatch(code, *self.columns())
+
+    def take(self, indices) -> 'CandleBatch':
+        return CandleBatch(self.code, *[values[indices] for values in self.columns()])
+
+    def sorted(self) -> 'CandleBatch':
+        """
+        (날짜, 시간) 오름차순
+        """
+        keys = self.dates.astype(np.int64) * 10000 + self.times
+        if len(keys) < 2 or np.all(keys[:-1] <= keys[1:]):
+            return self
+
+        return self.take(np.argsort(keys, kind='stable'))
+
+    def to_candles(self) -> List[Candle]:
+        code = self.code
+        return [
+            Candle(
+                code=code,
+                date=date(d // 10000, d // 100 % 100, d % 100),
+                time=time(t // 100, t % 100),
+                open=open_, high=high, low=low, close=close, vol=vol
+            ) for d, t, open_, high, low, close, vol in zip(*[values.tolist() for values in self.columns()])
+        ]
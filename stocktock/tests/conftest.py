@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 스크립트들처럼 stocktock 디렉토리를 import 경로에 추가
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,157 @@
+import threading
+from typing import *
+
+from creon.scheduler import FakeClock, Priority, RequestScheduler
+from creon.transport import FakeTransport
+
+TRADE = 0
+NON_TRADE = 1
+
+
+class GatedClock(FakeClock):
+    """
+    sleep 이 gate 가 열릴 때까지 멈추는 FakeClock - 잠든 사이에 다른 요청을 끼워 넣는다
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.gate = threading.Event()
+        self.sleeping = threading.Semaphore(0)
+
+    def sleep(self, seconds: float):
+        self.sleeping.release()
+        self.gate.wait()
+        super().sleep(seconds)
+
+
+def _acquire_all(scheduler: RequestScheduler, key, count: int):
+    times, waits = [], []
+    for _ in range(count):
+        waits.append(scheduler.acquire(key))
+        times.append(scheduler.clock.time())
+    return times, waits
+
+
+def _record_takes(scheduler: RequestScheduler, key) -> List[str]:
+    """
+    차례를 받은 스레드 이름을 순서대로 기록
+    """
+    window = scheduler.windows[key]
+    take = window.take
+    taken = []
+
+    def record():
+        taken.append(threading.current_thread().name)
+        take()
+
+    window.take = record
+    return taken
+
+
+def test_window_limit():
+    scheduler = RequestScheduler({NON_TRADE: (3, 10)}, clock=FakeClock())
+    times, _ = _acquire_all(scheduler, NON_TRADE, 10)
+
+    assert times == [0, 0, 0, 10, 10, 10, 20, 20, 20, 30]
+
+    # 어느 10초 구간에도 3개를 넘지 않는다
+    for t in times:
+        assert len([other for other in times if t <= other < t + 10]) <= 3
+
+
+def test_window_does_not_burst_after_idle():
+    clock = FakeClock()
+    scheduler = RequestScheduler({NON_TRADE: (3, 10)}, clock=clock)
+    _acquire_all(scheduler, NON_TRADE, 3)
+
+    # 구간 일부만 지났으면 오래된 요청이 빠질 때까지만 기다린다
+    clock.sleep(4)
+    assert scheduler.acquire(NON_TRADE) == 6
+    assert clock.time() == 10
+
+
+def test_wait_times():
+    scheduler = RequestScheduler({NON_TRADE: (3, 10)}, clock=FakeClock())
+    _, waits = _acquire_all(scheduler, NON_TRADE, 7)
+
+    assert waits == [0, 0, 0, 10, 0, 0, 10]
+
+    stats = scheduler.stats()[NON_TRADE]
+    assert stats.requests == 7
+    assert stats.waiting == 0
+    assert stats.total_wait == 20
+    assert stats.max_wait == 10
+    assert stats.avg_wait() == 20 / 7
+
+
+def test_keys_are_limited_separately():
+    scheduler = RequestScheduler({TRADE: (1, 10), NON_TRADE: (1, 10)}, clock=FakeClock())
+
+    assert scheduler.acquire(TRADE) == 0
+    assert scheduler.acquire(NON_TRADE) == 0
+    assert scheduler.acquire(TRADE) == 10
+
+
+def test_remain_count():
+    clock = FakeClock()
+    transport = FakeTransport(clock=clock, quotas={NON_TRADE: (2, 10)})
+    scheduler = RequestScheduler({NON_TRADE: (5, 10)}, clock=clock,
+                                 remain_count=transport.limiter.remain_count, min_remain_count=1)
+
+    # 다른 프로세스가 한도를 다 쓴 상태
+    transport.limiter.hit(NON_TRADE)
+    transport.limiter.hit(NON_TRADE)
+
+    assert scheduler.acquire(NON_TRADE) == 10
+    assert transport.limiter.remain_count(NON_TRADE) == 2
+
+
+def test_high_priority_goes_first():
+    clock = GatedClock()
+    scheduler = RequestScheduler({NON_TRADE: (1, 10)}, clock=clock)
+    taken = _record_takes(scheduler, NON_TRADE)
+
+    # 구간을 채워 두면 다음 요청부터는 기다린다
+    scheduler.acquire(NON_TRADE)
+
+    def start(priority: Priority) -> threading.Thread:
+        thread = threading.Thread(target=scheduler.acquire, args=(NON_TRADE, priority), name=priority.name)
+        thread.start()
+        assert clock.sleeping.acquire(timeout=5)
+        return thread
+
+    # 먼저 온 BACKFILL 이 자는 사이에 ORDER 가 도착
+    threads = [start(Priority.BACKFILL), start(Priority.ORDER)]
+    clock.gate.set()
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+    assert taken == ['MainThread', 'ORDER', 'BACKFILL']
+    assert scheduler.stats()[NON_TRADE].requests == 3
+
+
+def test_same_priority_is_first_come_first_served():
+    clock = GatedClock()
+    scheduler = RequestScheduler({NON_TRADE: (1, 10)}, clock=clock)
+    taken = _record_takes(scheduler, NON_TRADE)
+    scheduler.acquire(NON_TRADE)
+
+    first = threading.Thread(target=scheduler.acquire, args=(NON_TRADE,), name='first')
+    first.start()
+    assert clock.sleeping.acquire(timeout=5)
+
+    # 차례를 기다리는 요청은 잠들지 않으므로 대기 수로 확인
+    second = threading.Thread(target=scheduler.acquire, args=(NON_TRADE,), name='second')
+    second.start()
+    for _ in range(500):
+        if scheduler.stats()[NON_TRADE].waiting == 2:
+            break
+        threading.Event().wait(0.01)
+
+    clock.gate.set()
+    for thread in (first, second):
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+    assert taken == ['MainThread', 'first', 'second']
@@ -0,0 +1,132 @@
+import pytest
+
+from creon.scheduler import FakeClock
+from creon.transport import LIMIT_EXCEEDED, FakeTransport
+
+RECORDINGS = {
+    'requests': [
+        {'prog_id': 'CpSysDib.StockChart', 'inputs': {'0': 'A005930'}, 'headers': {'3': 2},
+         'data': {'5': [100, 101]}, 'continue': 1},
+        {'prog_id': 'CpSysDib.StockChart', 'inputs': {'0': 'A005930'}, 'headers': {'3': 1},
+         'data': {'5': [99]}},
+        {'prog_id': 'CpTrade.CpTd0311', 'inputs': {'0': '2'}, 'headers': {}, 'data': {},
+         'status': 1, 'message': '주문 거부'},
+    ],
+    'calls': [
+        {'prog_id': 'CpUtil.CpStockCode', 'method': 'CodeToName', 'args': ['A005930'], 'result': '삼성전자'},
+    ],
+    'properties': [
+        {'prog_id': 'CpTrade.CpTdUtil', 'name': 'AccountNumber', 'value': ['12345678']},
+    ],
+}
+
+
+def _request(transport: FakeTransport, prog_id: str, **inputs):
+    obj = transport.dispatch(prog_id)
+    for index, value in inputs.items():
+        obj.SetInputValue(int(index[1:]), value)
+    return obj, obj.BlockRequest()
+
+
+def test_replays_recorded_responses_in_order():
+    transport = FakeTransport(RECORDINGS, clock=FakeClock())
+
+    obj, result = _request(transport, 'CpSysDib.StockChart', i0='A005930')
+    assert result == 0
+    assert obj.GetHeaderValue(3) == 2
+    assert [obj.GetDataValue(5, row) for row in range(2)] == [100, 101]
+    assert obj.Continue == 1
+
+    # 마지막 응답은 반복
+    for _ in range(2):
+        obj, _ = _request(transport, 'CpSysDib.StockChart', i0='A005930')
+        assert obj.GetHeaderValue(3) == 1
+        assert obj.GetDataValue(5, 0) == 99
+        assert obj.Continue == 0
+
+    assert transport.request_count == 3
+
+
+def test_recorded_status_and_missing_response():
+    transport = FakeTransport(RECORDINGS, clock=FakeClock())
+
+    obj, result = _request(transport, 'CpTrade.CpTd0311', i0='2')
+    assert result == 0
+    assert (obj.GetDibStatus(), obj.GetDibMsg1()) == (1, '주문 거부')
+
+    obj, _ = _request(transport, 'CpSysDib.StockChart', i0='A000660')
+    assert obj.GetDibStatus() == -1
+
+
+def test_rate_limit():
+    clock = FakeClock()
+    transport = FakeTransport(RECORDINGS, clock=clock, quotas={0: (1, 15), 1: (2, 15)})
+    cybos = transport.dispatch('CpUtil.CpCybos')
+
+    assert _request(transport, 'CpSysDib.StockChart', i0='A005930')[1] == 0
+    assert _request(transport, 'CpSysDib.StockChart', i0='A005930')[1] == 0
+    assert cybos.GetLimitRemainCount(1) == 0
+
+    obj, result = _request(transport, 'CpSysDib.StockChart', i0='A005930')
+    assert result == LIMIT_EXCEEDED
+    assert obj.GetDibStatus() == LIMIT_EXCEEDED
+
+    # 주문 한도는 따로
+    assert cybos.GetLimitRemainCount(0) == 1
+    assert _request(transport, 'CpTrade.CpTd0311', i0='2')[1] == 0
+
+    # 제한에 걸린 요청은 횟수에 들어가지 않는다
+    clock.sleep(15)
+    assert cybos.GetLimitRemainCount(1) == 2
+    assert _request(transport, 'CpSysDib.StockChart', i0='A005930')[1] == 0
+    assert transport.request_count == 4
+
+
+def test_latency_advances_clock():
+    clock = FakeClock()
+    transport = FakeTransport(RECORDINGS, clock=clock, latency=0.25)
+
+    for _ in range(4):
+        _request(transport, 'CpSysDib.StockChart', i0='A005930')
+
+    assert clock.time() == 1
+
+
+def test_calls_and_properties():
+    transport = FakeTransport(RECORDINGS, clock=FakeClock())
+
+    assert transport.dispatch('CpUtil.CpStockCode').CodeToName('A005930') == '삼성전자'
+    assert transport.dispatch('CpTrade.CpTdUtil').AccountNumber == ['12345678']
+
+    with pytest.raises(LookupError):
+        transport.dispatch('CpUtil.CpStockCode').CodeToName('A000660')
+
+
+def test_subscriptions():
+    transport = FakeTransport(RECORDINGS, clock=FakeClock(), max_subscriptions=2)
+
+    received = []
+
+    class Handler:
+        def set_client(self, client):
+            self.client = client
+
+        def OnReceived(self):
+            received.append(self.client.GetHeaderValue(13))
+
+    objs = [transport.dispatch('DsCbo1.StockCur') for _ in range(3)]
+    for obj in objs:
+        transport.with_events(obj, Handler).set_client(obj)
+
+    objs[0].Subscribe()
+    objs[1].Subscribe()
+    with pytest.raises(RuntimeError):
+        objs[2].Subscribe()
+
+    # 구독 해제하면 자리가 빈다
+    objs[0].Unsubscribe()
+    objs[2].Subscribe()
+    assert transport.subscriptions == [objs[1], objs[2]]
+
+    objs[2].fire({'13': 70000})
+    assert received == [70000]
@@ -3,15 +3,13 @@ import csv
 import logging
 import os
 import sys
-import threading
-import time
 from dataclasses import dataclass
 from datetime import datetime
 from typing import *
 
 from dateutil.parser import parse as parse_datetime
 
-from creon import stocks, metrics, traders
+from creon import stocks, metrics, traders, realtime
 from utils import calc
 from utils.slack import WarrenSession, Message
 from utils.strings import strip_multiline_string
@@ -134,65 +132,79 @@ class Bot(abc.ABC):
         self.stop_line = -3
         self.max_holding_count = 7000
 
+    def prepare(self):
+        """
+        구독 전 한번 - 전일 기준 지표 계산 등
+        """
+        pass
+
     @abc.abstractmethod
-    def run(self):
+    def on_price(self, tick: realtime.Tick):
+        """
+        구독 종목의 체결 이벤트
+        """
         ...
 
     def start(self):
         self.warren_session = WarrenSession(self.name)
 
-        def work():
-            while True:
-                self.logger.debug('# HEALTH CHECK #')
-                try:
-                    self.run()
-                except:
-                    self.logger.error('An error occured while running the simulation.', exc_info=sys.exc_info())
+        try:
+            self.prepare()
+        except:
+            self.logger.error('An error occured while preparing the simulation.', exc_info=sys.exc_info())
 
-                time.sleep(5)
+        feed = realtime.get_feed()
+        feed.add_listener(self._on_tick)
 
-                try:
-                    self.check_stop_line()
-                except:
-                    self.logger.error('An error occured while checking stop line.', exc_info=sys.exc_info())
+        # 보유 종목 먼저 - 구독 한도를 넘은 보유 종목은 현재가 조회로 손절/익절을 확인한다
+        holdings = list(dict.fromkeys(holding.code for holding in self.wallet.holdings))
+        overflow = feed.subscribe(holdings + [code for code in self.codes if code not in holdings])
+        unsubscribed_holdings = [code for code in overflow if code in holdings]
+        if unsubscribed_holdings:
+            self.logger.warning(f'{len(unsubscribed_holdings)} holdings are polled instead of subscribed.')
+            feed.poll(unsubscribed_holdings)
 
-                time.sleep(5)
+    def _on_tick(self, tick: realtime.Tick):
+        if tick.expected or not tick.price:
+            return
 
-        threading.Thread(target=work, daemon=True).start()
+        try:
+            self.check_stop_line(tick)
+        except:
+            self.logger.error('An error occured while checking stop line.', exc_info=sys.exc_info())
 
-    def check_stop_line(self):
-        details: Dict[str, stocks.StockDetail2] = {
-            detail.code: detail for detail in
-            stocks.get_details([holding.code for holding in self.wallet.holdings])
-        }
+        if tick.code in self.codes:
+            try:
+                self.on_price(tick)
+            except:
+                self.logger.error('An error occured while running the simulation.', exc_info=sys.exc_info())
 
-        for holding in self.wallet.holdings:
-            detail = details.get(holding.code)
+    def check_stop_line(self, tick: realtime.Tick):
+        holding = self.wallet.get(tick.code)
+        if not holding:
+            return
 
-            if not detail:
-                logging.warning('The detail is null: ' + holding.code)
-                continue
+        cur_price = tick.price
+        earnings_rate = calc.earnings_ratio(holding.price, cur_price)
 
-            if not detail.price:
-                logging.warning('The price is 0: ' + holding.code)
-                continue
-
-            cur_price = detail.price
-            earnings_rate = calc.earnings_ratio(holding.price, cur_price)
+        try:
+            if earnings_rate < self.stop_line:
+                # 손절
+                self.try_sell(code=holding.code,
+                              what=f'손절 {self.stop_line}%',
+                              order_price=cur_price)
+            elif earnings_rate > self.bend_line:
+                # 익절
+                self.try_sell(code=holding.code,
+                              what=f'익절 {self.bend_line}%',
+                              order_price=cur_price)
+        except:
+            logging.exception(f'Failed to sell {holding.code}')
 
-            try:
-                if earnings_rate < self.stop_line:
-                    # 손절
-                    self.try_sell(code=holding.code,
-                                  what=f'손절 {self.stop_line}%',
-                                  order_price=detail.price)
-                elif earnings_rate > self.bend_line:
-                    # 익절
-                    self.try_sell(code=holding.code,
-                                  what=f'익절 {self.bend_line}%',
-                                  order_price=detail.price)
-            except:
-                logging.exception(f'Failed to sell {detail.code}')
+    @classmethod
+    def _get_price(cls, code: str) -> int:
+        # 구독 중이면 최근 체결가, 아니면 조회
+        return realtime.get_price(code) or stocks.get_snapshot([code]).get(code).price
 
     def try_buy(self, code: str, what: str, order_price: int = None, memo: str = None):
         if self.wallet.has(code):
@@ -203,8 +215,7 @@ class Bot(abc.ABC):
             return
 
         if not order_price:
-            detail = list(stocks.get_details([code]))[0]
-            order_price = detail.price
+            order_price = self._get_price(code)
 
         order_count = int(100_0000 / order_price)
         order_total = order_price * order_count
@@ -233,8 +244,7 @@ class Bot(abc.ABC):
         holding = self.wallet.get(code)
 
         if not order_price:
-            detail = list(stocks.get_details([code]))[0]
-            order_price = detail.price
+            order_price = self._get_price(code)
 
         order_total = order_price * holding.quantity
         holding_total = holding.price * holding.quantity
@@ -265,8 +275,11 @@ class Simulator_2(Bot):
     def __init__(self, codes):
         super().__init__('5MA_상향돌파', codes)
 
-    def run(self):
-        whitelist = []
+        self.ma_5_yst: Dict[str, float] = {}
+
+    def prepare(self):
+        # 전일까지 조건을 만족한 종목만 당일 체결을 본다
+        self.ma_5_yst = {}
         for code in self.codes:
             try:
                 ma_calc = metrics.get_calculator(code)
@@ -279,29 +292,23 @@ class Simulator_2(Bot):
                 if ma_20_yst > ma_5_yst > ma_60_yst > ma_120_yst \
                         and ma_20_yst > ma_20_yst_2 \
                         and len([candle for candle in ma_calc.chart[-5:] if candle.open < candle.close]) > 0:
-                    whitelist.append(code)
+                    self.ma_5_yst[code] = ma_5_yst
             except:
                 continue
 
-        details = stocks.get_details(whitelist)
-
-        # 모든 취급 종목에 대해...
-        for detail in details:
-            try:
-                # 전일 기준 5MA, 20MA 구한다
-                ma_calc = metrics.get_calculator(detail.code)
-                ma_5_yst = ma_calc.get(5, pos=-1)
-                if detail.open < ma_5_yst <= detail.price < ma_5_yst * 1.025:
-                    self.try_buy(
-                        code=detail.code,
-                        what='5MA 상향돌파',
-                        order_price=detail.price,
-                        # memo=f'''
-                        #     ma_20_yst > ma_5_yst > ma_60_yst > ma_120_yst
-                        #     and ma_20_yst > ma_20_yst_2
-                        #     and len([candle for candle in ma_calc.chart[-5:] if candle.open < candle.close]) > 0
-                        #     and open < ma_5_yst <= cur_price < ma_5_yst * 1.025
-                        #     '''
-                    )
-            except:
-                logging.exception(f'Failed to simulate for {detail.code} in {self.name}')
+        self.codes = list(self.ma_5_yst.keys())
+
+    def on_price(self, tick: realtime.Tick):
+        ma_5_yst = self.ma_5_yst.get(tick.code)
+        if ma_5_yst and tick.open < ma_5_yst <= tick.price < ma_5_yst * 1.025:
+            self.try_buy(
+                code=tick.code,
+                what='5MA 상향돌파',
+                order_price=tick.price,
+                # memo=f'''
+                #     ma_20_yst > ma_5_yst > ma_60_yst > ma_120_yst
+                #     and ma_20_yst > ma_20_yst_2
+                #     and len([candle for candle in ma_calc.chart[-5:] if candle.open < candle.close]) > 0
+                #     and open < ma_5_yst <= cur_price < ma_5_yst * 1.025
+                #     '''
+            )
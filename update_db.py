@@ -1,10 +1,15 @@
 import logging
-from datetime import date, timedelta, datetime
+from datetime import date, timedelta
 
 import creon.charts
+import creon.com
 import creon.stocks
 import database.charts
+import database.gaps
+import database.ingest
+import database.metrics
 import database.stocks
+from model import CandleBatch
 from utils import log
 
 log.init()
@@ -45,85 +50,78 @@ def update_stocks():
 
 
 def update_day_candles(code: str, begin: date, end: date):
+    with database.stocks.StockTable() as stock_table:
+        stock = stock_table.find(normalize(code))
+
     with database.charts.DayCandlesTable() as day_candles_table:
-        candles = day_candles_table.find_all_in(codes=[code])
-        creon_candles = creon.charts.request_by_term(
-            code=code,
-            chart_type=creon.charts.ChartType.DAY,
-            begin=end - timedelta(days=365 * 5),
-            end=end
-        )
-
-        inserts = []
-        for creon_candle in creon_candles:
-
-            # 중복 방어
-            if creon_candle.date in [candle.date for candle in inserts]:
-                continue
-
-            if creon_candle.date not in [candle.date for candle in candles]:
-                inserts.append(
-                    database.charts.DayCandle(
-                        code=normalize(creon_candle.code),
-                        date=creon_candle.date,
-                        open=creon_candle.open,
-                        close=creon_candle.close,
-                        low=creon_candle.low,
-                        high=creon_candle.high,
-                        vol=creon_candle.vol
-                    )
-                )
-
-        day_candles_table.insert_all(inserts)
+        # DB 에 없는 거래일 구간만 요청 - 상장일 이전은 제외
+        ranges = database.gaps.find_gaps(day_candles_table, normalize(code), end - timedelta(days=365 * 5), end,
+                                         bounds=(stock.since if stock else None, None))
+        creon_candles = CandleBatch.concat(normalize(code), [
+            creon.charts.request_batch_by_term(
+                code=code,
+                chart_type=creon.charts.ChartType.DAY,
+                begin=gap_begin,
+                end=gap_end,
+                use_cache=False
+            ) for gap_begin, gap_end in ranges
+        ])
+
+        # 이미 적재된 일봉은 ON CONFLICT DO NOTHING 으로 건너뜀
+        day_candles_table.bulk_insert(creon_candles.with_code(normalize(code)))
+
+    # 새로 적재된 일봉만큼 지표 갱신 - 앞쪽 빈 구간이 채워졌으면 그 이후 지표도 다시 계산
+    database.metrics.update_indicators(normalize(code), end=end, since=ranges[0][0] if ranges else None)
 
 
 def update_minute_candles(code: str, begin: date, end: date, period):
     if begin > end:
         return
 
-    creon_candles = creon.charts.request_by_term(
+    creon_candles = creon.charts.request_batch_by_term(
         code=code,
         chart_type=creon.charts.ChartType.MINUTE,
         period=period,
         begin=begin,
-        end=end
+        end=end,
+        use_cache=False
     )
 
-    creon_candles_by_date = {}
-    for creon_candle in creon_candles:
-        if creon_candle.date not in creon_candles_by_date:
-            creon_candles_by_date.update({creon_candle.date: []})
-
-        creon_candles_by_date.get(creon_candle.date).append(creon_candle)
+    with database.charts.MinuteCandlesTable(
+            time_unit=f'{period}m',
+            create_if_not_exists=True
+    ) as minute_candles_table:
+        minute_candles_table.ensure_partitions(begin, end)
+        minute_candles_table.bulk_insert(creon_candles.with_code(code))
+
+
+def fetch(job: database.ingest.Job) -> CandleBatch:
+    # 크레온 조회 + 컬럼 디코딩 (조회 스레드)
+    return creon.charts.request_batch_by_term(
+        code=job.code,
+        chart_type=creon.charts.ChartType.create_by_name(job.chart_type),
+        period=job.period,
+        begin=job.begin,
+        end=job.end,
+        use_cache=False  # DB 에 적재하므로 차트 캐시는 거치지 않는다
+    )
 
-    for d in [begin + timedelta(days=i) for i in range((end - begin).days + 1)]:
-        creon_candles = creon_candles_by_date.get(d)
-        if not creon_candles:
-            continue
 
-        with database.charts.MinuteCandlesTable(
-                d,
-                time_unit=f'{period}m',
-                create_if_not_exists=True
-        ) as minute_candles_table:
-            exist_candles = minute_candles_table.find_all([code])
-            exist_datetimes = [datetime.combine(candle.date, candle.time) for candle in exist_candles]
+def write(job: database.ingest.Job, batch: CandleBatch) -> int:
+    # DB 적재 (적재 스레드)
+    if job.chart_type == creon.charts.ChartType.DAY.name:
+        with database.charts.DayCandlesTable() as day_candles_table:
+            inserted = day_candles_table.bulk_insert(batch.with_code(normalize(job.code)))
 
-            new_candles = [database.charts.MinuteCandle(
-                code=code,
-                date=creon_candle.date,
-                time=creon_candle.time,
-                open=creon_candle.open,
-                close=creon_candle.close,
-                low=creon_candle.low,
-                high=creon_candle.high,
-                vol=creon_candle.vol
-            ) for creon_candle in creon_candles if
-                datetime.combine(creon_candle.date, creon_candle.time) not in exist_datetimes]
+        database.metrics.update_indicators(normalize(job.code), end=job.end, since=job.begin)
+        return inserted
 
-            if new_candles:
-                logging.info(f'Inserting {len(new_candles)} rows...')
-                minute_candles_table.insert_all(new_candles)
+    with database.charts.MinuteCandlesTable(
+            time_unit=f'{job.period}m',
+            create_if_not_exists=True
+    ) as minute_candles_table:
+        minute_candles_table.ensure_partitions(job.begin, job.end)
+        return minute_candles_table.bulk_insert(batch.with_code(job.code))
 
 
 def main():
@@ -137,19 +135,29 @@ def main():
 
     logging.info('Updating stocks...')
     stocks = update_stocks()
+    # 크레온에 없는 종목(상장폐지 등)은 제외
+    codes = [stock.code for stock in stocks if stock.code in creon.stocks.get_symbols()]
+
+    # DB 에 없는 구간만 종목 x 월 단위 작업으로 - 중단되면 장부에 끝난 작업은 건너뛰고 이어서
+    # 상장일을 아는 종목은 상장 전을 제외
+    bounds = database.gaps.listing_bounds(codes)
 
-    def update(code: str):
-        try:
-            # update_day_candles(code, begin, end)
-            # update_minute_candles(code, begin, end, period=1)
-            update_minute_candles(code, begin, end, period=5)
-        except creon.stocks.StockNotFound as e:
-            logging.warning(f'Failed to update candles for {code}', exc_info=e)
+    with database.charts.MinuteCandlesTable(time_unit='5m', create_if_not_exists=True) as minute_candles_table:
+        gaps = database.gaps.find_all_gaps(minute_candles_table, codes, begin, end, bounds=bounds)
+
+    jobs = database.ingest.plan_jobs(gaps, creon.charts.ChartType.MINUTE.name, period=5)
+    logging.info(f'{len(gaps)}/{len(codes)} stocks have gaps - {len(jobs)} jobs')
+
+    capacity, period = creon.com.QUOTAS[creon.com.ReqType.NON_TRADE]
+    ingestor = database.ingest.Ingestor(
+        fetch=fetch,
+        write=write,
+        workers=database.ingest.quota_workers(capacity, period),
+        init_worker=creon.com.init_thread
+    )
 
     logging.info('Updating candles...')
-    for stock in stocks:
-        logging.info(f'[{stocks.index(stock) + 1}/{len(stocks)}] {stock.code}')
-        update(stock.code)
+    ingestor.run(jobs)
 
 
 if __name__ == '__main__':
@@ -2,4 +2,5 @@ from database import fundamental
 
 if __name__ == '__main__':
     # fundamental.integrate_capitals()
+    # fundamental.integrate_fundamentals()
     fundamental.update_all()
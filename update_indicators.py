@@ -0,0 +1,8 @@
+from database import metrics
+from utils import log
+
+log.init()
+
+if __name__ == '__main__':
+    # 적재된 일봉 전체로 daily_indicators 채우기
+    metrics.backfill_indicators()